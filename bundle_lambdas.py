@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""
+build one slim zip per lambda handler from the built lambda directory
+(our code plus requirements.txt installed with pip -t) by tracing what
+each handler actually imports, rather than shipping everything to every
+function.
+
+runs in the build container (see generate_lambda_zip.py):
+    bundle_lambdas.py <built directory> <output directory>
+
+each bundle is compiled to bytecode by the lambda runtime's interpreter
+(LAMBDA_PYTHON, python3.8 in the build image) since /var/task is read only
+and a cold start can't write what it compiles. Import times are measured
+with that interpreter in the build container, not in lambda.
+"""
+import modulefinder
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+import json
+
+HANDLERS = ["processor", "s3_to_firehose", "generate_partitions"]
+
+# the plugins are imported by name at runtime, which tracing can't see
+# so we add the ones in the plugin manifest, and ship the manifest itself
+# so a cold start doesn't scan for them
+PLUGIN_MANIFEST = "plugin_manifest.json"
+
+# run in the bundle once the handler imports, to check it has what
+# the handler loads at runtime rather than on import
+BUNDLE_CHECKS = {
+    "processor": (
+        "import sys;"
+        " from utils.plugins import PLUGIN_DIRECTORIES, load_manifest, get_plugins;"
+        " manifest = load_manifest();"
+        " assert all(manifest.get(d) for d in PLUGIN_DIRECTORIES), 'no manifest';"
+        " assert all(get_plugins(d) for d in PLUGIN_DIRECTORIES), 'no plugins';"
+        " assert 'pynsive' not in sys.modules, 'plugins were scanned for'"
+    )
+}
+
+# the runtime in main.tf
+TARGET_PYTHON = os.environ.get("LAMBDA_PYTHON", "python3.8")
+
+# not needed to run anything
+# (bytecode that comes with the build may be stale or for another
+# interpreter, each bundle is compiled for TARGET_PYTHON instead)
+STRIP_DIRECTORIES = {"__pycache__", "tests"}
+STRIP_SUFFIXES = (".pyc", ".pyo", ".pyi", ".pyx", ".pxd", ".c", ".h", ".md", ".rst")
+
+
+def top_level_names(built, handler):
+    """
+    the top level modules and packages in the built directory
+    the handler imports, directly or not
+    """
+    finder = modulefinder.ModuleFinder(path=[built] + sys.path)
+    finder.run_script(os.path.join(built, handler + ".py"))
+    manifest = os.path.join(built, PLUGIN_MANIFEST)
+    if handler == "processor" and os.path.exists(manifest):
+        with open(manifest, "r") as f:
+            for entries in json.load(f).values():
+                for entry in entries:
+                    finder.import_hook(entry["module"])
+
+    names = {handler}
+    for name, module in finder.modules.items():
+        filename = getattr(module, "__file__", None)
+        if filename and os.path.abspath(filename).startswith(
+            os.path.abspath(built) + os.sep
+        ):
+            names.add(name.split(".")[0])
+    # the handler itself, as the traced script
+    names.discard("__main__")
+    return names
+
+
+def bundle_entries(built, names, handler=None):
+    """the files/directories at the top of the built directory for names"""
+    entries = []
+    for entry in sorted(os.listdir(built)):
+        name = entry.split(".")[0].split("-")[0]
+        if name in names:
+            # package, module, extension module or its dist-info
+            entries.append(entry)
+        elif entry == PLUGIN_MANIFEST and handler == "processor":
+            entries.append(entry)
+    return entries
+
+
+def copy_stripped(source, destination):
+    """copy a file or directory leaving out what isn't needed to run it"""
+    if os.path.isfile(source):
+        if not source.endswith(STRIP_SUFFIXES):
+            shutil.copy2(source, destination)
+        return
+
+    def ignore(directory, entries):
+        return [
+            entry
+            for entry in entries
+            if entry in STRIP_DIRECTORIES or entry.endswith(STRIP_SUFFIXES)
+        ]
+
+    shutil.copytree(source, destination, ignore=ignore)
+
+
+def compile_bundle(directory):
+    """
+    write the bytecode for everything in the bundle with TARGET_PYTHON
+    checked by hash, not mtime, so unzipping (which rounds mtimes) can't
+    make it stale. Files that don't compile (templates, python 2 only
+    modules) can't be imported either and are left as they are.
+    """
+    subprocess.run(
+        [
+            TARGET_PYTHON,
+            "-m",
+            "compileall",
+            "-qq",
+            "--invalidation-mode",
+            "unchecked-hash",
+            ".",
+        ],
+        cwd=directory,
+    )
+
+
+def bytecode(directory):
+    """the .pyc files in a directory and when they were written"""
+    return {
+        os.path.join(root, filename): os.path.getmtime(os.path.join(root, filename))
+        for root, dirs, files in os.walk(directory)
+        for filename in files
+        if filename.endswith(".pyc")
+    }
+
+
+def zip_directory(directory, zip_path):
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as z:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                z.write(path, os.path.relpath(path, directory))
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, dirs, files in os.walk(directory)
+        for filename in files
+    )
+
+
+def run_in_bundle(directory, handler, code):
+    """
+    run code from the bundle alone (no site packages), returns its output
+    raises ImportError if it fails, i.e. tracing missed something it needs
+    """
+    completed = subprocess.run(
+        [TARGET_PYTHON, "-S", "-c", code],
+        cwd=directory,
+        env={"PATH": os.environ.get("PATH", "")},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if completed.returncode != 0:
+        raise ImportError(
+            "{} doesn't run from its bundle: {}".format(
+                handler, completed.stderr.strip().splitlines()[-1]
+            )
+        )
+    return completed.stdout
+
+
+def import_seconds(directory, handler):
+    """seconds to import the handler from the bundle alone"""
+    return float(
+        run_in_bundle(
+            directory,
+            handler,
+            "import time; start = time.perf_counter(); import {};"
+            " print(time.perf_counter() - start)".format(handler),
+        ).strip()
+    )
+
+
+def build_bundle(built, handler, output):
+    """zip the handler's bundle into output, returns its report"""
+    names = top_level_names(built, handler)
+    with tempfile.TemporaryDirectory() as staging:
+        for entry in bundle_entries(built, names, handler):
+            copy_stripped(os.path.join(built, entry), os.path.join(staging, entry))
+        compile_bundle(staging)
+        zip_path = os.path.join(output, handler + ".zip")
+        zip_directory(staging, zip_path)
+        # check what was zipped, not the staging directory
+        with tempfile.TemporaryDirectory() as unzipped:
+            with zipfile.ZipFile(zip_path) as z:
+                z.extractall(unzipped)
+            compiled = bytecode(unzipped)
+            seconds = import_seconds(unzipped, handler)
+            if handler in BUNDLE_CHECKS:
+                run_in_bundle(unzipped, handler, BUNDLE_CHECKS[handler])
+            # what lambda would have to compile on every cold start
+            recompiled = sorted(
+                path
+                for path, written in bytecode(unzipped).items()
+                if compiled.get(path) != written
+            )
+            if recompiled:
+                raise ImportError(
+                    "{} compiles {} on import, its bytecode isn't for {}".format(
+                        handler, os.path.relpath(recompiled[0], unzipped), TARGET_PYTHON
+                    )
+                )
+        return {
+            "handler": handler,
+            "zip": zip_path,
+            "zipped": os.path.getsize(zip_path),
+            "unzipped": directory_size(staging),
+            "import": seconds,
+            "modules": sorted(names),
+        }
+
+
+def main(built, output):
+    print("whole directory: {:,.0f}KB".format(directory_size(built) / 1024))
+    print(
+        "compiling and timing imports with {} (python {}) in this container,"
+        " lambda's own may differ".format(
+            TARGET_PYTHON,
+            run_in_bundle(
+                ".", TARGET_PYTHON, "import platform; print(platform.python_version())"
+            ).strip(),
+        )
+    )
+    for handler in HANDLERS:
+        report = build_bundle(built, handler, output)
+        print(
+            "{handler}: {zip} {zipped_kb:,.0f}KB zipped, {unzipped_kb:,.0f}KB"
+            " unzipped, imports in {import_ms:.1f}ms".format(
+                zipped_kb=report["zipped"] / 1024,
+                unzipped_kb=report["unzipped"] / 1024,
+                import_ms=report["import"] * 1000,
+                **report
+            )
+        )
+        print("  " + " ".join(report["modules"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], sys.argv[2])
@@ -12,16 +12,33 @@ def refresh_requirements():
     ).stdout.read()
 
 
+def write_plugin_manifest():
+    # run from the lambda task root, where the plugin directories are
+    subprocess.run(
+        [
+            "pipenv",
+            "run",
+            "python",
+            "-c",
+            "from utils.plugins import write_manifest; write_manifest()",
+        ],
+        cwd="lambdas",
+        check=True,
+    )
+
+
 def build_lambda_image():
     docker_client = docker.from_env()
     docker_client.images.build(path="lambdas/", tag="datalake-lambdas", quiet=False)
 
 
-def get_lambda_zip():
+def get_lambda_zips():
+    # one slim zip per handler, see bundle_lambdas.py
     docker_client = docker.from_env()
-    docker_client.containers.run(
+    report = docker_client.containers.run(
         "datalake-lambdas",
-        "cp /asset-output/lambda.zip /mnt/cdk-data-lake/lambdas",
+        "python3 /mnt/cdk-data-lake/bundle_lambdas.py /asset-output"
+        " /mnt/cdk-data-lake/lambdas",
         volumes={
             path.abspath("."): {
                 "bind": "/mnt/cdk-data-lake",
@@ -30,12 +47,15 @@ def get_lambda_zip():
         },
         remove=True,
     )
+    print(report.decode("utf-8"))
 
 
 if __name__ == "__main__":
     print("refreshing requirements.txt using pipenv")
     refresh_requirements()
+    print("Writing the plugin manifest")
+    write_plugin_manifest()
     print("Building image with requirements.txt")
     build_lambda_image()
-    print("Retrieving zip file for lambda")
-    get_lambda_zip()
+    print("Building a zip file for each lambda")
+    get_lambda_zips()
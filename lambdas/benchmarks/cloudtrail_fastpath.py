@@ -0,0 +1,58 @@
+"""
+normalization throughput for CloudTrail records
+with the cloudtrail fast path plugin vs the generic discovery
+
+run from the lambdas directory:
+    python -m benchmarks.cloudtrail_fastpath
+"""
+
+import copy
+import random
+import time
+from utils.plugins import PluginDispatcher, get_plugins, send_events_to_plugins
+from utils.metrics import PluginStats, MemorySink
+from benchmarks.records import cloudtrail_record
+
+RECORDS = 2000
+
+
+def run(plugins, records):
+    """records/s and per plugin us/event through these plugins"""
+    events = copy.deepcopy(records)
+    stats = PluginStats(sink=MemorySink())
+    start = time.perf_counter()
+    send_events_to_plugins(events, {}, plugins, stats)
+    elapsed = time.perf_counter() - start
+    per_plugin = {
+        name: plugin_metrics["latency_total"] * 1000 / plugin_metrics["events"]
+        for name, plugin_metrics in stats.summary().items()
+    }
+    return len(records) / elapsed, per_plugin
+
+
+def main():
+    fastpath = get_plugins("normalization_plugins")
+    generic = PluginDispatcher(
+        [plugin for plugin in fastpath if "cloudtrail" not in plugin[0].__module__]
+    )
+    rng = random.Random(0)
+    for depth, width in [(1, 3), (2, 4), (3, 6)]:
+        records = [cloudtrail_record(rng, depth, width) for i in range(RECORDS)]
+        print("requestParameters depth {} width {}".format(depth, width))
+        for name, plugins in [("generic", generic), ("fast path", fastpath)]:
+            run(plugins, records[:100])
+            records_per_second, per_plugin = run(plugins, records)
+            print(
+                "  {:<10} {:>8,.0f} records/s  {}".format(
+                    name,
+                    records_per_second,
+                    ", ".join(
+                        "{} {:.1f}us".format(plugin.replace("normalization_", ""), us)
+                        for plugin, us in sorted(per_plugin.items())
+                    ),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+allocations and time for the event shell on large CloudTrail records:
+the deep copying merge it used to call vs the in place merge_defaults
+
+run from the lambdas directory:
+    python -m benchmarks.event_shell_merge
+"""
+
+import random
+import time
+import tracemalloc
+from copy import deepcopy
+from utils.dict_helpers import merge, merge_defaults
+from normalization_plugins.event_shell import message as event_shell
+from benchmarks.records import cloudtrail_record
+
+RECORDS = 200
+
+
+def shell():
+    return {
+        "utctimestamp": "2020-09-01T00:00:00+00:00",
+        "severity": "INFO",
+        "summary": "UNKNOWN",
+        "category": "UNKNOWN",
+        "source": "UNKNOWN",
+        "tags": [],
+        "plugins": [],
+        "details": {},
+    }
+
+
+def copying(record):
+    return merge(shell(), record)
+
+
+def in_place(record):
+    merge_defaults(record, shell())
+    return record
+
+
+def measure(function, records):
+    """
+    seconds to run function over (copies of) records
+    and the peak traced bytes doing it again, keeping the results
+    like the processor does until the batch is encoded
+    """
+    timed = deepcopy(records)
+    start = time.perf_counter()
+    for record in timed:
+        function(record)
+    elapsed = time.perf_counter() - start
+
+    traced = deepcopy(records)
+    tracemalloc.start()
+    results = [function(record) for record in traced]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del results
+    return elapsed, peak
+
+
+def main():
+    rng = random.Random(0)
+    print("depth width    record  merge(ms)  peak(KB)  defaults(ms)  peak(KB)")
+    for depth, width in [(2, 3), (3, 6), (4, 8)]:
+        records = [cloudtrail_record(rng, depth, width) for i in range(RECORDS)]
+        size = len(str(records[0]))
+        merge_time, merge_peak = measure(copying, records)
+        defaults_time, defaults_peak = measure(in_place, records)
+        print(
+            "{:>5} {:>5} {:>7}B {:>10.2f} {:>9,.0f} {:>13.2f} {:>9,.0f}".format(
+                depth,
+                width,
+                size,
+                merge_time * 1000,
+                merge_peak / 1024,
+                defaults_time * 1000,
+                defaults_peak / 1024,
+            )
+        )
+
+    # and the plugin end to end
+    plugin = event_shell()
+    records = [cloudtrail_record(rng, 4, 8) for i in range(RECORDS)]
+    elapsed, peak = measure(lambda record: plugin.onMessage(record, {}), records)
+    print(
+        "event_shell plugin, {} records: {:.2f}ms, peak {:,.0f}KB".format(
+            RECORDS, elapsed * 1000, peak / 1024
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
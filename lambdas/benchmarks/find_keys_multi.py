@@ -0,0 +1,95 @@
+"""
+ip address candidate discovery on CloudTrail records
+with increasingly deep requestParameters:
+a find_keys walk per likely field vs one find_keys_multi walk
+
+run from the lambdas directory:
+    python -m benchmarks.find_keys_multi
+"""
+
+import random
+import timeit
+from utils.dict_helpers import find_keys, find_keys_multi, KeyIndex
+from normalization_plugins.event_shell import message as event_shell
+from normalization_plugins.lowercase_keys import message as lowercase_keys
+from benchmarks.records import cloudtrail_record
+
+# as in the ip_addresses plugin
+LIKELY_FIELDS = [
+    "src",
+    "srcaddr",
+    "srcip",
+    "src_ip",
+    "source_ip",
+    "sourceipaddress",
+    "source_ip_address",
+    "c-ip",
+    "clientip",
+    "remoteip",
+    "remote_ip",
+    "remoteaddr",
+    "remote_host_ip_address",
+    "ipaddress",
+    "ip_address",
+    "ipaddr",
+    "id_orig_h",
+    "x-forwarded-for",
+    "http-x-forwarded-for",
+    "dst",
+    "dstip",
+    "dst_ip",
+    "dstaddr",
+    "dest",
+    "destaddr",
+    "dest_ip",
+    "destination_ip",
+    "destinationipaddress",
+    "destination_ip_address",
+    "id_resp_h",
+    "serverip",
+]
+
+
+def per_field_find_keys(event):
+    """a find_keys walk per likely field"""
+    candidates = {}
+    for field in LIKELY_FIELDS:
+        values = list(find_keys(event, field))
+        if values:
+            candidates[field] = values
+    return candidates
+
+
+def one_walk(event):
+    return find_keys_multi(event, LIKELY_FIELDS)
+
+
+def index_locate(event):
+    return KeyIndex(event).locate(LIKELY_FIELDS)
+
+
+def main():
+    rng = random.Random(0)
+    print("depth width  keys  per field(us)  multi(us)  index+locate(us)")
+    for depth, width in [(1, 3), (2, 4), (3, 6), (4, 8)]:
+        event = cloudtrail_record(rng, depth, width)
+        event, metadata = event_shell().onMessage(event, {})
+        event, metadata = lowercase_keys().onMessage(event, metadata)
+        assert per_field_find_keys(event) == one_walk(event)
+        keys = sum(len(entries) for entries in KeyIndex(event).entries.values())
+        number = max(int(20000 / keys), 3)
+        timings = [
+            min(timeit.repeat(lambda: function(event), number=number, repeat=3))
+            / number
+            * 1e6
+            for function in [per_field_find_keys, one_walk, index_locate]
+        ]
+        print(
+            "{:>5} {:>5} {:>5} {:>14.1f} {:>10.1f} {:>17.1f}".format(
+                depth, width, keys, *timings
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
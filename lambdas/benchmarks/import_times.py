@@ -0,0 +1,110 @@
+"""
+what a cold start imports: each handler is imported in a fresh
+interpreter with -X importtime and we report the total, the cost of
+each module it imports directly and any heavy modules that came along.
+The processor is also measured through building its plugin registries,
+which every cold start does before the first record.
+
+run from the lambdas directory:
+    python -m benchmarks.import_times
+"""
+
+import os
+import subprocess
+import sys
+
+# modules no handler should load just by being imported
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "pyathena",
+    "dateutil",
+    "tzlocal",
+    "netaddr",
+    "chevron",
+    "pynsive",
+    "multiprocessing",
+]
+
+# ms for python -X importtime -c "import <handler>", only checked
+# by the tests when set, wall clock time on a shared CI box isn't reliable
+IMPORT_BUDGET_MS = (
+    int(os.environ["IMPORT_BUDGET_MS"]) if os.environ.get("IMPORT_BUDGET_MS") else None
+)
+
+HANDLERS = ["processor", "s3_to_firehose", "generate_partitions"]
+
+FIRST_BATCH = (
+    "import processor;"
+    " processor.get_plugins('normalization_plugins');"
+    " processor.get_plugins('enrichment_plugins')"
+)
+
+
+def import_times(code):
+    """
+    run code in a fresh interpreter with -X importtime from the lambdas
+    directory, returns [(depth, module, self us, cumulative us)]
+    for the imports it made, in the order they finished
+    """
+    lambdas = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=lambdas,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1])
+    # interpreter start up imports come first, the code's come after
+    lines = completed.stderr.splitlines()
+    site = max(i for i, line in enumerate(lines) if line.endswith("| site"))
+    lines = lines[site + 1 :]
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), int(own), int(cumulative)))
+    return imports
+
+
+def total_ms(imports):
+    """ms for everything imported at the top level"""
+    return (
+        sum(cumulative for depth, name, own, cumulative in imports if depth == 0)
+        / 1000
+    )
+
+
+def heavy_modules(imports):
+    """the HEAVY_MODULES (or their submodules) that were imported"""
+    loaded = set(name.split(".")[0] for depth, name, own, cumulative in imports)
+    return [name for name in HEAVY_MODULES if name in loaded]
+
+
+def report(label, imports, top=8):
+    print("{}: {:.1f}ms".format(label, total_ms(imports)))
+    # what the handler imports directly and everything under it
+    direct = [entry for entry in imports if entry[0] == 1]
+    direct.sort(key=lambda entry: entry[3], reverse=True)
+    for depth, name, own, cumulative in direct[:top]:
+        print("  {:<36} {:>8.1f}ms".format(name, cumulative / 1000))
+    print("  heavy modules: {}".format(", ".join(heavy_modules(imports)) or "none"))
+
+
+def main():
+    for handler in HANDLERS:
+        try:
+            imports = import_times("import " + handler)
+        except ImportError as e:
+            print("{}: can't import here ({})".format(handler, e))
+            continue
+        report(handler, imports)
+    report("processor + plugin registries", import_times(FIRST_BATCH))
+
+
+if __name__ == "__main__":
+    main()
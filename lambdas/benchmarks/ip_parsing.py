@@ -0,0 +1,55 @@
+"""
+ip validation on a repeating working set of addresses (and some non ips):
+netaddr.IPNetwork in a try/except vs the cached utils.ip_helpers
+
+run from the lambdas directory:
+    python -m benchmarks.ip_parsing
+"""
+
+import random
+import timeit
+from utils.ip_helpers import is_ip, classify_ip
+from benchmarks.records import random_ip
+
+try:
+    import netaddr
+except ImportError:
+    netaddr = None
+
+CANDIDATES = 100000
+
+
+def netaddr_is_ip(ip):
+    """helpers.is_ip as it was"""
+    try:
+        if ("." in ip) or (":" in ip):
+            netaddr.IPNetwork(ip)
+            return True
+        else:
+            return False
+    except Exception:
+        return False
+
+
+def main():
+    rng = random.Random(0)
+    for working_set in [100, 1000, 10000]:
+        addresses = [random_ip(rng) for i in range(working_set)]
+        addresses += ["config.amazonaws.com", "nada", "1320.2555.2555.2555"]
+        candidates = [rng.choice(addresses) for i in range(CANDIDATES)]
+        row = ["working set {:>6}:".format(working_set)]
+        functions = [("is_ip", is_ip), ("classify_ip", classify_ip)]
+        if netaddr:
+            functions.insert(0, ("netaddr", netaddr_is_ip))
+        for name, function in functions:
+            seconds = min(
+                timeit.repeat(
+                    lambda: [function(ip) for ip in candidates], number=1, repeat=3
+                )
+            )
+            row.append("{} {:.2f}us".format(name, seconds / CANDIDATES * 1e6))
+        print("  ".join(row))
+
+
+if __name__ == "__main__":
+    main()
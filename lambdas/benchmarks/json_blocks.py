@@ -0,0 +1,112 @@
+"""
+scanning new line delimited/concatenated json files: the character at a
+time emit_json_block we used to have vs the chunked raw_decode scanner
+(utils.streams, which emit_json_block is now built on), reading files
+from disk so the input isn't held in memory.
+The old scanner is only run on the smaller files, it's too slow for more.
+
+run from the lambdas directory:
+    python -m benchmarks.json_blocks [MB ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import TextIOWrapper
+from utils.codec import dumps
+from utils.helpers import emit_json_block
+from benchmarks.records import records
+
+SIZES_MB = [1, 10, 100, 300]
+# largest file to run the old scanner on
+OLD_SCANNER_MB = 10
+
+
+def character_scanner(stream):
+    """emit_json_block as it was"""
+    open_brackets = 0
+    block = ""
+    while True:
+        c = stream.read(1)
+        if not c:
+            break
+
+        if c == "{":
+            open_brackets += 1
+        elif c == "}":
+            open_brackets -= 1
+        block += c
+
+        if open_brackets == 0:
+            yield block.strip()
+            block = ""
+
+
+def write_file(path, megabytes):
+    """
+    mixed records, one per line with every tenth one concatenated to
+    the next, and braces in string values like we see in the wild
+    """
+    sample = records(1000)
+    for i, record in enumerate(sample):
+        record["note"] = "a {brace} or two {{" if i % 3 == 0 else "}"
+    lines = [
+        dumps(record) + ("" if i % 10 == 0 else "\n")
+        for i, record in enumerate(sample)
+    ]
+    chunk = "".join(lines).encode("utf-8")
+    written = 0
+    with open(path, "wb") as f:
+        while written < megabytes * 1024 * 1024:
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def scan(scanner, path, text=False):
+    """blocks found in the file and the seconds it took"""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        stream = TextIOWrapper(f, encoding="utf-8") if text else f
+        blocks = sum(1 for block in scanner(stream) if block)
+    return blocks, time.perf_counter() - start
+
+
+def peak(scanner, path):
+    """peak traced bytes scanning the file"""
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        for block in scanner(f):
+            pass
+    traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return traced
+
+
+def main(sizes):
+    print("   MB   blocks  scanner(MB/s)  peak(KB)  old scanner(MB/s)  old blocks")
+    with tempfile.TemporaryDirectory() as directory:
+        for megabytes in sizes:
+            path = os.path.join(directory, "{}.json".format(megabytes))
+            size = write_file(path, megabytes) / (1024 * 1024)
+            blocks, elapsed = scan(emit_json_block, path)
+            old = "{:>18} {:>11}".format("-", "-")
+            if megabytes <= OLD_SCANNER_MB:
+                old_blocks, old_elapsed = scan(character_scanner, path, text=True)
+                old = "{:>18.1f} {:>11,}".format(size / old_elapsed, old_blocks)
+            print(
+                "{:>5.0f} {:>8,} {:>14.1f} {:>9,.0f} {}".format(
+                    size,
+                    blocks,
+                    size / elapsed,
+                    peak(emit_json_block, path) / 1024,
+                    old,
+                )
+            )
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES_MB)
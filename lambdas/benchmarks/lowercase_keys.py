@@ -0,0 +1,77 @@
+"""
+allocations and time for lowercasing keys: the rebuild of every dict
+and list the plugin used to do vs the in place lower_keys,
+on CloudTrail (mostly camelCase keys) and GSuite (mostly lowercase) records
+
+run from the lambdas directory:
+    python -m benchmarks.lowercase_keys
+"""
+
+import time
+import tracemalloc
+from copy import deepcopy
+from normalization_plugins.lowercase_keys import lower_keys
+from benchmarks.records import records
+
+RECORDS = 2000
+ROUNDS = 5
+
+
+def rebuilding(node):
+    if isinstance(node, dict):
+        return {key.lower(): rebuilding(item) for key, item in node.items()}
+    elif isinstance(node, list):
+        return [rebuilding(item) for item in node]
+    else:
+        return node
+
+
+def measure(function, sample):
+    """
+    best seconds to run function over (copies of) the sample
+    and the traced bytes (peak, still held) doing it again, keeping
+    the results like the processor does until the batch is encoded
+    """
+    elapsed = None
+    for round in range(ROUNDS):
+        timed = deepcopy(sample)
+        start = time.perf_counter()
+        for record in timed:
+            function(record)
+        took = time.perf_counter() - start
+        elapsed = took if elapsed is None else min(elapsed, took)
+
+    traced = deepcopy(sample)
+    tracemalloc.start()
+    results = [function(record) for record in traced]
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return elapsed, peak, held
+
+
+def main():
+    print("source        rebuild(ms)  peak(KB)  held(KB)  in place(ms)  peak(KB)  held(KB)")
+    for name, mix in [
+        ("cloudtrail", {"cloudtrail": 1}),
+        ("gsuite", {"gsuite": 1}),
+        ("vpc flow", {"vpcflow": 1}),
+    ]:
+        sample = records(RECORDS, mix)
+        before = measure(rebuilding, sample)
+        after = measure(lower_keys, sample)
+        print(
+            "{:<12} {:>12.2f} {:>9,.0f} {:>9,.0f} {:>13.2f} {:>9,.0f} {:>9,.0f}".format(
+                name,
+                before[0] * 1000,
+                before[1] / 1024,
+                before[2] / 1024,
+                after[0] * 1000,
+                after[1] / 1024,
+                after[2] / 1024,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
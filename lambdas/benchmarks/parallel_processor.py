@@ -0,0 +1,70 @@
+"""
+serial vs process-parallel processor throughput by batch size
+to find where sharding a batch across workers starts paying for the fork
+
+run from the lambdas directory:
+    python -m benchmarks.parallel_processor [workers]
+"""
+import os
+import sys
+import time
+import base64
+from utils.plugins import get_plugins
+from processor import process_records, process_records_parallel
+
+BATCH_SIZES = [10, 50, 100, 200, 500, 1000, 2000]
+SAMPLES = [
+    "tests/samples/sample_cloudtrail_create_log_stream.json",
+    "tests/samples/sample_gsuite_login_event.json",
+    "tests/samples/sample_vpc_flow_log.json",
+    "tests/samples/sample_cloudfront_wordpress_probe.json",
+]
+
+
+def firehose_records(count):
+    payloads = []
+    for sample in SAMPLES:
+        with open(sample, "rb") as f:
+            payloads.append(base64.b64encode(f.read()).decode("utf-8"))
+    return [
+        {"recordId": str(i), "data": payloads[i % len(payloads)]}
+        for i in range(count)
+    ]
+
+
+def best_of(runs, function, *args):
+    best = None
+    for run in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    # load the plugins once, forked workers inherit them
+    get_plugins("normalization_plugins")
+    get_plugins("enrichment_plugins")
+    print(f"{os.cpu_count()} cpus, {workers} workers")
+    print("records  serial(ms)  parallel(ms)  speedup")
+    crossover = None
+    for count in BATCH_SIZES:
+        records = firehose_records(count)
+        serial = best_of(3, process_records, records, {})
+        parallel = best_of(3, process_records_parallel, records, {}, workers)
+        speedup = serial / parallel
+        if crossover is None and speedup > 1:
+            crossover = count
+        print(
+            f"{count:>7}  {serial * 1000:>10.1f}  {parallel * 1000:>12.1f}  {speedup:>7.2f}"
+        )
+    if crossover:
+        print(f"parallel wins from ~{crossover} records, set PARALLEL_MIN_RECORDS")
+    else:
+        print("parallel never won, leave PROCESSOR_WORKERS=1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+normalization throughput with and without the execution plan cache
+and a check that both produce the same events
+
+run from the lambdas directory:
+    python -m benchmarks.plan_cache
+"""
+
+import copy
+import time
+from utils.plugins import PluginDispatcher, get_plugins, send_events_to_plugins
+from utils.plans import PlanCache
+from utils.dates import utcnow
+from benchmarks.records import records
+
+RECORDS = 4000
+ROUNDS = 3
+
+
+def run(plugins, sample):
+    """best records/s over a few rounds and the events from the last one"""
+    best = 0
+    for round in range(ROUNDS):
+        events = copy.deepcopy(sample)
+        start = time.perf_counter()
+        events, metadata = send_events_to_plugins(events, {}, plugins)
+        best = max(best, len(sample) / (time.perf_counter() - start))
+    return best, events
+
+
+def stable(event, started):
+    """the event less the timestamps of when it went through the pipeline"""
+    if event is None:
+        return None
+    event = copy.deepcopy(event)
+    event["details"].pop("_utcprocessedtimestamp", None)
+    if event["utctimestamp"] >= started:
+        # no timestamp in the event, the shell's default
+        event.pop("utctimestamp")
+    return event
+
+
+def main():
+    registry = get_plugins("normalization_plugins")
+    started = utcnow().isoformat()
+    for name, mix in [
+        ("mixed sources", None),
+        ("vpc flow logs", {"vpcflow": 1}),
+        ("gsuite logins", {"gsuite": 1}),
+        ("cloudtrail", {"cloudtrail": 1}),
+        ("freeform", {"freeform": 1}),
+    ]:
+        sample = records(RECORDS, mix)
+        without = PluginDispatcher(registry)
+        without.plans = PlanCache(0)
+        planned = PluginDispatcher(registry)
+        without_rate, without_events = run(without, sample)
+        planned_rate, planned_events = run(planned, sample)
+        differences = sum(
+            1
+            for before, after in zip(without_events, planned_events)
+            if stable(before, started) != stable(after, started)
+        )
+        print(
+            "{:<14} no plans {:>8,.0f} records/s  plans {:>8,.0f} records/s"
+            "  {:+.0%}  {} differences  {}".format(
+                name,
+                without_rate,
+                planned_rate,
+                planned_rate / without_rate - 1,
+                differences,
+                planned.plans.summary(),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
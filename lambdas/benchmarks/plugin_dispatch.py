@@ -0,0 +1,83 @@
+"""
+per-record plugin dispatch cost as the number of registered plugins grows
+
+run from the lambdas directory:
+    python -m benchmarks.plugin_dispatch
+"""
+import json
+import timeit
+from operator import itemgetter
+from utils.plugins import PluginDispatcher, event_criteria_values
+
+PLUGIN_COUNTS = [5, 25, 100, 400]
+RECORDS = 2000
+
+
+class keyed_plugin(object):
+    def __init__(self, registration):
+        self.registration = registration
+        self.priority = 20
+
+    def onMessage(self, message, metadata):
+        return (message, metadata)
+
+
+def legacy_send_event_to_plugins(anevent, metadata, pluginList):
+    """the pre-compiled dispatcher: sort and intersect for every plugin"""
+    executed_plugins = []
+    for plugin in sorted(pluginList, key=itemgetter(2), reverse=False):
+        send = False
+        if "*" in plugin[1]:
+            send = True
+        else:
+            plugin_matching_keys = set([item.lower() for item in plugin[1]])
+            event_tokens = [e for e in event_criteria_values(anevent)]
+            if plugin_matching_keys.intersection(event_tokens):
+                send = True
+        if send:
+            (anevent, metadata) = plugin[0].onMessage(anevent, metadata)
+            executed_plugins.append(plugin[0].__module__.replace("plugins.", ""))
+    anevent["plugins"] = executed_plugins
+    return (anevent, metadata)
+
+
+def sample_event():
+    with open("tests/samples/sample_cloudtrail_create_log_stream.json", "r") as f:
+        return json.loads(f.read())
+
+
+def plugin_list(count):
+    # one wildcard plugin, the rest registered for fields
+    # that mostly don't appear in the event
+    plugins = [(keyed_plugin(["*"]), ["*"], 1)]
+    for i in range(count - 2):
+        registration = ["field{}".format(i), "other{}".format(i)]
+        plugins.append((keyed_plugin(registration), registration, 20))
+    plugins.append((keyed_plugin(["eventname"]), ["eventname"], 30))
+    return plugins
+
+
+def per_record_usec(send, plugins):
+    event = sample_event()
+
+    def one_record():
+        send(event, {}, plugins)
+        # don't let the plugins tag list grow across iterations
+        del event["plugins"]
+
+    seconds = timeit.timeit(one_record, number=RECORDS)
+    return seconds / RECORDS * 1000000
+
+
+def main():
+    print("plugins  legacy(us/record)  compiled(us/record)")
+    for count in PLUGIN_COUNTS:
+        plugins = plugin_list(count)
+        dispatcher = PluginDispatcher(plugins)
+        legacy = per_record_usec(legacy_send_event_to_plugins, plugins)
+        compiled = per_record_usec(lambda e, m, p: dispatcher.dispatch(e, m), plugins)
+        print(f"{count:>7}  {legacy:>17.1f}  {compiled:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
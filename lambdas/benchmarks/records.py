@@ -0,0 +1,212 @@
+"""
+synthetic log records shaped like what arrives at the firehose transform
+and the firehose transform events that carry them
+"""
+
+import base64
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+EPOCH = datetime(2020, 9, 1)
+EVENT_NAMES = [
+    "ConsoleLogin",
+    "CreateLogStream",
+    "DescribeInstances",
+    "GetObject",
+    "PutObject",
+    "AssumeRole",
+    "ListBuckets",
+]
+EVENT_SOURCES = [
+    "signin.amazonaws.com",
+    "logs.amazonaws.com",
+    "ec2.amazonaws.com",
+    "s3.amazonaws.com",
+    "sts.amazonaws.com",
+]
+
+
+def random_ip(rng):
+    return "{}.{}.{}.{}".format(
+        rng.randint(1, 223),
+        rng.randint(0, 255),
+        rng.randint(0, 255),
+        rng.randint(1, 254),
+    )
+
+
+def random_time(rng):
+    return EPOCH + timedelta(seconds=rng.randint(0, 86400 * 30))
+
+
+def nested_parameters(rng, depth, width):
+    """requestParameters style nesting, depth levels of width keys"""
+    if depth == 0:
+        return rng.choice(
+            ["i-0123456789abcdef0", "us-west-2", random_ip(rng), "true", 42]
+        )
+    return {
+        "param{}".format(i): (
+            [nested_parameters(rng, depth - 1, width)]
+            if i % 3 == 2
+            else nested_parameters(rng, depth - 1, width)
+        )
+        for i in range(width)
+    }
+
+
+def cloudtrail_record(rng, depth=2, width=3):
+    event_time = random_time(rng)
+    return {
+        "eventVersion": "1.05",
+        "userIdentity": {
+            "type": "AssumedRole",
+            "principalId": "AROAIQ45SXVRIH72NM:some_lambda",
+            "arn": "arn:aws:sts::123456789012:assumed-role/some_role/some_lambda",
+            "accountId": "123456789012",
+            "accessKeyId": "AROAIQ45SXVRIH72NM",
+            "sessionContext": {
+                "attributes": {
+                    "mfaAuthenticated": "false",
+                    "creationDate": (event_time - timedelta(hours=1)).strftime(
+                        "%Y-%m-%dT%H:%M:%SZ"
+                    ),
+                },
+                "sessionIssuer": {
+                    "type": "Role",
+                    "principalId": "AROAIQ45SXVRIH72NM",
+                    "arn": "arn:aws:iam::123456789012:role/some_role",
+                    "accountId": "123456789012",
+                    "userName": "some_role",
+                },
+            },
+        },
+        "eventTime": event_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "eventSource": rng.choice(EVENT_SOURCES),
+        "eventName": rng.choice(EVENT_NAMES),
+        "awsRegion": "us-west-2",
+        "sourceIPAddress": random_ip(rng),
+        "userAgent": "aws-sdk-go/1.25.41 (go1.13.3; linux; amd64)",
+        "requestParameters": nested_parameters(rng, depth, width),
+        "responseElements": None,
+        "requestID": str(uuid.UUID(int=rng.getrandbits(128))),
+        "eventID": str(uuid.UUID(int=rng.getrandbits(128))),
+        "eventType": "AwsApiCall",
+        "recipientAccountId": "123456789012",
+        "source": "cloudtrail",
+    }
+
+
+def gsuite_login_record(rng):
+    return {
+        "kind": "admin#reports#activity",
+        "id": {
+            "time": random_time(rng).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+            "uniqueQualifier": str(rng.randint(10**11, 10**12)),
+            "applicationName": "login",
+            "customerId": "123456bbh",
+        },
+        "etag": '"12345684sebSczDxOtZ17CIssbQ/fcUkSWOHV-mPDcYGbkgHvS5ghwg"',
+        "actor": {
+            "email": "user{}@somewhere.com".format(rng.randint(1, 500)),
+            "profileId": str(rng.randint(10**20, 10**21)),
+        },
+        "ipAddress": random_ip(rng),
+        "events": [
+            {
+                "type": "login",
+                "name": rng.choice(["login_success", "login_failure"]),
+                "parameters": [
+                    {"name": "login_type", "value": "exchange"},
+                    {"name": "login_challenge_method", "multiValue": ["none"]},
+                    {"name": "is_suspicious", "boolValue": rng.random() < 0.01},
+                ],
+            }
+        ],
+    }
+
+
+def vpc_flow_record(rng):
+    start = random_time(rng)
+    return {
+        "account_id": "123456789010",
+        "action": rng.choice(["ACCEPT", "REJECT"]),
+        "bytes": rng.randint(40, 100000),
+        "dstaddr": random_ip(rng),
+        "dstport": rng.randint(1, 65535),
+        "end": (start + timedelta(seconds=60)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "interface_id": "eni-102010ab",
+        "log_status": "OK",
+        "packets": rng.randint(1, 100),
+        "protocol": 6,
+        "srcaddr": random_ip(rng),
+        "srcport": rng.randint(1, 65535),
+        "start": start.strftime("%Y-%m-%dT%H:%M:%S"),
+        "version": 2,
+    }
+
+
+def freeform_record(rng, keys=20):
+    """arbitrary nested json with no well known fields"""
+    record = {}
+    for i in range(keys):
+        if i % 5 == 4:
+            record["Section{}".format(i)] = {
+                "Nested{}".format(j): "value {}".format(rng.random()) for j in range(4)
+            }
+        else:
+            record["Field{}".format(i)] = rng.choice(
+                ["some text", rng.randint(0, 10**6), rng.random(), True, None]
+            )
+    return record
+
+
+GENERATORS = {
+    "cloudtrail": cloudtrail_record,
+    "gsuite": gsuite_login_record,
+    "vpcflow": vpc_flow_record,
+    "freeform": freeform_record,
+}
+
+
+def pad_record(record, record_bytes):
+    """grow a record with a padding field to roughly record_bytes of json"""
+    size = len(json.dumps(record))
+    if record_bytes and size < record_bytes:
+        record["padding"] = "x" * (record_bytes - size - len(',"padding":""'))
+    return record
+
+
+def records(count, mix=None, record_bytes=None, seed=0):
+    """
+    count synthetic records, mix is a dict of generator name: weight
+    """
+    rng = random.Random(seed)
+    mix = mix or {name: 1 for name in GENERATORS}
+    names = list(mix.keys())
+    weights = [mix[name] for name in names]
+    return [
+        pad_record(GENERATORS[rng.choices(names, weights)[0]](rng), record_bytes)
+        for i in range(count)
+    ]
+
+
+def firehose_event(payloads):
+    """a firehose transform invocation event carrying these records"""
+    return {
+        "invocationId": str(uuid.uuid4()),
+        "deliveryStreamArn": "arn:aws:firehose:us-west-2:123456789012:deliverystream/defenda_data_lake_s3_stream",
+        "region": "us-west-2",
+        "records": [
+            {
+                "recordId": "{:056d}".format(i),
+                "approximateArrivalTimestamp": 1598982498000,
+                "data": base64.b64encode(json.dumps(payload).encode("utf-8")).decode(
+                    "utf-8"
+                ),
+            }
+            for i, payload in enumerate(payloads)
+        ],
+    }
@@ -0,0 +1,202 @@
+"""
+replay synthetic firehose transform batches through processor.lambda_handler
+and report throughput, per plugin cost, peak RSS and allocations
+
+run from the lambdas directory:
+    python -m benchmarks.replay --batches 10 --batch-size 500
+    python -m benchmarks.replay --mix cloudtrail=4,gsuite=1 --record-bytes 4096
+    python -m benchmarks.replay --save baseline.json
+    python -m benchmarks.replay --baseline baseline.json --max-regression 0.10
+"""
+
+import argparse
+import gc
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+import processor
+from utils.metrics import MemorySink
+from benchmarks.records import records, firehose_event, GENERATORS
+
+
+class FakeContext(object):
+    """just enough of a lambda context for the processor"""
+
+    function_version = "$LATEST"
+    invoked_function_arn = "arn:aws:lambda:us-west-2:123456789012:function:defenda_data_lake_firehose_input"
+    function_name = "defenda_data_lake_firehose_input"
+    memory_limit_in_mb = "1024"
+    aws_request_id = "replay"
+
+    def get_remaining_time_in_millis(self):
+        return 100000
+
+
+def parse_mix(text):
+    """cloudtrail=4,gsuite=1 -> {'cloudtrail': 4, 'gsuite': 1}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in GENERATORS:
+            raise ValueError(
+                "unknown record type {}, pick from {}".format(
+                    name, ", ".join(GENERATORS)
+                )
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def peak_rss_bytes():
+    # ru_maxrss is kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def replay(batches=5, batch_size=500, mix=None, record_bytes=None, allocations=False):
+    """
+    run the batches through the processor and return a dict of results
+    """
+    events = [
+        firehose_event(
+            records(batch_size, mix=mix, record_bytes=record_bytes, seed=batch)
+        )
+        for batch in range(batches)
+    ]
+    input_bytes = sum(
+        len(record["data"]) for event in events for record in event["records"]
+    )
+    # collect the plugin metrics rather than print them
+    sink = MemorySink()
+    processor.metrics_sink = sink
+    # and warm the plugin registry so we measure steady state
+    processor.lambda_handler({"records": []}, FakeContext())
+    sink.lines = []
+
+    gc.collect()
+    if allocations:
+        tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    gc_before = sum(stat["collections"] for stat in gc.get_stats())
+    start = time.perf_counter()
+    results = 0
+    for event in events:
+        results += len(processor.lambda_handler(event, FakeContext())["records"])
+    elapsed = time.perf_counter() - start
+    gc_collections = sum(stat["collections"] for stat in gc.get_stats()) - gc_before
+    blocks = sys.getallocatedblocks() - blocks_before
+    traced_peak = None
+    if allocations:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    plugins = {}
+    for record in sink.records():
+        if "plugin" not in record:
+            continue
+        totals = plugins.setdefault(
+            record["plugin"], {"calls": 0, "latency_total": 0.0, "latency_p99": 0.0}
+        )
+        totals["calls"] += record["calls"]
+        totals["latency_total"] += record["latency_total"]
+        totals["latency_p99"] = max(totals["latency_p99"], record["latency_p99"])
+
+    return {
+        "records": results,
+        "seconds": elapsed,
+        "records_per_second": results / elapsed,
+        "bytes_per_second": input_bytes / elapsed,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "allocated_blocks_delta": blocks,
+        "gc_collections": gc_collections,
+        "traced_peak_bytes": traced_peak,
+        "plugins": plugins,
+    }
+
+
+def report(result):
+    print(
+        "{records} records in {seconds:.3f}s: {records_per_second:,.0f} records/s, "
+        "{mb:,.2f} MB/s".format(mb=result["bytes_per_second"] / 1e6, **result)
+    )
+    print("peak RSS {:,.1f} MB".format(result["peak_rss_bytes"] / 1e6))
+    print(
+        "allocated blocks delta {:,}, gc collections {}".format(
+            result["allocated_blocks_delta"], result["gc_collections"]
+        )
+    )
+    if result["traced_peak_bytes"] is not None:
+        print(
+            "traced allocation peak {:,.1f} MB".format(
+                result["traced_peak_bytes"] / 1e6
+            )
+        )
+    print("plugin                                calls   total(ms)  us/call  p99(ms)")
+    for name, totals in sorted(
+        result["plugins"].items(), key=lambda item: -item[1]["latency_total"]
+    ):
+        print(
+            "{:<36} {:>8} {:>11.1f} {:>8.1f} {:>8.3f}".format(
+                name,
+                totals["calls"],
+                totals["latency_total"],
+                totals["latency_total"] * 1000 / max(totals["calls"], 1),
+                totals["latency_p99"],
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=None,
+        help="record types and weights, i.e. cloudtrail=4,gsuite=1,vpcflow=1,freeform=1",
+    )
+    parser.add_argument(
+        "--record-bytes", type=int, default=None, help="pad records to about this size"
+    )
+    parser.add_argument(
+        "--allocations", action="store_true", help="trace allocations (slower)"
+    )
+    parser.add_argument("--save", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="compare to results saved with --save")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.10,
+        help="fail if records/s drops more than this fraction below the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    # the processor logs every failed record etc, keep the report readable
+    logging.getLogger().setLevel(logging.CRITICAL)
+    result = replay(
+        batches=args.batches,
+        batch_size=args.batch_size,
+        mix=args.mix,
+        record_bytes=args.record_bytes,
+        allocations=args.allocations,
+    )
+    report(result)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        change = result["records_per_second"] / baseline["records_per_second"] - 1
+        print("{:+.1%} records/s vs baseline".format(change))
+        if change < -args.max_regression:
+            print("throughput regression beyond {:.0%}".format(args.max_regression))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
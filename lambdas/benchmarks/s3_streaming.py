@@ -0,0 +1,85 @@
+"""
+time and peak memory for reading a gzipped CloudTrail object:
+the whole body read, gunzipped, decoded and listed like s3_to_firehose
+used to vs streamed with utils.streams in firehose sized batches
+
+run from the lambdas directory:
+    python -m benchmarks.s3_streaming
+"""
+
+import gzip
+import random
+import time
+import tracemalloc
+from io import BytesIO, TextIOWrapper
+from utils.codec import loads, dumps
+from utils.streams import json_records, text_chunks
+from benchmarks.records import cloudtrail_record
+
+BATCH_SIZE = 100
+
+
+def cloudtrail_object(count):
+    """a gzipped CloudTrail log file of count records"""
+    rng = random.Random(0)
+    document = {"Records": [cloudtrail_record(rng) for i in range(count)]}
+    return gzip.compress(dumps(document).encode("utf-8"))
+
+
+def in_memory(body):
+    """the whole object decompressed and decoded at once"""
+    with gzip.GzipFile(fileobj=BytesIO(body.read())) as gzip_stream:
+        s3_data = "".join(TextIOWrapper(gzip_stream, encoding="utf-8"))
+    records = []
+    for record in loads(s3_data)["Records"]:
+        record["source"] = "cloudtrail"
+        records.append(record)
+    return len(records)
+
+
+def streamed(body):
+    """records decoded as they're read, a batch at a time"""
+    count = 0
+    batch = []
+    for record in json_records(text_chunks(body, gzipped=True)):
+        record["source"] = "cloudtrail"
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            count += len(batch)
+            batch = []
+    return count + len(batch)
+
+
+def measure(function, data):
+    """seconds and peak traced bytes to read data with function"""
+    start = time.perf_counter()
+    count = function(BytesIO(data))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(BytesIO(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    print("records  object(KB)  in memory(ms)  peak(KB)  streamed(ms)  peak(KB)")
+    for count in [1000, 10000, 50000]:
+        data = cloudtrail_object(count)
+        records, memory_time, memory_peak = measure(in_memory, data)
+        streamed_records, streamed_time, streamed_peak = measure(streamed, data)
+        assert records == streamed_records == count
+        print(
+            "{:>7} {:>11,.0f} {:>14.1f} {:>9,.0f} {:>13.1f} {:>9,.0f}".format(
+                count,
+                len(data) / 1024,
+                memory_time * 1000,
+                memory_peak / 1024,
+                streamed_time * 1000,
+                streamed_peak / 1024,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
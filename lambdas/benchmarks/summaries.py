@@ -0,0 +1,54 @@
+"""
+rendering the gsuite login summary: chevron.render with the template
+string each time vs the compiled template from utils.summaries
+
+run from the lambdas directory:
+    python -m benchmarks.summaries
+"""
+
+import random
+import timeit
+import chevron
+from utils.summaries import render_summary
+from benchmarks.records import gsuite_login_record
+
+TEMPLATES = {
+    "gsuite": "{{details.user}} {{details.events.0.name}} from IP {{details.sourceipaddress}}",
+    "section": "{{details.user}}: {{#details.events}}{{name}} {{/details.events}}",
+}
+EVENTS = 1000
+
+
+def main():
+    rng = random.Random(0)
+    events = []
+    for i in range(EVENTS):
+        record = gsuite_login_record(rng)
+        record["user"] = record["actor"]["email"]
+        record["sourceipaddress"] = record.pop("ipAddress")
+        events.append({"details": record})
+
+    for name, template in TEMPLATES.items():
+        for event in events:
+            assert render_summary(template, event) == chevron.render(template, event)
+        timings = [
+            min(
+                timeit.repeat(
+                    lambda: [render(template, event) for event in events],
+                    number=1,
+                    repeat=5,
+                )
+            )
+            / EVENTS
+            * 1e6
+            for render in [chevron.render, render_summary]
+        ]
+        print(
+            "{:<8} chevron.render {:.1f}us  render_summary {:.1f}us".format(
+                name, *timings
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
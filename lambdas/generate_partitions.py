@@ -4,8 +4,6 @@ import time
 import logging, logging.config
 from utils.dotdict import DotDict
 from utils.dates import get_date_parts
-import pyathena
-from pyathena import connect
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -42,6 +40,9 @@ def lambda_handler(event, context):
     config.athena_database = os.environ.get("ATHENA_DATABASE", "defenda_data_lake")
     config.athena_table = os.environ.get("ATHENA_TABLE", "events")
 
+    # pyathena is only imported once we're called
+    from pyathena import connect
+
     # query status/wait for response
 
     athena_query = get_athena_query(config)
@@ -0,0 +1,114 @@
+from utils.dict_helpers import KeyIndex
+from utils.dates import toUTC
+from utils.ip_helpers import classify_ip
+from utils.summaries import render_summary
+from utils.helpers import mark_fastpath
+import logging
+
+logger = logging.getLogger()
+
+SUMMARY_TEMPLATE = (
+    "{{details.user}} {{details.eventname}} {{details.eventsource}}"
+    " from {{details.sourceipaddress}}"
+)
+
+
+def cloudtrail_user(user_identity):
+    """the most specific name cloudtrail gives for who made the call"""
+    if not isinstance(user_identity, dict):
+        return None
+    if user_identity.get("username"):
+        return user_identity["username"]
+    session_context = user_identity.get("sessioncontext")
+    if isinstance(session_context, dict):
+        session_issuer = session_context.get("sessionissuer")
+        if isinstance(session_issuer, dict) and session_issuer.get("username"):
+            return session_issuer["username"]
+    for field in ["arn", "principalid", "invokedby"]:
+        if user_identity.get(field):
+            return user_identity[field]
+    return None
+
+
+class message(object):
+    def __init__(self):
+        """
+        normalize cloudtrail records straight from their known fields:
+        eventtime, sourceipaddress, useridentity and eventname
+        are always at the same place in details, so there's nothing to discover.
+        Marks the event as done in the metadata (see mark_fastpath)
+        so the generic ip_addresses and timestamps discovery skip it.
+        """
+
+        self.registration = ["eventsource"]
+        # after the shell and lowercase keys, before discovery
+        self.priority = 10
+        self.uses_key_index = True
+        self.uses_plans = True
+
+    def onMessage(self, message, metadata):
+        details = message.get("details")
+        if (
+            not isinstance(details, dict)
+            or "eventsource" not in details
+            or "eventname" not in details
+            or not isinstance(details.get("eventtime"), str)
+        ):
+            return (message, metadata)
+        if message.get("source") != "cloudtrail" and "eventversion" not in details:
+            return (message, metadata)
+
+        index = KeyIndex.shared_for(message)
+
+        def set_field(path, value):
+            parent = message
+            for key in path[:-1]:
+                parent = parent[key]
+            parent[path[-1]] = value
+            if index is not None:
+                index.set(path, value)
+
+        try:
+            set_field(
+                ("utctimestamp",),
+                toUTC(
+                    details["eventtime"], hint=("cloudtrail", "eventtime")
+                ).isoformat(),
+            )
+        except Exception as e:
+            logger.error(
+                f"exception {e} while converting {details['eventtime']} to utc"
+            )
+            # let the generic discovery have a go
+            return (message, metadata)
+
+        # cloudtrail puts the calling service's name in sourceipaddress
+        # for calls made by aws services, with the same in useragent
+        source_ip_address = details.get("sourceipaddress")
+        ip_info = classify_ip(source_ip_address)
+        if ip_info is not None:
+            set_field(("details", "_ipaddresses"), [source_ip_address])
+            set_field(
+                ("details", "_sourceipaddress_tags"),
+                list(ip_info.tags) + [ip_info.scope],
+            )
+        elif source_ip_address and source_ip_address == details.get("useragent"):
+            del details["sourceipaddress"]
+            if index is not None:
+                index.remove(("details", "sourceipaddress"))
+
+        user = cloudtrail_user(details.get("useridentity"))
+        if user:
+            set_field(("details", "user"), user)
+
+        set_field(("source",), "cloudtrail")
+        if details["eventname"] in ("ConsoleLogin", "CheckMfa") or details[
+            "eventsource"
+        ] in ("signin.amazonaws.com", "sso.amazonaws.com"):
+            set_field(("category",), "authentication")
+        else:
+            set_field(("category",), "api")
+        set_field(("summary",), render_summary(SUMMARY_TEMPLATE, message))
+        mark_fastpath(metadata, message, "cloudtrail")
+
+        return (message, metadata)
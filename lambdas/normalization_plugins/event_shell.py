@@ -1,4 +1,5 @@
-from utils.dict_helpers import enum_keys, merge
+from utils.dict_helpers import merge_defaults, KeyIndex
+from utils.plans import ExecutionPlan, value_at
 from utils.dates import utcnow
 
 
@@ -11,6 +12,8 @@ class message(object):
 
         self.registration = ["*"]
         self.priority = 2
+        self.uses_key_index = True
+        self.uses_plans = True
 
     def onMessage(self, message, metadata):
         # our target shell
@@ -25,21 +28,37 @@ class message(object):
             "details": {},
         }
         # maybe the shell elements are already there?
-        event_set = set(enum_keys(event_shell))
-        message_set = set(enum_keys(message))
-        if not event_set.issubset(message_set):
+        # (the same answer as last time for an event of this shape)
+        index = KeyIndex.shared_for(message)
+        plan = ExecutionPlan.active_for(message)
+        complete = plan.recall("event_shell") if plan is not None else None
+        if complete is None:
+            keys = index if index is not None else KeyIndex(message)
+            complete = all(key in keys for key in event_shell)
+            if plan is not None:
+                plan.remember("event_shell", complete)
+        if not complete:
             # we have work to do
-            # merge the dicts letting any message values win
-            # if the message lacks any keys, our shell values win
-            message = merge(event_shell, message)
+            # fill in the shell keys the message lacks, in place
+            # letting any message values win
+            for path in merge_defaults(message, event_shell):
+                if index is not None:
+                    index.set(path, value_at(message, path))
 
         # move any non shell keys to 'details'
-        for item in message_set:
-            # enum_keys traverses sub dicts, we only move the top level
-            # so check if the key is note a core element
+        moved = []
+        for item in list(message.keys()):
+            # we only move the top level
+            # so check if the key is not a core element
             # present in the top level and move it to details
-            if item not in event_shell and item in message:
+            if item not in event_shell:
+                if item in message["details"] and index is not None:
+                    index.remove(("details", item))
                 message["details"][item] = message.get(item)
                 del message[item]
+                moved.append(item)
+        # and patch the index in one pass
+        if index is not None:
+            index.nest(moved, ("details",))
 
         return (message, metadata)
@@ -0,0 +1,273 @@
+import os
+import logging
+from utils.dates import toUTC
+from utils.summaries import compile_template
+
+logger = logging.getLogger()
+
+# none are shipped, field_mappings.example.yml has some to start from
+FIELD_MAPPINGS_FILE = os.environ.get(
+    "FIELD_MAPPINGS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "field_mappings.yml"),
+)
+
+MAPPING_KEYS = {
+    "name",
+    "match",
+    "source",
+    "category",
+    "tags",
+    "rename",
+    "timestamp",
+    "summary",
+}
+
+# a path that isn't in the event
+MISSING = object()
+
+
+def path_getter(path):
+    """
+    compile a dotted path (details.events.0.name) into a function
+    returning the value there in an event, or MISSING
+    """
+    keys = tuple(path.split("."))
+
+    def getter(event):
+        node = event
+        try:
+            for key in keys:
+                if isinstance(node, list):
+                    node = node[int(key)]
+                else:
+                    node = node[key]
+        except (KeyError, IndexError, TypeError, ValueError):
+            return MISSING
+        return node
+
+    return getter
+
+
+def list_index(path):
+    """the first part of a dotted path that indexes a list (an integer), or None"""
+    for key in path.split("."):
+        try:
+            int(key)
+        except ValueError:
+            continue
+        return key
+    return None
+
+
+def path_setter(path):
+    """
+    compile a dotted path into a function setting a value there,
+    creating any missing dicts along the way
+    (dicts only, see list_index)
+    """
+    keys = tuple(path.split("."))
+    parents, last = keys[:-1], keys[-1]
+
+    def setter(event, value):
+        node = event
+        for key in parents:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[last] = value
+
+    return setter
+
+
+def path_remover(path):
+    """
+    compile a dotted path into a function deleting the value there
+    (dicts only, see list_index)
+    """
+    keys = tuple(path.split("."))
+    parents, last = keys[:-1], keys[-1]
+
+    def remover(event):
+        node = event
+        for key in parents:
+            node = node[key]
+        del node[last]
+
+    return remover
+
+
+class FieldMapping(object):
+    """
+    one declared normalizer compiled into accessors:
+    match criteria are path: value (equals), path: [values] (any of)
+    or path: null (present)
+    """
+
+    def __init__(self, declaration, order):
+        unknown = set(declaration) - MAPPING_KEYS
+        name = declaration.get("name")
+        if not name:
+            raise ValueError(f"field mapping {order} has no name")
+        if unknown:
+            raise ValueError(f"field mapping {name} has unknown keys {sorted(unknown)}")
+        if not declaration.get("match"):
+            raise ValueError(f"field mapping {name} has no match criteria")
+
+        self.name = name
+        self.order = order
+        self.source = declaration.get("source")
+        self.category = declaration.get("category")
+        self.tags = list(declaration.get("tags", []))
+        # (path, getter, test) in the order declared
+        self.criteria = []
+        for path, expected in declaration["match"].items():
+            if expected is None:
+                test = None
+            elif isinstance(expected, list):
+                test = set(expected)
+            else:
+                test = {expected}
+            self.criteria.append((path, path_getter(path), test))
+        renames = declaration.get("rename") or {}
+        for path in list(renames) + list(renames.values()):
+            # removing or setting a list item would shift or pad the list
+            index = list_index(path)
+            if index is not None:
+                raise ValueError(
+                    f"field mapping {name} renames {path}, "
+                    f"list indices ({index}) are only for match and timestamp"
+                )
+        self.renames = [
+            (path_getter(old), path_remover(old), path_setter(new))
+            for old, new in renames.items()
+        ]
+        self.timestamp = None
+        if declaration.get("timestamp"):
+            self.timestamp_path = declaration["timestamp"]
+            self.timestamp = path_getter(self.timestamp_path)
+        self.summary = None
+        if declaration.get("summary"):
+            self.summary = compile_template(declaration["summary"])
+
+    def matches(self, event, skip=0):
+        """do the criteria (after the first skip of them) hold for the event"""
+        for path, getter, test in self.criteria[skip:]:
+            value = getter(event)
+            if value is MISSING:
+                return False
+            if test is not None:
+                try:
+                    if value not in test:
+                        return False
+                except TypeError:
+                    # unhashable, can't be one of our values
+                    return False
+        return True
+
+    def apply(self, event):
+        for getter, remover, setter in self.renames:
+            value = getter(event)
+            if value is not MISSING:
+                remover(event)
+                setter(event, value)
+        if self.source:
+            event["source"] = self.source
+        if self.category:
+            event["category"] = self.category
+        if self.tags:
+            if not isinstance(event.get("tags"), list):
+                event["tags"] = []
+            for tag in self.tags:
+                if tag not in event["tags"]:
+                    event["tags"].append(tag)
+        if self.timestamp:
+            value = self.timestamp(event)
+            if value is not MISSING:
+                try:
+                    event["utctimestamp"] = toUTC(
+                        value, hint=(self.name, self.timestamp_path)
+                    ).isoformat()
+                except Exception as e:
+                    logger.error(
+                        f"exception {e} while converting {value} to utc for {self.name}"
+                    )
+        if self.summary:
+            event["summary"] = self.summary.render(event)
+        return event
+
+
+def load_mappings(file_name=FIELD_MAPPINGS_FILE):
+    """the declarations in a yaml file, a list of dicts"""
+    if not os.path.exists(file_name):
+        logger.info(f"no field mappings file {file_name}")
+        return []
+    # only needed when there's a file to read
+    import yaml
+
+    with open(file_name, "r") as f:
+        return yaml.safe_load(f) or []
+
+
+class message(object):
+    def __init__(self, declarations=None):
+        """
+        normalize events from sources declared in field_mappings.yml
+        (or FIELD_MAPPINGS_FILE) rather than in python:
+        match criteria, renames, timestamp field, summary template,
+        source, category and tags per source.
+
+        Mappings are compiled once, here. The plugin registers for
+        the keys the mappings match on, so other events never get here,
+        and mappings are grouped by their first criterion (the dispatch key)
+        so an event only looks up one value per distinct first path
+        instead of trying every mapping.
+        """
+        if declarations is None:
+            declarations = load_mappings()
+        self.mappings = [
+            FieldMapping(declaration, order)
+            for order, declaration in enumerate(declarations)
+        ]
+
+        # first path -> [getter, {value: [mappings]}, [mappings for any value]]
+        dispatch = {}
+        for mapping in self.mappings:
+            path, getter, test = mapping.criteria[0]
+            entry = dispatch.setdefault(path, [getter, {}, []])
+            if test is None:
+                entry[2].append(mapping)
+            else:
+                for value in test:
+                    entry[1].setdefault(value, []).append(mapping)
+        self.dispatch = [tuple(entry) for entry in dispatch.values()]
+
+        # the keys we need to see in an event, the last part of each path
+        registration = set()
+        for mapping in self.mappings:
+            for path, getter, test in mapping.criteria:
+                registration.add(path.split(".")[-1].lower())
+        self.registration = sorted(registration)
+        # after the shell, lowercase keys and the discovery plugins
+        # so declared values have the final say
+        self.priority = 25
+
+    def onMessage(self, message, metadata):
+        candidates = []
+        for getter, by_value, any_value in self.dispatch:
+            value = getter(message)
+            if value is MISSING:
+                continue
+            candidates.extend(any_value)
+            try:
+                candidates.extend(by_value.get(value, []))
+            except TypeError:
+                # unhashable value, only 'present' mappings apply
+                pass
+
+        # first declared mapping that matches wins
+        for mapping in sorted(candidates, key=lambda mapping: mapping.order):
+            if mapping.matches(message, skip=1):
+                mapping.apply(message)
+                break
+
+        return (message, metadata)
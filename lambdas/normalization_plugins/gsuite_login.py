@@ -1,7 +1,7 @@
 from utils.dict_helpers import sub_dict, enum_keys, dict_match
-from utils.dotdict import DotDict
+from utils.dotdict import DotView
 from utils.dates import toUTC
-import chevron
+from utils.summaries import render_summary
 
 class message(object):
 
@@ -14,8 +14,8 @@ class message(object):
         self.priority = 20
 
     def onMessage(self, message, metadata):
-        # for convenience, make a dot dict version of the message
-        dot_message=DotDict(message)
+        # for convenience, a dot view of the message
+        dot_message=DotView(message)
 
         # double check that this is our target message
         if 'admin#reports#activity' not in dot_message.get('details.kind','')\
@@ -33,14 +33,14 @@ class message(object):
 
         # set the actual time
         if dot_message.get("details.id.time",None):
-            message['utctimestamp']=toUTC(message['details']['id']['time']).isoformat()
+            message['utctimestamp']=toUTC(message['details']['id']['time'], hint=('gsuite', 'id.time')).isoformat()
 
         # set the user_name
         if dot_message.get("details.actor.email",None):
             message["details"]["user"]=dot_message.get("details.actor.email","")
 
         # set summary
-        message["summary"]=chevron.render("{{details.user}} {{details.events.0.name}} from IP {{details.sourceipaddress}}",message)
+        message["summary"]=render_summary("{{details.user}} {{details.events.0.name}} from IP {{details.sourceipaddress}}",message)
 
 
         # set category
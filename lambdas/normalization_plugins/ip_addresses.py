@@ -1,6 +1,8 @@
-from utils.dict_helpers import enum_keys, getValueByPath, find_keys
-from utils.dotdict import DotDict
-from utils.helpers import is_ip
+from utils.dict_helpers import find_keys_multi, KeyIndex
+from utils.plans import ExecutionPlan, value_at
+from utils.dotdict import DotView
+from utils.helpers import is_ip, fastpath_source
+from utils.ip_helpers import classify_ip
 
 
 class message(object):
@@ -13,11 +15,15 @@ class message(object):
 
         self.registration = ["*"]
         self.priority = 20
+        self.uses_key_index = True
+        self.uses_plans = True
 
     def onMessage(self, message, metadata):
-        # help ourselves to a dot dict and list of keys
-        message = DotDict(message)
-        message_keys = list(enum_keys(message))
+        # a dot view (changes go straight to the message)
+        dot_message = DotView(message)
+        # a source specific normalizer already set our fields
+        if fastpath_source(metadata, message):
+            return (message, metadata)
 
         # all the ips we encounter along the way
         all_ips = []
@@ -60,23 +66,59 @@ class message(object):
             "id_resp_h",
             "serverip",
         ]
+        # every instance of every likely field in the message
+        # from where they were in the last event of this shape
+        # else from the pipeline's index of keys if there is one
+        # else in one walk of the message
+        index = KeyIndex.shared_for(message)
+        plan = ExecutionPlan.active_for(message)
+        likely_fields = likely_source_fields + likely_destination_fields
+        candidates = None
+        found = plan.recall("ip_addresses") if plan is not None else None
+        if found is not None:
+            try:
+                candidates = {
+                    field: [value_at(message, path) for path in paths]
+                    for field, paths in found.items()
+                }
+            except KeyError:
+                plan.invalidate()
+        if candidates is None and index is not None:
+            located = index.locate(likely_fields)
+            candidates = {
+                field: [value for path, value in entries]
+                for field, entries in located.items()
+            }
+            if plan is not None:
+                plan.remember(
+                    "ip_addresses",
+                    {
+                        field: [path for path, value in entries]
+                        for field, entries in located.items()
+                    },
+                )
+        elif candidates is None:
+            candidates = find_keys_multi(message, likely_fields)
+
         # lets find a source
         # first match wins
         try:
             for field in likely_source_fields:
-                if field in message_keys:
+                if field in candidates:
                     # do we already have one?
-                    if not getValueByPath(message, "details.sourceipaddress"):
-                        # search the message for any instance of this field
+                    if not dot_message.get("details.sourceipaddress"):
+                        # every instance of this field in the message
                         # a list since it could appear multiple times
-                        source_ips = list(find_keys(message, field))
+                        source_ips = candidates[field]
                         for ip in source_ips:
-                            if "," in ip:
+                            if isinstance(ip, str) and "," in ip:
                                 # some fields like x-forwarded can include multiple IPs
                                 # get the first one
                                 ip = ip.split(",")[0].strip()
                             if is_ip(ip):
-                                message.details.sourceipaddress = ip
+                                dot_message.details.sourceipaddress = ip
+                                if index is not None:
+                                    index.set(("details", "sourceipaddress"), ip)
                                 # first one wins
                                 # raise an error to break both for loops
                                 raise StopIteration
@@ -84,7 +126,7 @@ class message(object):
             pass
 
         # harvest the result or existing source ip
-        source_ip_address = getValueByPath(message, "details.sourceipaddress")
+        source_ip_address = dot_message.get("details.sourceipaddress")
         if source_ip_address:
             if is_ip(source_ip_address):
                 all_ips.append(source_ip_address)
@@ -92,24 +134,28 @@ class message(object):
                 # hrm, there's an entry here that's not an ip
                 # sometimes cloudtrail does this (config.amazonaws.com )
                 # and also sets a useragent field to the same
-                if getValueByPath(message, "details.sourceipaddress") == getValueByPath(
-                    message, "details.useragent"
+                if dot_message.get("details.sourceipaddress") == dot_message.get(
+                    "details.useragent"
                 ):
-                    del message.details.sourceipaddress
+                    del dot_message.details.sourceipaddress
+                    if index is not None:
+                        index.remove(("details", "sourceipaddress"))
 
         # lets find a destination
         # first match wins
         try:
             for field in likely_destination_fields:
-                if field in message_keys:
+                if field in candidates:
                     # do we already have one?
-                    if not getValueByPath(message, "details.destinationipaddress"):
-                        # search the message for any instance of this field
+                    if not dot_message.get("details.destinationipaddress"):
+                        # every instance of this field in the message
                         # a list since it could appear multiple times
-                        destination_ips = list(find_keys(message, field))
+                        destination_ips = candidates[field]
                         for ip in destination_ips:
                             if is_ip(ip):
-                                message.details.destinationipaddress = ip
+                                dot_message.details.destinationipaddress = ip
+                                if index is not None:
+                                    index.set(("details", "destinationipaddress"), ip)
                                 # first one wins
                                 # raise an error to break both for loops
                                 raise StopIteration
@@ -117,19 +163,32 @@ class message(object):
             pass
 
         # harvest the result or existing destination ip
-        destination_ip_address = getValueByPath(message, "details.destinationipaddress")
+        destination_ip_address = dot_message.get("details.destinationipaddress")
         if destination_ip_address and is_ip(destination_ip_address):
             all_ips.append(destination_ip_address)
 
+        # tag the source/destination as internal/external (see INTERNAL_NETWORKS)
+        # plus any other network tags and the address scope (private, public..)
+        # i.e. details._sourceipaddress_tags: ["external", "public"]
+        for field in ["sourceipaddress", "destinationipaddress"]:
+            ip_info = classify_ip(dot_message.get("details." + field))
+            if ip_info is not None:
+                ip_tags = list(ip_info.tags) + [ip_info.scope]
+                message["details"]["_" + field + "_tags"] = ip_tags
+                if index is not None:
+                    index.set(("details", "_" + field + "_tags"), ip_tags)
+
         # save all the ips we found along the way
         # in details._ipaddresses as a list
         if all_ips:
-            if not getValueByPath(message, "details._ipaddresses"):
-                message.details._ipaddresses = all_ips
+            if not dot_message.get("details._ipaddresses"):
+                dot_message.details._ipaddresses = all_ips
+                if index is not None:
+                    index.set(("details", "_ipaddresses"), all_ips)
             else:
-                if isinstance(message.details._ipaddresses, list):
+                if isinstance(dot_message.details._ipaddresses, list):
                     for ip in all_ips:
-                        if ip not in message.details._ipaddresses:
-                            message.details._ipaddresses.append(ip)
+                        if ip not in dot_message.details._ipaddresses:
+                            dot_message.details._ipaddresses.append(ip)
 
-        return (message, metadata)
\ No newline at end of file
+        return (message, metadata)
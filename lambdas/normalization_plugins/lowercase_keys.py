@@ -1,3 +1,66 @@
+import os
+
+KEY_CACHE_SIZE = int(os.environ.get('KEY_CACHE_SIZE', 8192))
+
+# key -> lowercase key, for the keys we've seen
+lowered_keys = {}
+
+
+def lower(key):
+    lowered = lowered_keys.get(key)
+    if lowered is None:
+        lowered = key.lower()
+        if lowered == key:
+            # keep the one string for keys that are already lowercase
+            lowered = key
+        if len(lowered_keys) >= KEY_CACHE_SIZE:
+            # drop the oldest
+            del lowered_keys[next(iter(lowered_keys))]
+        lowered_keys[key] = lowered
+    return lowered
+
+
+def lower_keys(node):
+    '''
+    lowercase the keys of node and everything in it
+    in place: only dicts with a key that isn't lowercase
+    are rebuilt (to keep the order of their keys),
+    returns node or its rebuilt replacement
+    '''
+    if isinstance(node, dict):
+        rebuilt = None
+        for key, item in node.items():
+            lowered = lowered_keys.get(key)
+            if lowered is None:
+                lowered = lower(key)
+            if isinstance(item, (dict, list)):
+                new_item = lower_keys(item)
+            else:
+                new_item = item
+            if rebuilt is not None:
+                rebuilt[lowered] = new_item
+            elif lowered != key:
+                # the first key to change, copy the ones before it
+                rebuilt = {}
+                for before in node:
+                    if before is key:
+                        break
+                    rebuilt[before] = node[before]
+                rebuilt[lowered] = new_item
+            elif new_item is not item:
+                node[key] = new_item
+        return node if rebuilt is None else rebuilt
+    elif isinstance(node, list):
+        for position, item in enumerate(node):
+            if isinstance(item, (dict, list)):
+                new_item = lower_keys(item)
+                if new_item is not item:
+                    node[position] = new_item
+        return node
+    else:
+        return node
+
+
 class message(object):
 
     def __init__(self):
@@ -10,16 +73,5 @@ class message(object):
         self.priority = 1
 
     def onMessage(self, message, metadata):
-        def lower_key(in_dict):
-            if isinstance(in_dict,dict):
-                out_dict = {}
-                for key, item in in_dict.items():
-                    out_dict[key.lower()] = lower_key(item)
-                return out_dict
-            elif isinstance(in_dict,list):
-                return [lower_key(obj) for obj in in_dict]
-            else:
-                return in_dict
-
-        message = lower_key(message)
-        return (message, metadata)
\ No newline at end of file
+        message = lower_keys(message)
+        return (message, metadata)
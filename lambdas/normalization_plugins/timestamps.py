@@ -1,6 +1,7 @@
-from utils.dict_helpers import enum_keys, getValueByPath, find_keys
-from utils.dotdict import DotDict
+from utils.dict_helpers import KeyIndex
+from utils.plans import ExecutionPlan, value_at
 from utils.dates import toUTC, utcnow
+from utils.helpers import fastpath_source
 from datetime import datetime
 import logging
 
@@ -29,48 +30,112 @@ class message(object):
         # so we can add the processed timestamp metadata field
         self.registration = ["*"]
         self.priority = 20
+        self.uses_key_index = True
+        self.uses_plans = True
 
-    def onMessage(self, message, metadata):
-        # help ourselves to a dot dict and list of keys
-        message = DotDict(message)
-        message_keys = list(enum_keys(message))
-
+    def recalled(self, message, plan, metadata):
+        """
+        where the timestamp was in the last event of this shape
+        as (field, value), () if there's nothing to look for
+        or None if it takes discovery
+        """
+        if fastpath_source(metadata, message):
+            # a source specific normalizer already set utctimestamp
+            return ()
+        if plan is None:
+            return None
+        found = plan.recall("timestamps")
+        if found is None or found == ():
+            return found
+        field, path = found
         try:
-            for field in likely_timestamp_fields:
-                if field in message_keys:
-                    timestamps = list(find_keys(message, field))
-                    if field == "time" and "date" in message_keys:
-                        # combine date and time for a timestamp
-                        dates = list(find_keys(message, "date"))
-                        if dates:
-                            # setup a new list for the zipped results
-                            date_timestamps = []
-                            for i in zip(dates, timestamps):
-                                date_timestamps.append(f"{i[0]} {i[1]}")
+            return (field, value_at(message, path))
+        except KeyError:
+            plan.invalidate()
+            return None
 
-                            if date_timestamps:
-                                # replace the original list
-                                # with this list of date + time
-                                timestamps = date_timestamps
+    def set_timestamp(self, message, index, utctimestamp):
+        message["utctimestamp"] = utctimestamp.isoformat()
+        if index is not None:
+            index.set(("utctimestamp",), message["utctimestamp"])
 
-                    for timestamp in timestamps:
-                        utctimestamp = ""
-                        try:
-                            utctimestamp = toUTC(timestamp)
-                        except Exception as e:
-                            logger.error(
-                                f"exception {e} while converting {timestamp} to utc"
-                            )
-                            pass
-                        if isinstance(utctimestamp, datetime):
-                            message["utctimestamp"] = utctimestamp.isoformat()
-                            # first match wins
-                            raise StopIteration
+    def set_processed(self, message, index, processed):
+        # append processed timestamp as metadata
+        message["details"]["_utcprocessedtimestamp"] = processed
+        if index is not None:
+            index.set(("details", "_utcprocessedtimestamp"), processed)
 
-        except StopIteration:
-            pass
+    def discover(self, message, index, plan):
+        """look for the timestamp in every likely field, first match wins"""
+        if index is None:
+            index = KeyIndex.of(message)
+        if plan is not None and not any(
+            field in index for field in likely_timestamp_fields
+        ):
+            plan.remember("timestamps", ())
+        # only a timestamp from the first likely field/value can be replayed
+        first_candidate = True
+        for field in likely_timestamp_fields:
+            if field in index:
+                timestamps = index.values(field)
+                if field == "time" and "date" in index:
+                    # combine date and time for a timestamp
+                    dates = index.values("date")
+                    if dates:
+                        # setup a new list for the zipped results
+                        date_timestamps = []
+                        for i in zip(dates, timestamps):
+                            date_timestamps.append(f"{i[0]} {i[1]}")
 
-        # append processed timestamp as metadata
-        message["details"]["_utcprocessedtimestamp"] = utcnow().isoformat()
+                        if date_timestamps:
+                            # replace the original list
+                            # with this list of date + time
+                            timestamps = date_timestamps
+                            first_candidate = False
+
+                for timestamp in timestamps:
+                    utctimestamp = ""
+                    try:
+                        # learn the format per source and field
+                        utctimestamp = toUTC(
+                            timestamp, hint=(message.get("source"), field)
+                        )
+                    except Exception as e:
+                        logger.error(
+                            f"exception {e} while converting {timestamp} to utc"
+                        )
+                        pass
+                    if isinstance(utctimestamp, datetime):
+                        self.set_timestamp(message, index, utctimestamp)
+                        if plan is not None and first_candidate:
+                            # it will be here in the next event of this shape
+                            plan.remember("timestamps", (field, index.paths(field)[0]))
+                        # first match wins
+                        return
+                    first_candidate = False
+
+    def onMessage(self, message, metadata):
+        # help ourselves to the index of keys
+        index = KeyIndex.shared_for(message)
+        plan = ExecutionPlan.active_for(message)
+
+        found = self.recalled(message, plan, metadata)
+        if found:
+            field, value = found
+            utctimestamp = None
+            try:
+                utctimestamp = toUTC(value, hint=(message.get("source"), field))
+            except Exception:
+                pass
+            if isinstance(utctimestamp, datetime):
+                self.set_timestamp(message, index, utctimestamp)
+            else:
+                # not this time, look for it
+                plan.invalidate()
+                found = None
+        if found is None:
+            self.discover(message, index, plan)
+
+        self.set_processed(message, index, utcnow().isoformat())
+        return (message, metadata)
 
-        return (message, metadata)
\ No newline at end of file
@@ -1,85 +1,205 @@
 from __future__ import print_function
 
 import base64
-import json
-from json import JSONDecodeError
+import math
+import os
 from io import StringIO
 from utils.dotdict import DotDict
-from utils.plugins import send_event_to_plugins, register_plugins
+from utils.plugins import send_events_to_plugins, get_plugins, REGISTRY_BUILD_TIMES
 from utils.helpers import is_cloudtrail, generate_metadata, emit_json_block, chunks
 from utils.dict_helpers import merge
+from utils.codec import loads, dumps_line, JSONDecodeError
+from utils.metrics import PluginStats, StdoutSink, MemorySink, emf_line
 import logging
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+# where our embedded metric format lines go
+metrics_sink = StdoutSink()
 
 
-def lambda_handler(event, context):
+# opt in parallel processing of large batches
+# PROCESSOR_WORKERS is a number of processes or 'auto' for one per cpu
+PROCESSOR_WORKERS = os.environ.get("PROCESSOR_WORKERS", "1")
+# below this many records the fork/pipe overhead outweighs the gain
+PARALLEL_MIN_RECORDS = int(os.environ.get("PARALLEL_MIN_RECORDS", 200))
+
+
+def processor_workers():
+    """how many worker processes to use for a batch"""
+    if PROCESSOR_WORKERS.lower() == "auto":
+        return os.cpu_count() or 1
+    return max(int(PROCESSOR_WORKERS), 1)
+
+
+def process_records(records, metadata, stats=None):
+    """
+    decode, normalize, enrich and encode a list of firehose records
+    returns the firehose output records in the same order
+    """
     output = []
-    metadata = generate_metadata(context)
-    logger.debug(f"metadata is: {metadata}")
-    normalization_plugins = register_plugins("normalization_plugins")
-    enrichment_plugins = register_plugins("enrichment_plugins")
+    normalization_plugins = get_plugins("normalization_plugins")
+    enrichment_plugins = get_plugins("enrichment_plugins")
 
-    if "records" in event:
-        for record in event["records"]:
-            output_record = {}
-            logger.debug(f"found record in event: {record}")
-            payload = base64.b64decode(record["data"])
-
-            payload_dict = None
-            try:
-                # load the json we have from either a .json file or a gunziped file
-                payload_dict = json.loads(payload)
-            except JSONDecodeError as e:
-                # file isn't well formed json, see if we can interpret json from it
-                logger.error(f"payload is not valid json decode error {e}")
-
-            if payload_dict:
-                # normalize it
-                result_record, metadata = send_event_to_plugins(
-                    payload_dict, metadata, normalization_plugins
-                )
-                # enrich it
-                result_record, metadata = send_event_to_plugins(
-                    result_record, metadata, enrichment_plugins
-                )
-                if result_record:
-                    # TODO, what to do with lambda info as metadata? Do we care?
-                    # result_record = merge(result_record, metadata)
-                    logger.debug(f" resulting norm/enriched is: {result_record}")
-                    # json ending in new line so athena recognizes the records
-                    output_record = {
-                        "recordId": record["recordId"],
-                        "result": "Ok",
-                        "data": base64.b64encode(
-                            json.dumps(result_record).encode("utf-8") + b"\n"
-                        ).decode("utf-8"),
-                    }
-                else:
-                    # result as None, means drop the record
-                    # TODO, what is the right result in firehose terms
-                    logger.error(f"record {record['recordId']} failed processing")
-                    output_record = {
-                        "recordId": record["recordId"],
-                        "result": "ProcessingFailed",
-                        "data": record["data"],
-                    }
+    # decode every record up front so plugins can work the batch
+    payloads = []
+    for record in records:
+        logger.debug(f"found record in event: {record}")
+        payload = base64.b64decode(record["data"])
+
+        payload_dict = None
+        try:
+            # load the json we have from either a .json file or a gunziped file
+            payload_dict = loads(payload)
+        except JSONDecodeError as e:
+            # file isn't well formed json, see if we can interpret json from it
+            logger.error(f"payload is not valid json decode error {e}")
+        payloads.append(payload_dict)
+
+    # only well formed, non empty records go through the plugins
+    decoded = [i for i, payload_dict in enumerate(payloads) if payload_dict]
+    # normalize them
+    result_records, metadata = send_events_to_plugins(
+        [payloads[i] for i in decoded], metadata, normalization_plugins, stats
+    )
+    # enrich the ones that survived normalization
+    surviving = [i for i, result in enumerate(result_records) if result]
+    enriched, metadata = send_events_to_plugins(
+        [result_records[i] for i in surviving], metadata, enrichment_plugins, stats
+    )
+    for i, result_record in zip(surviving, enriched):
+        result_records[i] = result_record
+    results = dict(zip(decoded, result_records))
+
+    for position, record in enumerate(records):
+        output_record = {}
+        if position in results:
+            result_record = results[position]
+            if result_record:
+                # TODO, what to do with lambda info as metadata? Do we care?
+                # result_record = merge(result_record, metadata)
+                logger.debug(f" resulting norm/enriched is: {result_record}")
+                # json ending in new line so athena recognizes the records
+                output_record = {
+                    "recordId": record["recordId"],
+                    "result": "Ok",
+                    "data": base64.b64encode(dumps_line(result_record)).decode(
+                        "utf-8"
+                    ),
+                }
             else:
-                logger.error(
-                    f"record {record['recordId']} failed processing, no resulting dict"
-                )
+                # result as None, means drop the record
+                # TODO, what is the right result in firehose terms
+                logger.error(f"record {record['recordId']} failed processing")
                 output_record = {
                     "recordId": record["recordId"],
                     "result": "ProcessingFailed",
                     "data": record["data"],
                 }
+        else:
+            logger.error(
+                f"record {record['recordId']} failed processing, no resulting dict"
+            )
+            output_record = {
+                "recordId": record["recordId"],
+                "result": "ProcessingFailed",
+                "data": record["data"],
+            }
+
+        output.append(output_record)
+    return output
 
-            output.append(output_record)
+
+def process_shard(connection, records, metadata):
+    """worker process: process a shard of records and pipe back the results"""
+    try:
+        stats = PluginStats(sink=MemorySink())
+        connection.send((process_records(records, metadata, stats), stats))
+    finally:
+        connection.close()
+
+
+def process_records_parallel(records, metadata, workers, stats=None):
+    """
+    process_records sharded across worker processes
+    records are split into contiguous shards so the output
+    is the shards' results concatenated in order.
+    Lambda has no /dev/shm, so no multiprocessing.Pool/Queue,
+    each worker gets a Process and a Pipe. Workers are forked so they
+    inherit the already registered plugins.
+    """
+    # only batches we shard pay for importing multiprocessing
+    import multiprocessing
+
+    context = multiprocessing.get_context("fork")
+    shard_size = int(math.ceil(len(records) / float(workers)))
+    shards = [records[i : i + shard_size] for i in range(0, len(records), shard_size)]
+    jobs = []
+    for shard in shards:
+        parent_connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(
+            target=process_shard, args=(child_connection, shard, metadata)
+        )
+        process.start()
+        child_connection.close()
+        jobs.append((shard, parent_connection, process))
+
+    output = []
+    for shard, connection, process in jobs:
+        try:
+            shard_output, shard_stats = connection.recv()
+            if stats is not None:
+                stats.merge(shard_stats)
+        except EOFError:
+            logger.error(
+                f"worker for {len(shard)} records failed, processing them serially"
+            )
+            shard_output = process_records(shard, metadata, stats)
+        connection.close()
+        process.join()
+        output.extend(shard_output)
+    return output
+
+
+def lambda_handler(event, context):
+    metadata = generate_metadata(context)
+    logger.debug(f"metadata is: {metadata}")
+    dimensions = {"function_name": metadata.lambda_details.function_name}
+    cold_start = not REGISTRY_BUILD_TIMES
+    get_plugins("normalization_plugins")
+    get_plugins("enrichment_plugins")
+    if cold_start:
+        logger.info(
+            "cold start plugin registry build seconds: {}".format(
+                sum(REGISTRY_BUILD_TIMES.values())
+            )
+        )
+        metrics_sink.write(
+            emf_line(
+                {
+                    "plugin_registry_build": (
+                        sum(REGISTRY_BUILD_TIMES.values()) * 1000,
+                        "Milliseconds",
+                    )
+                },
+                dimensions,
+            )
+        )
+    # per plugin timings/budgets for this invocation
+    stats = PluginStats(sink=metrics_sink)
+
+    if "records" in event:
+        workers = processor_workers()
+        if workers > 1 and len(event["records"]) >= PARALLEL_MIN_RECORDS:
+            output = process_records_parallel(
+                event["records"], metadata, workers, stats
+            )
+        else:
+            output = process_records(event["records"], metadata, stats)
 
         logger.info("Processed {} records.".format(len(event["records"])))
+        stats.emit(dimensions)
 
         return {"records": output}
     else:
         logger.info(f"no records found in {event} with context: {context}")
-
@@ -1,38 +1,38 @@
-import boto3
-import gzip
-import json
 import logging
 import os
 from time import sleep
-from io import BytesIO, TextIOWrapper, StringIO
 from utils.dotdict import DotDict
-from utils.helpers import is_cloudtrail, generate_metadata, emit_json_block, chunks
-from json import JSONDecodeError
+from utils.helpers import is_cloudtrail, generate_metadata
+from utils.codec import JSONDecodeError
+from utils.firehose import FirehoseProducer
+from utils.streams import json_records, text_chunks
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 FIREHOSE_DELIVERY_STREAM = os.environ.get(
     "FIREHOSE_DELIVERY_STREAM", "defenda_data_lake_s3_stream"
 )
-FIREHOSE_BATCH_SIZE = os.environ.get("FIREHOSE_BATCH_SIZE", 100)
 
+_s3_client = None
+
+
+def s3_client():
+    """an s3 client for the life of the lambda container"""
+    global _s3_client
+    if _s3_client is None:
+        # only imported once we have an object to read
+        import boto3
+
+        _s3_client = boto3.client("s3")
+    return _s3_client
 
-def send_to_firehose(records):
-    f_hose = boto3.client("firehose")
 
-    # records should be a list of dicts
-    response = None
-    if type(records) is list:
-        # batch up the list below the limits of firehose
-        for batch in chunks(records, FIREHOSE_BATCH_SIZE):
-            response = f_hose.put_record_batch(
-                DeliveryStreamName=FIREHOSE_DELIVERY_STREAM,
-                Records=[
-                    {"Data": bytes(str(json.dumps(record) + "\n").encode("UTF-8"))}
-                    for record in batch
-                ],
-            )
-            logger.debug("firehose response is: {}".format(response))
+def send_to_firehose(records):
+    """put a list of dicts to firehose"""
+    producer = FirehoseProducer(FIREHOSE_DELIVERY_STREAM)
+    producer.put_records(records)
+    producer.flush()
+    return producer.stats
 
 
 def lambda_handler(event, context):
@@ -54,7 +54,9 @@ def lambda_handler(event, context):
         return metadata
     elif "Records" in event:
         # should be triggered by s3 Put/Object created events
-        s3 = boto3.client("s3")
+        s3 = s3_client()
+        # batches records by count and size, retrying what firehose doesn't take
+        producer = FirehoseProducer(FIREHOSE_DELIVERY_STREAM)
         for record in event.Records:
             record = DotDict(record)
             s3_bucket = record.s3.bucket.name
@@ -84,50 +86,31 @@ def lambda_handler(event, context):
                     f"5 attempts to retrieve {s3_bucket} {s3_key} failed, moving on"
                 )
                 continue
-            s3_data = ""
-            # gunzip if zipped
-            if s3_key[-3:] == ".gz":
-                s3_raw_data = s3_response["Body"].read()
-                with gzip.GzipFile(fileobj=BytesIO(s3_raw_data)) as gzip_stream:
-                    s3_data += "".join(TextIOWrapper(gzip_stream, encoding="utf-8"))
-            else:
-                s3_data = s3_response["Body"].read().decode("utf-8")
-
-            # create our list of records to append out findings to
-            s3_records = []
-            s3_dict = None
+            # decompress and decode the object as we read it, sending records
+            # to firehose as batches fill rather than holding the whole object
+            count = 0
             try:
-                # load the json we have from either a .json file or a gunziped file
-                s3_dict = json.loads(s3_data)
-            except JSONDecodeError:
-                # file isn't well formed json, see if we can interpret json from it
-                for block in emit_json_block(StringIO(s3_data)):
-                    if block:
-                        record = json.loads(block)
-                        record["source"] = source
-                        s3_records.append(record)
-            # if this is a dict of a single 'Records' list, unroll the list into
-            # it's sub records
-            if s3_dict and "Records" in s3_dict:
-                if type(s3_dict["Records"]) is list:
-                    for record in s3_dict["Records"]:
-                        record["source"] = source
-                        s3_records.append(record)
-            # maybe it's just a list already?
-            elif s3_dict and type(s3_dict) is list:
-                # a list of dicts
-                for record in s3_dict:
+                for record in json_records(
+                    text_chunks(s3_response["Body"], gzipped=s3_key[-3:] == ".gz")
+                ):
+                    if not isinstance(record, dict):
+                        logger.error(
+                            f"skipping a non dict record in {s3_bucket} {s3_key}"
+                        )
+                        continue
                     record["source"] = source
-                    s3_records.append(record)
-            elif s3_dict and type(s3_dict) is dict:
-                # a single dict, but lets add it to a list
-                # for consistent handling
-                s3_dict["source"] = source
-                s3_records.append(s3_dict)
+                    producer.put(record)
+                    count += 1
+            except (JSONDecodeError, UnicodeDecodeError) as e:
+                # file isn't (or stops being) json, send what we found
+                logger.error(
+                    f"{e} while reading {s3_bucket} {s3_key} after {count} records"
+                )
+            logger.debug(f"read {count} records from {s3_bucket} {s3_key}")
 
-            logger.debug("pre-plugins s3_records is: {}".format(s3_records))
-            # send off to firehose for further processing
-            if s3_records:
-                send_to_firehose(s3_records)
+        # send off the rest to firehose for further processing
+        producer.flush()
+        logger.info(f"firehose stats: {producer.stats}")
+        producer.emit({"function_name": metadata.lambda_details.function_name})
 
         return
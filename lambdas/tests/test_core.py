@@ -4,22 +4,46 @@ from subprocess import PIPE, Popen
 from pkg_resources import parse_version
 import pytest
 import yaml
+import json
 from datetime import timezone
 import datetime
-from utils.plugins import send_event_to_plugins, register_plugins
-from utils.helpers import is_cloudtrail, generate_metadata, short_uuid
+import time
+import random
+from utils.plugins import (
+    send_event_to_plugins,
+    send_events_to_plugins,
+    register_plugins,
+    PluginDispatcher,
+    Route,
+    get_plugins,
+    invalidate_plugins,
+    build_manifest,
+    load_manifest,
+    REGISTRY_BUILD_TIMES,
+    PLUGIN_DIRECTORIES,
+)
+from utils.helpers import is_cloudtrail, generate_metadata, short_uuid, emit_json_block
 from utils.helpers import is_ip, isIPv4, isIPv6
+from utils.ip_helpers import parse_ip, classify_ip, NetworkTags, PrefixTrie
 from utils.dict_helpers import (
     merge,
+    merge_defaults,
     find_keys,
+    find_keys_multi,
     enum_values,
     enum_keys,
     sub_dict,
     dict_match,
     getValueByPath,
     dictpath,
+    KeyIndex,
 )
-from utils.dotdict import DotDict
+from utils.dotdict import DotDict, DotView
+from utils.metrics import PluginStats, MemorySink
+from utils.plans import event_shape, value_at, ExecutionPlan, PlanCache
+from utils import codec
+from utils.streams import json_records, text_chunks
+from utils.summaries import render_summary, compile_template
 from utils.dates import toUTC, get_date_parts
 from pathlib import Path
 import logging, logging.config
@@ -93,12 +117,77 @@ class TestCore(object):
         assert isIPv6("::ffff:192.0.2.15")
         assert isIPv6(":ffff:192.0.2.15") == False
 
+    def test_ip_classification(self):
+        # not ips, and nothing raised
+        for not_ip in [None, 42, ["1.2.3.4"], "", "10.1", " 1.2.3.4", "fe80::1%eth0"]:
+            assert parse_ip(not_ip) is None
+            assert classify_ip(not_ip) is None
+        assert str(parse_ip("10.0.0.1/255.255.255.0")) == "10.0.0.0/24"
+        assert classify_ip("54.21.12.27").tags == ("external",)
+        assert classify_ip("54.21.12.27").scope == "public"
+        assert classify_ip("10.1.2.3").tags == ("internal",)
+        assert classify_ip("10.1.2.3").scope == "private"
+        assert classify_ip("127.0.0.1").scope == "loopback"
+        assert classify_ip("fe80::1").scope == "link_local"
+        assert classify_ip("fe80::1").version == 6
+        assert classify_ip("240.0.0.1").scope == "reserved"
+        # documentation ranges aren't private
+        for documentation in [
+            "192.0.2.1",
+            "198.51.100.7",
+            "203.0.113.255",
+            "203.0.113.0/25",
+            "2001:db8::1",
+            "2001:db8:1::/48",
+        ]:
+            assert classify_ip(documentation).scope == "reserved"
+        assert classify_ip("192.168.1.1").scope == "private"
+        assert classify_ip("fd00::1").scope == "private"
+        assert classify_ip("203.0.114.1").scope == "public"
+        assert classify_ip("10.0.0.0/8").tags == ("internal",)
+
+        trie = PrefixTrie()
+        trie.add("10.0.0.0/8", "corp")
+        trie.add("10.1.0.0/16", "vpn")
+        trie.add("2001:db8::/32", "lab")
+        assert trie.lookup(parse_ip("10.1.2.3")) == ["corp", "vpn"]
+        assert trie.lookup(parse_ip("10.2.2.3")) == ["corp"]
+        assert trie.lookup(parse_ip("10.0.0.0/8")) == ["corp"]
+        assert trie.lookup(parse_ip("2001:db8::1")) == ["lab"]
+        assert trie.lookup(parse_ip("11.1.2.3")) == []
+
+        tags = NetworkTags(internal_networks="192.0.2.0/24")
+        assert tags.classify("10.1.2.3").tags == ("external",)
+        assert tags.classify("192.0.2.7").tags == ("internal",)
+        tags.add_table(["192.0.2.0/28", "not a network"], "bastion")
+        assert tags.classify("192.0.2.7").tags == ("internal", "bastion")
+
     def test_merge(self):
         dict1 = {"some_key": "some value"}
         dict2 = {"some_other_key": "some other value"}
         dict3 = merge(dict1, dict2)
         assert dict3 == {"some_key": "some value", "some_other_key": "some other value"}
 
+    def test_merge_defaults(self):
+        details = {"some_key": "some value"}
+        target = {"summary": "kept", "details": details}
+        filled = merge_defaults(
+            target,
+            {"summary": "UNKNOWN", "tags": [], "details": {"other_key": 1}},
+        )
+        assert target == {
+            "summary": "kept",
+            "tags": [],
+            "details": {"some_key": "some value", "other_key": 1},
+        }
+        # in place, nothing copied
+        assert target["details"] is details
+        assert filled == [("tags",), ("details", "other_key")]
+        # a non dict value in the target wins over a dict default
+        target = {"details": "a string"}
+        assert merge_defaults(target, {"details": {"some_key": 1}}) == []
+        assert target == {"details": "a string"}
+
     def test_find_keys(self):
         complex_dict1 = {
             "some_key": "some value",
@@ -107,6 +196,24 @@ class TestCore(object):
         result = list(find_keys(complex_dict1, "some_key"))
         assert result == ["some value", "some other value"]
 
+    def test_find_keys_multi(self):
+        complex_dict1 = {
+            "some_key": "some value",
+            "sub_key": {
+                "some_key": "some other value",
+                "other_key": [{"some_key": "in a list", "other_key": 1}],
+            },
+            "other_key": 2,
+        }
+        result = find_keys_multi(complex_dict1, ["other_key", "some_key", "nope"])
+        assert result == {
+            "some_key": ["some value", "some other value", "in a list"],
+            "other_key": [2, [{"some_key": "in a list", "other_key": 1}], 1],
+        }
+        # same order as find_keys
+        for key in ["some_key", "other_key"]:
+            assert result[key] == list(find_keys(complex_dict1, key))
+
     def test_enum_values(self):
         complex_dict1 = {
             "some_key": "some value",
@@ -153,3 +260,576 @@ class TestCore(object):
             dict_match({"sub_key.some_key": "not some other value"}, complex_dot_dict)
             == False
         )
+
+    def test_dot_view(self):
+        complex_dict1 = {
+            "some_key": "some value",
+            "sub_key": {"some_key": "some other value"},
+            "a_list": [{"some_key": "in a list"}],
+        }
+        view = DotView(complex_dict1)
+        assert view.some_key == "some value"
+        assert view.sub_key.some_key == "some other value"
+        assert view.get("sub_key.some_key") == "some other value"
+        assert view.get("a_list.0.some_key") == "in a list"
+        assert view.get("a_list.1.some_key", "nothing") == "nothing"
+        assert view.get("some_key.nope") is None
+        assert "sub_key" in view
+        assert view.unwrap() is complex_dict1
+        # works with the helpers that take a DotDict
+        assert sub_dict(view, ["sub_key.some_key"]) == {
+            "sub_key.some_key": "some other value"
+        }
+        assert dict_match({"sub_key.some_key": "some other value"}, view)
+        # changes go to the underlying dict, nothing is copied
+        view.sub_key.new_key = "new value"
+        del view.some_key
+        assert complex_dict1["sub_key"]["new_key"] == "new value"
+        assert "some_key" not in complex_dict1
+        with pytest.raises(AttributeError):
+            view.some_key
+
+    def test_plugin_dispatcher(self, monkeypatch):
+        class plugin(object):
+            def __init__(self, name, registration, priority):
+                self.name = name
+                self.registration = registration
+                self.priority = priority
+
+            def onMessage(self, message, metadata):
+                metadata["order"].append(self.name)
+                if self.name == "lowercase":
+                    message = {k.lower(): v for k, v in message.items()}
+                return (message, metadata)
+
+        plugins = [
+            (plugin("keyed", ["kind"], 20), ["kind"], 20),
+            (plugin("tagged", ["atag"], 30), ["atag"], 30),
+            (plugin("category", ["authentication"], 40), ["authentication"], 40),
+            (plugin("nomatch", ["nothere"], 5), ["nothere"], 5),
+            (plugin("lowercase", ["*"], 1), ["*"], 1),
+        ]
+        dispatcher = PluginDispatcher(plugins)
+        assert [p[2] for p in dispatcher] == [1, 5, 20, 30, 40]
+        assert dispatcher.wildcard == [True, False, False, False, False]
+        assert dispatcher.matching({"kind", "atag"}) == {2, 3}
+
+        # 'KIND' only matches once the wildcard plugin has lowercased it
+        metadata = {"order": []}
+        event = {"KIND": "thing", "tags": ["atag"], "category": "authentication"}
+        result, metadata = send_event_to_plugins(event, metadata, dispatcher)
+        assert metadata["order"] == ["lowercase", "keyed", "tagged", "category"]
+        assert len(result["plugins"]) == 4
+
+        # a plain list of tuples is still accepted
+        metadata = {"order": []}
+        result, metadata = send_event_to_plugins({"key": "value"}, metadata, plugins)
+        assert metadata["order"] == ["lowercase"]
+
+        # only the wildcard and matching plugins are visited
+        # however many are registered, one at a time or in a batch
+        many = plugins + [
+            (plugin("other", ["other%d" % i], 10), ["other%d" % i], 10)
+            for i in range(200)
+        ]
+        dispatcher = PluginDispatcher(many)
+        visited = []
+        send = Route.send
+
+        def counted(route, position, stats=None):
+            visited.append(position)
+            return send(route, position, stats)
+
+        monkeypatch.setattr(Route, "send", counted)
+        for dispatch in [
+            lambda event: dispatcher.dispatch(event, {"order": []}),
+            lambda event: dispatcher.dispatch_batch([event], {"order": []}),
+        ]:
+            del visited[:]
+            dispatch({"KIND": "thing", "tags": ["atag"]})
+            assert [dispatcher[position][0].name for position in visited] == [
+                "lowercase",
+                "keyed",
+                "tagged",
+            ]
+
+    def test_plugin_registry_cache(self, monkeypatch):
+        # plugin directories are relative to the lambda task root
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        monkeypatch.delenv("PLUGIN_RESCAN", raising=False)
+        invalidate_plugins()
+        plugins = get_plugins("normalization_plugins")
+        assert len(plugins)
+        assert "normalization_plugins" in REGISTRY_BUILD_TIMES
+        # warm calls reuse the registry
+        assert get_plugins("normalization_plugins") is plugins
+        # explicit invalidation forces a rescan
+        invalidate_plugins("normalization_plugins")
+        assert "normalization_plugins" not in REGISTRY_BUILD_TIMES
+        rescanned = get_plugins("normalization_plugins")
+        assert rescanned is not plugins
+        # as does the dev environment flag
+        monkeypatch.setenv("PLUGIN_RESCAN", "true")
+        assert get_plugins("normalization_plugins") is not rescanned
+        invalidate_plugins()
+
+    def test_plugin_manifest(self, monkeypatch):
+        # the manifest generate_lambda_zip.py writes matches the plugin directories
+        # run ./generate_lambda_zip.py (or write_manifest from lambdas/) if not
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        monkeypatch.delenv("PLUGIN_RESCAN", raising=False)
+        manifest = load_manifest()
+        assert manifest == build_manifest()
+        for directory_name in PLUGIN_DIRECTORIES:
+            scanned = register_plugins(directory_name)
+            loaded = register_plugins(directory_name, manifest)
+            assert len(loaded)
+            assert loaded.names == scanned.names
+            assert [entry[1:] for entry in loaded] == [entry[1:] for entry in scanned]
+            assert loaded.batched == scanned.batched
+        # no manifest, no problem
+        assert load_manifest("no_such_manifest.json") == {}
+
+    def test_plugin_batch_dispatch(self):
+        class batch_plugin(object):
+            def __init__(self):
+                self.registration = ["kind"]
+                self.priority = 10
+                self.batches = []
+
+            def onBatch(self, messages, metadata):
+                self.batches.append(len(messages))
+                # drop the ones marked for it
+                return (
+                    [None if m.get("drop") else m for m in messages],
+                    metadata,
+                )
+
+        class message_plugin(object):
+            def __init__(self):
+                self.registration = ["*"]
+                self.priority = 20
+                self.calls = 0
+
+            def onMessage(self, message, metadata):
+                self.calls += 1
+                return (message, metadata)
+
+        batched = batch_plugin()
+        per_event = message_plugin()
+        plugins = [(per_event, ["*"], 20), (batched, ["kind"], 10)]
+        events = [
+            {"kind": "a"},
+            {"nokind": "b"},
+            {"kind": "c", "drop": True},
+            {"kind": "d", "plugins": ["earlier"]},
+        ]
+        results, metadata = send_events_to_plugins(events, {}, plugins)
+        # one batch call with just the matching events
+        assert batched.batches == [3]
+        # the per event fallback never sees the dropped one
+        assert per_event.calls == 3
+        assert results[2] is None
+        assert len(results[0]["plugins"]) == 2
+        assert len(results[1]["plugins"]) == 1
+        assert results[3]["plugins"][0] == "earlier"
+        assert len(results[3]["plugins"]) == 3
+
+        with pytest.raises(TypeError):
+            send_events_to_plugins([{"key": "value"}, ["not a dict"]], {}, plugins)
+
+    def test_plugin_stats(self):
+        sink = MemorySink()
+        stats = PluginStats(sink=sink)
+        for milliseconds in range(1, 101):
+            stats.record("plugin", milliseconds / 1000.0)
+        stats.record("plugin", 0.001, drops=1)
+        summary = stats.summary()["plugin"]
+        assert summary["calls"] == 101
+        assert summary["drops"] == 1
+        assert summary["latency_p99"] == pytest.approx(99)
+        stats.emit({"function_name": "processor-prod"})
+        record = sink.records()[0]
+        assert record["plugin"] == "plugin"
+        assert record["function_name"] == "processor-prod"
+        assert record["calls"] == 101
+        directive = record["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Dimensions"] == [["function_name", "plugin"]]
+        assert {"Name": "latency_p99", "Unit": "Milliseconds"} in directive["Metrics"]
+
+    def test_plugin_time_budget(self):
+        class slow_plugin(object):
+            def __init__(self):
+                self.registration = ["*"]
+                self.priority = 10
+                self.time_budget_ms = 1
+                self.calls = 0
+
+            def onMessage(self, message, metadata):
+                self.calls += 1
+                time.sleep(0.002)
+                return (message, metadata)
+
+        plugin = slow_plugin()
+        stats = PluginStats(strikes=2, sink=MemorySink())
+        events = [{"key": i} for i in range(5)]
+        results, metadata = send_events_to_plugins(
+            events, {}, [(plugin, ["*"], 10)], stats
+        )
+        # skipped after the second blown budget
+        assert plugin.calls == 2
+        assert stats.is_skipped(results[0]["plugins"][0])
+        assert [len(r["plugins"]) for r in results] == [1, 1, 0, 0, 0]
+        # and for the per event path with the same stats
+        result, metadata = send_event_to_plugins(
+            {"key": "value"}, {}, [(plugin, ["*"], 10)], stats
+        )
+        assert plugin.calls == 2
+
+    def test_key_index(self):
+        complex_dict1 = {
+            "sub_key": {"some_key": "nested value", "list": [{"some_key": "listed"}]},
+            "some_key": "some value",
+        }
+        index = KeyIndex(complex_dict1)
+        assert "some_key" in index
+        assert "not_a_key" not in index
+        # same order as find_keys
+        assert index.values("some_key") == list(find_keys(complex_dict1, "some_key"))
+        assert index.paths("some_key") == [
+            ("some_key",),
+            ("sub_key", "some_key"),
+            ("sub_key", "list", 0, "some_key"),
+        ]
+        located = index.locate(["nope", "list", "sub_key"])
+        assert list(located.keys()) == ["list", "sub_key"]
+        assert located["list"][0][0] == ("sub_key", "list")
+
+        # patching
+        index.set(("details",), {"ip": "127.0.0.1"})
+        assert index.values("ip") == ["127.0.0.1"]
+        index.remove(("sub_key",))
+        assert index.paths("some_key") == [("some_key",)]
+        assert "list" not in index
+        index.move(("details",), ("moved", "details"))
+        assert index.paths("ip") == [("moved", "details", "ip")]
+        index.move(("some_key",), ("other_key",))
+        assert "some_key" not in index
+        assert index.values("other_key") == ["some value"]
+
+    def test_key_index_patching_order(self):
+        # a shared index patched by the plugins keeps find_keys order
+        from normalization_plugins.event_shell import message as event_shell
+
+        events = [
+            {
+                "time": "top",
+                "moved": {"date": "2020-09-01", "time": "moved"},
+                "category": {"time": "category"},
+                "tags": [{"time": "tag"}],
+            },
+            {"a": {"k": 1}, "k": 2, "details": {"k": 3}, "plugins": [{"k": 4}]},
+        ]
+        for sample in [
+            "sample_cloudtrail_create_log_stream.json",
+            "sample_gsuite_login_event.json",
+        ]:
+            with open(f"./lambdas/tests/samples/{sample}", "r") as f:
+                event = json.loads(f.read())
+            # as it arrives, before the shell
+            event.update(event.pop("details", {}))
+            events.append(event)
+        for event in events:
+            index = KeyIndex(event).share()
+            try:
+                event, metadata = event_shell().onMessage(event, {})
+                event["details"]["added"] = {"time": "added", "k": 5}
+                index.set(("details", "added"), event["details"]["added"])
+                event["added"] = event["details"].pop("added")
+                index.move(("details", "added"), ("added",))
+            finally:
+                index.unshare()
+            for key in index.keys():
+                assert index.values(key) == list(find_keys(event, key)), key
+            fresh = KeyIndex(event)
+            assert sorted(fresh.keys()) == sorted(index.keys())
+
+    def test_key_index_sharing(self):
+        seen = []
+
+        class index_plugin(object):
+            def __init__(self, priority):
+                self.registration = ["*"]
+                self.priority = priority
+                self.uses_key_index = True
+
+            def onMessage(self, message, metadata):
+                index = KeyIndex.of(message)
+                seen.append(index)
+                message["added" + str(self.priority)] = True
+                index.set(("added" + str(self.priority),), True)
+                return (message, metadata)
+
+        class keyed_plugin(object):
+            def __init__(self):
+                self.registration = ["added1"]
+                self.priority = 5
+
+            def onMessage(self, message, metadata):
+                seen.append(KeyIndex.of(message))
+                return (message, metadata)
+
+        plugins = [
+            (index_plugin(1), ["*"], 1),
+            (index_plugin(2), ["*"], 2),
+            (keyed_plugin(), ["added1"], 5),
+            (index_plugin(10), ["*"], 10),
+        ]
+        result, metadata = send_event_to_plugins({"key": "value"}, {}, plugins)
+        # the index aware plugins and the matching share one index
+        assert seen[0] is seen[1] is seen[2]
+        # the keyed plugin doesn't promise to patch, so it's rebuilt after
+        assert seen[3] is not seen[2]
+        assert "added10" in seen[3]
+        assert KeyIndex.shared == {}
+
+        del seen[:]
+        results, metadata = send_events_to_plugins([{"a": 1}, {"b": 2}], {}, plugins)
+        assert seen[0] is seen[2]
+        assert seen[1] is seen[3]
+        assert KeyIndex.shared == {}
+
+    def test_execution_plans(self):
+        # same keys and value types, same shape
+        assert event_shape({"a": "x", "b": [{"c": 1}]}) == event_shape(
+            {"a": "y", "b": [{"c": 2}]}
+        )
+        assert event_shape({"a": "x"}) != event_shape({"a": 1})
+        assert event_shape({"a": "x"}) != event_shape({"b": "x"})
+        assert event_shape({"a": [1]}) != event_shape({"a": [1, 2]})
+        assert event_shape({"category": "x"}) != event_shape({"category": "y"})
+        assert value_at({"a": [{"b": 1}]}, ("a", 0, "b")) == 1
+        with pytest.raises(KeyError):
+            value_at({"a": [{"b": 1}]}, ("a", 1, "b"))
+
+        # least recently used plans are evicted
+        cache = PlanCache(2)
+        for event in [{"a": 1}, {"b": 1}, {"a": 2}, {"c": 1}]:
+            cache.finish(cache.plan_for(event))
+        assert len(cache) == 2
+        assert cache.summary()["hits"] == 1
+        assert cache.summary()["evictions"] == 1
+        assert cache.plan_for({"a": 3}).replaying
+        assert cache.plan_for({"b": 3}).recording
+        assert PlanCache(0).plan_for({"a": 1}) is None
+
+        calls = []
+
+        class finder_plugin(object):
+            def __init__(self):
+                self.registration = ["*"]
+                self.priority = 1
+                self.uses_key_index = True
+                self.uses_plans = True
+
+            def onMessage(self, message, metadata):
+                plan = ExecutionPlan.active_for(message)
+                paths = plan.recall("finder") if plan is not None else None
+                calls.append(("finder", paths is not None))
+                if paths is None:
+                    paths = KeyIndex.of(message).paths("login")
+                    if plan is not None:
+                        plan.remember("finder", paths)
+                if any(value_at(message, path) == "yes" for path in paths):
+                    message["category"] = "authentication"
+                return (message, metadata)
+
+        class keyed_plugin(object):
+            def __init__(self, registration, priority):
+                self.registration = registration
+                self.priority = priority
+
+            def onMessage(self, message, metadata):
+                calls.append((self.registration[0], True))
+                return (message, metadata)
+
+        dispatcher = PluginDispatcher(
+            [
+                (finder_plugin(), ["*"], 1),
+                (keyed_plugin(["kind"], 10), ["kind"], 10),
+                (keyed_plugin(["authentication"], 20), ["authentication"], 20),
+            ]
+        )
+        events = [
+            {"kind": "a", "sub": {"login": "no"}},
+            {"kind": "b", "sub": {"login": "no"}},
+        ]
+        results, metadata = send_events_to_plugins(events, {}, dispatcher)
+        # the first batch records
+        assert dispatcher.plans.summary()["misses"] == 2
+        del calls[:]
+        result, metadata = send_event_to_plugins(
+            {"kind": "c", "sub": {"login": "no"}}, {}, dispatcher
+        )
+        # the next event of that shape replays
+        assert calls == [("finder", True), ("kind", True)]
+        assert dispatcher.plans.summary()["hits"] == 1
+        assert len(result["plugins"]) == 2
+        assert ExecutionPlan.active == {}
+        assert KeyIndex.shared == {}
+
+        # a category the recorded event didn't get, the plan doesn't hold
+        del calls[:]
+        result, metadata = send_event_to_plugins(
+            {"kind": "d", "sub": {"login": "yes"}}, {}, dispatcher
+        )
+        assert calls == [("finder", True), ("kind", True), ("authentication", True)]
+        assert dispatcher.plans.summary()["invalidations"] == 1
+        assert len(dispatcher.plans) == 0
+        # the next one records it again
+        send_event_to_plugins({"kind": "e", "sub": {"login": "no"}}, {}, dispatcher)
+        del calls[:]
+        result, metadata = send_event_to_plugins(
+            {"kind": "e", "sub": {"login": "no"}}, {}, dispatcher
+        )
+        assert calls == [("finder", True), ("kind", True)]
+
+    def test_codec(self):
+        for sample in [
+            "sample_cloudtrail_create_log_stream.json",
+            "sample_gsuite_login_event.json",
+            "sample_vpc_flow_log.json",
+            "sample_cloudfront_wordpress_probe.json",
+        ]:
+            with open(f"./lambdas/tests/samples/{sample}", "rb") as f:
+                raw = f.read()
+            event = codec.loads(raw)
+            assert event == codec.stdlib_loads(raw)
+            line = codec.dumps_line(event)
+            # one record per line for athena
+            assert line.endswith(b"\n")
+            assert line.count(b"\n") == 1
+            # same bytes whichever backend is installed
+            assert line == codec.stdlib_dumps_line(event)
+            assert codec.loads(line) == event
+
+        event = {"unicode": "café", "sub": {"list": [1, 2.5, None, True]}}
+        assert codec.dumps_line(event) == codec.stdlib_dumps_line(event)
+        assert codec.dumps(event) == codec.dumps_line(event)[:-1].decode("utf-8")
+        # things orjson won't encode fall back to the standard library
+        assert codec.dumps_line({1: 2**70}) == b'{"1":1180591620717411303424}\n'
+        # integers too big for orjson decode exactly
+        for raw in [
+            '{"a":[18446744073709551616]}',
+            b'{"a":[-9223372036854775809]}',
+            b'{"a":[123456789012345678901234567890]}',
+        ]:
+            event = codec.loads(raw)
+            assert event == codec.stdlib_loads(raw)
+            assert isinstance(event["a"][0], int)
+        assert codec.loads(b'{"a":"1234567890123456789","b":2}') == {
+            "a": "1234567890123456789",
+            "b": 2,
+        }
+        # floats as python writes them and NaN/Infinity as null, either backend
+        for value, line in [
+            (1e16, b"1e+16\n"),
+            (-1.5e-7, b"-1.5e-07\n"),
+            (0.00001, b"1e-05\n"),
+            (1234.5, b"1234.5\n"),
+            (float("nan"), b"null\n"),
+            ([float("inf"), 2e300], b"[null,2e+300]\n"),
+            ({"a": {"b": (1e-9, float("-inf"))}}, b'{"a":{"b":[1e-09,null]}}\n'),
+            ({"a": "1e16", "b": 10.00001}, b'{"a":"1e16","b":10.00001}\n'),
+        ]:
+            assert codec.dumps_line(value) == line
+            assert codec.stdlib_dumps_line(value) == line
+        rng = random.Random(7)
+        for i in range(2000):
+            value = {
+                "x": rng.random() * 10 ** rng.randrange(-25, 25),
+                "y": [-rng.uniform(0, 1e6), rng.getrandbits(60)],
+            }
+            assert codec.dumps_line(value) == codec.stdlib_dumps_line(value)
+        # things neither will encode fail the same way
+        with pytest.raises(TypeError):
+            codec.dumps_line({"time": datetime.datetime.now()})
+        with pytest.raises(codec.JSONDecodeError):
+            codec.loads(b"not json")
+
+    def test_json_records(self):
+        import gzip
+
+        def streamed(data, gzipped=False, chunk_bytes=3):
+            return list(json_records(text_chunks(BytesIO(data), gzipped, chunk_bytes)))
+
+        with open(
+            "./lambdas/tests/samples/sample_cloudtrail_create_log_stream.json", "rb"
+        ) as f:
+            record = codec.loads(f.read())
+        trail = codec.dumps({"Records": [record, record], "after": 1}).encode("utf-8")
+        # a cloudtrail file, gzipped or not, in any size chunks
+        for chunk_bytes in [1, 7, 4096]:
+            assert streamed(trail, chunk_bytes=chunk_bytes) == [record, record]
+            assert streamed(gzip.compress(trail), True, chunk_bytes) == [record, record]
+        # a list, a dict, nothing to send
+        assert streamed(b'[{"a": 1}, {"b": "caf\xc3\xa9"}]') == [{"a": 1}, {"b": "café"}]
+        assert streamed(b'{"a": [1, 2]}') == [{"a": [1, 2]}]
+        assert streamed(b'{"Records": "nope"}') == []
+        assert streamed(b"{} [] 12") == []
+        # numbers aren't cut at a chunk boundary
+        assert streamed(b"[12345678, 1.5e3]") == [12345678, 1500.0]
+        # new line delimited/concatenated json and gzip members
+        lines = b'{"a": 1}\n{"b": 2}\n'
+        assert streamed(lines) == [{"a": 1}, {"b": 2}]
+        assert streamed(gzip.compress(lines) + gzip.compress(b'{"c": 3}'), True) == [
+            {"a": 1},
+            {"b": 2},
+            {"c": 3},
+        ]
+        # records before anything that isn't json are still decoded
+        records = json_records(text_chunks(BytesIO(b'[{"a": 1}, nope]'), False, 2))
+        assert next(records) == {"a": 1}
+        with pytest.raises(codec.JSONDecodeError):
+            next(records)
+
+    def test_emit_json_block(self):
+        from io import StringIO
+
+        # braces in strings, pretty printed, concatenated and new line delimited
+        blob = '{"a": "}{"}\n{"b":\n  {"c": 1}}{"d": "{{"}\n\n'
+        expected = ['{"a": "}{"}', '{"b":\n  {"c": 1}}', '{"d": "{{"}']
+        assert list(emit_json_block(StringIO(blob))) == expected
+        # or a byte stream, i.e. a file
+        assert list(emit_json_block(BytesIO(blob.encode("utf-8")))) == expected
+        assert list(emit_json_block(StringIO(""))) == []
+        with pytest.raises(codec.JSONDecodeError):
+            list(emit_json_block(StringIO('{"a": 1} not json')))
+
+    def test_summaries(self):
+        import chevron
+
+        event = {
+            "details": {
+                "user": "someone & <someone else>",
+                "events": [{"name": "login_success"}],
+                "count": 0,
+                "success": False,
+                "nothing": None,
+            }
+        }
+        templates = [
+            "{{details.user}} {{details.events.0.name}} from IP {{details.sourceipaddress}}",
+            "{{{details.user}}} {{&details.user}} {{details.count}} {{details.success}}",
+            "{{details.nothing}}{{details.events.3.name}}{{details.user.nope}} {{.}}",
+            "{{#details.events}}{{name}} {{/details.events}}{{^nope}}none{{/nope}}",
+            "no tags at all",
+        ]
+        for template in templates:
+            # same as chevron, the first time and from the compiled template
+            assert render_summary(template, event) == chevron.render(template, event)
+            assert render_summary(template, event) == chevron.render(template, event)
+        assert compile_template(templates[0]) is compile_template(templates[0])
+        assert compile_template(templates[0]).simple
+        # sections are rendered by chevron from the cached tokens
+        assert not compile_template(templates[3]).simple
@@ -0,0 +1,227 @@
+import pytest
+import gzip
+import io
+import json
+from utils.dotdict import DotDict
+from utils.firehose import FirehoseProducer, MAX_BATCH_BYTES, MAX_RECORD_BYTES
+from utils.metrics import MemorySink
+
+
+class FakeFirehose(object):
+    """
+    put_record_batch as firehose does it: the service limits enforced,
+    records throttled (failed with an ErrorCode) on their first
+    `throttle` attempts and calls raising while `errors` remain
+    """
+
+    def __init__(self, throttle=None, errors=0):
+        self.throttle = throttle or {}
+        self.errors = errors
+        self.calls = []
+        self.delivered = []
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.calls.append(len(Records))
+        if self.errors:
+            self.errors -= 1
+            raise Exception("ServiceUnavailableException")
+        assert len(Records) <= 500
+        assert sum(len(record["Data"]) for record in Records) <= MAX_BATCH_BYTES
+        responses = []
+        for record in Records:
+            assert len(record["Data"]) <= MAX_RECORD_BYTES
+            event = json.loads(record["Data"])
+            if self.throttle.get(event["id"], 0):
+                self.throttle[event["id"]] -= 1
+                responses.append(
+                    {
+                        "ErrorCode": "ServiceUnavailableException",
+                        "ErrorMessage": "Slow down.",
+                    }
+                )
+            else:
+                self.delivered.append(event)
+                responses.append({"RecordId": str(event["id"])})
+        return {
+            "FailedPutCount": sum(1 for r in responses if "ErrorCode" in r),
+            "RequestResponses": responses,
+        }
+
+
+class TestFirehose(object):
+    def setup(self):
+        self.sleeps = []
+
+    def producer(self, firehose, **kwargs):
+        return FirehoseProducer(
+            "test_stream", client=firehose, sleep=self.sleeps.append, **kwargs
+        )
+
+    def test_batching(self):
+        firehose = FakeFirehose()
+        producer = self.producer(firehose)
+        producer.put_records({"id": i} for i in range(1200))
+        producer.flush()
+        # batches by count
+        assert firehose.calls == [500, 500, 200]
+        assert [event["id"] for event in firehose.delivered] == list(range(1200))
+        assert producer.stats["records"] == 1200
+        assert producer.stats["batches"] == 3
+
+        # and by size, large records fill a batch before 500 of them
+        firehose = FakeFirehose()
+        producer = self.producer(firehose)
+        padding = "x" * (900 * 1024)
+        producer.put_records({"id": i, "padding": padding} for i in range(10))
+        producer.flush()
+        assert firehose.calls == [4, 4, 2]
+        assert producer.stats["bytes"] > 9 * 900 * 1024
+        # records firehose won't take are dropped and counted
+        producer.put({"id": 11, "padding": "x" * MAX_RECORD_BYTES})
+        producer.flush()
+        assert producer.stats["oversized"] == 1
+        assert len(firehose.delivered) == 10
+        # nothing queued, nothing sent
+        assert firehose.calls == [4, 4, 2]
+
+    def test_retries(self):
+        # only the throttled records are sent again
+        firehose = FakeFirehose(throttle={3: 1, 7: 2})
+        producer = self.producer(firehose, batch_size=10)
+        producer.put_records({"id": i} for i in range(10))
+        producer.flush()
+        assert firehose.calls == [10, 2, 1]
+        assert sorted(event["id"] for event in firehose.delivered) == list(range(10))
+        assert producer.stats["retried"] == 3
+        assert producer.stats["records"] == 10
+        assert producer.stats["failed"] == 0
+        # with a jittered, growing wait between attempts
+        assert len(self.sleeps) == 2
+        assert 0 <= self.sleeps[0] <= 0.2 and 0 <= self.sleeps[1] <= 0.4
+
+        # a record that never goes through is given up on
+        firehose = FakeFirehose(throttle={1: 100})
+        producer = self.producer(firehose, max_attempts=3)
+        producer.put_records({"id": i} for i in range(3))
+        producer.flush()
+        assert firehose.calls == [3, 1, 1]
+        assert producer.stats["failed"] == 1
+        assert producer.stats["records"] == 2
+
+        # calls that raise are retried, then raise
+        firehose = FakeFirehose(errors=1)
+        producer = self.producer(firehose)
+        producer.put({"id": 1})
+        producer.flush()
+        assert firehose.calls == [1, 1]
+        assert producer.stats["records"] == 1
+        firehose = FakeFirehose(errors=10)
+        producer = self.producer(firehose, max_attempts=2)
+        producer.put({"id": 1})
+        with pytest.raises(Exception):
+            producer.flush()
+        assert producer.stats["failed"] == 1
+
+    def test_stats(self):
+        firehose = FakeFirehose(throttle={0: 1})
+        producer = self.producer(firehose)
+        producer.put({"id": 0})
+        producer.flush()
+        sink = MemorySink()
+        producer.emit({"function_name": "test"}, sink=sink)
+        record = sink.records()[0]
+        assert record["delivery_stream"] == "test_stream"
+        assert record["function_name"] == "test"
+        assert record["records"] == 1
+        assert record["retried"] == 1
+        assert record["bytes"] == len('{"id":0}\n')
+
+
+class FakeS3(object):
+    """get_object from a dict of key -> bytes, with a streaming Body"""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+class FakeProducer(object):
+    """a FirehoseProducer that keeps what it's sent"""
+
+    sent = []
+
+    def __init__(self, delivery_stream):
+        self.delivery_stream = delivery_stream
+        self.pending = []
+        self.stats = {"records": 0}
+
+    def put(self, record):
+        self.pending.append(record)
+
+    def flush(self):
+        FakeProducer.sent.extend(self.pending)
+        self.stats["records"] += len(self.pending)
+        self.pending = []
+
+    def emit(self, dimensions=None, sink=None):
+        pass
+
+
+class TestS3ToFirehose(object):
+    def setup(self):
+        self.context = DotDict(
+            {
+                "function_version": "$LATEST",
+                "invoked_function_arn": "arn:aws:lambda:us-west-2:722455710680:function:s3_to_firehose-prod",
+                "function_name": "s3_to_firehose-prod",
+                "memory_limit_in_mb": "1024",
+            }
+        )
+
+    def test_lambda_handler(self, monkeypatch):
+        import s3_to_firehose
+
+        with open(
+            "./lambdas/tests/samples/sample_cloudtrail_create_log_stream.json", "rb"
+        ) as f:
+            # as cloudtrail writes it, before the shell
+            trail = json.loads(f.read())["details"]
+        events = [{"id": i, "nested": {"value": "x" * i}} for i in range(5)]
+        concatenated = "".join(json.dumps(event) for event in events).encode("utf-8")
+        pretty = json.dumps(events, indent=4).encode("utf-8")
+        cloudtrail = json.dumps({"Records": [trail, trail]}, indent=2).encode("utf-8")
+        objects = {
+            "plain/events.json": concatenated,
+            "plain/pretty.json": pretty,
+            "gzipped/events.json.gz": gzip.compress(concatenated),
+            # a gzip member per write, like an appended log
+            "gzipped/pretty.json.gz": gzip.compress(pretty[:100])
+            + gzip.compress(pretty[100:]),
+            "AWSLogs/123456789012_CloudTrail_us-west-2_20200101T0000Z_x.json.gz": (
+                gzip.compress(cloudtrail)
+            ),
+            "broken/events.json": concatenated + b'{"id": 99, "nested": ',
+        }
+        monkeypatch.setattr(s3_to_firehose, "s3_client", lambda: FakeS3(objects))
+        monkeypatch.setattr(s3_to_firehose, "FirehoseProducer", FakeProducer)
+        FakeProducer.sent = []
+        event = {
+            "Records": [
+                {"s3": {"bucket": {"name": "input"}, "object": {"key": key}}}
+                for key in list(objects) + ["a/folder/"]
+            ]
+        }
+        assert s3_to_firehose.lambda_handler(event, self.context) is None
+
+        sent = FakeProducer.sent
+        # every object's records in order, the broken one up to where it breaks
+        assert [record.get("id") for record in sent] == (
+            list(range(5)) * 4 + [None, None] + list(range(5))
+        )
+        for record in sent[:20] + sent[22:]:
+            assert record["source"] == "s3json"
+            assert record["nested"] == {"value": "x" * record["id"]}
+        for record in sent[20:22]:
+            assert record == dict(trail, source="cloudtrail")
@@ -0,0 +1,106 @@
+import pytest
+import yaml
+import json
+import logging, logging.config
+from pathlib import Path
+from utils.helpers import fastpath_source
+
+logging_config_file_path = Path(__file__).parent.joinpath("logging_config.yml")
+with open(logging_config_file_path, "r") as fd:
+    logging_config = yaml.safe_load(fd)
+    logging.config.dictConfig(logging_config)
+global logger
+logger = logging.getLogger()
+
+
+class TestPluginCloudtrail(object):
+    def setup(self):
+        from normalization_plugins.cloudtrail import message
+
+        self.plugin = message()
+        with open(
+            "./lambdas/tests/samples/sample_cloudtrail_create_log_stream.json", "r"
+        ) as f:
+            self.inbound_event = json.loads(f.read())
+        # run the event through default plugins
+        # to set the shell and lowercase all keys
+        from normalization_plugins.event_shell import message as event_shell
+        from normalization_plugins.lowercase_keys import message as lowercase_keys
+
+        metadata = {"something": "else"}
+        event = json.loads(json.dumps(self.inbound_event))
+        event, metadata = lowercase_keys().onMessage(event, metadata)
+        event, metadata = event_shell().onMessage(event, metadata)
+        self.normalized_event = event
+
+    def test_nochange(self):
+        metadata = {"something": "else"}
+        with open("./lambdas/tests/samples/sample_vpc_flow_log.json", "r") as f:
+            event = json.loads(f.read())
+        expected = json.loads(json.dumps(event))
+        result, metadata = self.plugin.onMessage(event, metadata)
+        assert result == expected
+
+    def test_values(self):
+        metadata = {"something": "else"}
+        result, metadata = self.plugin.onMessage(self.normalized_event, metadata)
+        assert result["utctimestamp"] == "2019-09-04T17:54:59+00:00"
+        assert result["source"] == "cloudtrail"
+        assert result["category"] == "api"
+        assert result["details"]["user"] == "some_lambda-us-west-2-lambdaRole"
+        assert result["details"]["_ipaddresses"] == ["54.21.12.27"]
+        assert result["details"]["_sourceipaddress_tags"] == ["external", "public"]
+        assert result["summary"] == (
+            "some_lambda-us-west-2-lambdaRole CreateLogStream logs.amazonaws.com"
+            " from 54.21.12.27"
+        )
+        # marked in the metadata, not in the stored event
+        assert fastpath_source(metadata, result) == "cloudtrail"
+        assert "_fastpath" not in result["details"]
+
+    def test_service_source(self):
+        # aws services calling on our behalf put their name in sourceipaddress
+        metadata = {"something": "else"}
+        event = self.normalized_event
+        event["details"]["sourceipaddress"] = "config.amazonaws.com"
+        event["details"]["useragent"] = "config.amazonaws.com"
+        event["details"]["useridentity"] = {"invokedby": "config.amazonaws.com"}
+        result, metadata = self.plugin.onMessage(event, metadata)
+        assert "sourceipaddress" not in result["details"]
+        assert "_ipaddresses" not in result["details"]
+        assert result["details"]["user"] == "config.amazonaws.com"
+
+    def test_discovery_skipped(self):
+        # the generic discovery leaves fast path events alone
+        from normalization_plugins.ip_addresses import message as ip_addresses
+        from normalization_plugins.timestamps import message as timestamps
+
+        metadata = {"something": "else"}
+        event, metadata = self.plugin.onMessage(self.normalized_event, metadata)
+        # a field the generic discovery would pick first
+        event["details"]["requestparameters"]["timestamp"] = "2001-01-01T00:00:00Z"
+        event["details"]["requestparameters"]["src"] = "10.0.0.1"
+        event, metadata = ip_addresses().onMessage(event, metadata)
+        event, metadata = timestamps().onMessage(event, metadata)
+        assert event["utctimestamp"] == "2019-09-04T17:54:59+00:00"
+        assert event["details"]["sourceipaddress"] == "54.21.12.27"
+        assert event["details"]["_ipaddresses"] == ["54.21.12.27"]
+        assert "_utcprocessedtimestamp" in event["details"]
+
+    def test_pipeline(self, monkeypatch):
+        # same result through the registered plugins from the raw record
+        from utils.plugins import get_plugins, send_event_to_plugins
+
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        event = json.loads(json.dumps(self.inbound_event))
+        # as s3_to_firehose would send it, before the shell
+        event.update(event.pop("details"))
+        del event["tags"]
+        result, metadata = send_event_to_plugins(
+            event, {}, get_plugins("normalization_plugins")
+        )
+        assert result["utctimestamp"] == "2019-09-04T17:54:59+00:00"
+        assert result["details"]["sourceipaddress"] == "54.21.12.27"
+        assert fastpath_source(metadata, result) == "cloudtrail"
+        assert "_fastpath" not in result["details"]
+        assert "normalization_cloudtrail" in result["plugins"]
@@ -0,0 +1,158 @@
+import pytest
+import yaml
+import json
+import logging, logging.config
+from pathlib import Path
+
+logging_config_file_path = Path(__file__).parent.joinpath("logging_config.yml")
+with open(logging_config_file_path, "r") as fd:
+    logging_config = yaml.safe_load(fd)
+    logging.config.dictConfig(logging_config)
+global logger
+logger = logging.getLogger()
+
+
+class TestPluginFieldMappings(object):
+    def setup(self):
+        from normalization_plugins.field_mappings import message, load_mappings
+
+        self.plugin = message(
+            load_mappings(
+                "./lambdas/normalization_plugins/field_mappings.example.yml"
+            )
+        )
+        self.normalized_events = {}
+        # run the events through default plugins
+        # to lowercase all keys and set the shell
+        from normalization_plugins.event_shell import message as event_shell
+        from normalization_plugins.lowercase_keys import message as lowercase_keys
+
+        for sample in ["vpc_flow_log", "cloudfront_wordpress_probe", "syslog_sudo"]:
+            with open(f"./lambdas/tests/samples/sample_{sample}.json", "r") as f:
+                event = json.loads(f.read())
+            metadata = {"something": "else"}
+            event, metadata = lowercase_keys().onMessage(event, metadata)
+            event, metadata = event_shell().onMessage(event, metadata)
+            self.normalized_events[sample] = event
+
+    def test_registration(self):
+        # registered for the keys the mappings match on, not everything
+        assert "*" not in self.plugin.registration
+        assert "interface_id" in self.plugin.registration
+        assert "x-edge-request-id" in self.plugin.registration
+
+    def test_default(self):
+        # no mappings are shipped, the examples are opt in
+        from normalization_plugins.field_mappings import message
+
+        plugin = message()
+        assert plugin.registration == []
+        metadata = {"something": "else"}
+        event = self.normalized_events["vpc_flow_log"]
+        expected = json.loads(json.dumps(event))
+        result, metadata = plugin.onMessage(event, metadata)
+        assert result == expected
+
+    def test_nochange(self):
+        metadata = {"something": "else"}
+        event = self.normalized_events["syslog_sudo"]
+        expected = json.loads(json.dumps(event))
+        result, metadata = self.plugin.onMessage(event, metadata)
+        assert result == expected
+
+    def test_values(self):
+        metadata = {"something": "else"}
+        result, metadata = self.plugin.onMessage(
+            self.normalized_events["vpc_flow_log"], metadata
+        )
+        assert result["source"] == "vpcflowlogs"
+        assert result["category"] == "network"
+        assert "vpcflowlogs" in result["tags"]
+        assert result["utctimestamp"] == "2014-12-14T04:06:50+00:00"
+        assert result["summary"] == "198.51.100.1:443 -> 192.0.2.1:49152 ACCEPT"
+
+        result, metadata = self.plugin.onMessage(
+            self.normalized_events["cloudfront_wordpress_probe"], metadata
+        )
+        assert result["source"] == "cloudfront"
+        assert result["category"] == "web"
+        assert result["summary"] == "139.59.66.23 GET somewhere.com/wp-login.php 301"
+        assert result["details"]["useragent"].startswith("Mozilla/5.0")
+        assert "cs(user-agent)" not in result["details"]
+
+    def test_declarations(self):
+        from normalization_plugins.field_mappings import message
+
+        plugin = message(
+            [
+                {
+                    "name": "specific",
+                    "match": {"details.kind": "thing", "details.level": [1, 2]},
+                    "rename": {"details.who": "details.user.name"},
+                    "summary": "{{details.user.name}} did a thing",
+                },
+                {
+                    "name": "general",
+                    "match": {"details.kind": None},
+                    "category": "general",
+                    "tags": ["general"],
+                },
+            ]
+        )
+        assert plugin.registration == ["kind", "level"]
+        # one dispatch key, on the first path
+        assert len(plugin.dispatch) == 1
+
+        event = {"tags": [], "details": {"kind": "thing", "level": 2, "who": "me"}}
+        result, metadata = plugin.onMessage(event, {})
+        # first declared match wins
+        assert result["summary"] == "me did a thing"
+        assert result["details"]["user"] == {"name": "me"}
+        assert "category" not in result
+
+        event = {"tags": [], "details": {"kind": "thing", "level": 3}}
+        result, metadata = plugin.onMessage(event, {})
+        assert result["category"] == "general"
+        assert result["tags"] == ["general"]
+
+        # unhashable values don't break matching
+        event = {"tags": [], "details": {"kind": ["thing"]}}
+        result, metadata = plugin.onMessage(event, {})
+        assert result["category"] == "general"
+
+        with pytest.raises(ValueError):
+            message([{"name": "typo", "match": {"a": 1}, "sumary": "x"}])
+        with pytest.raises(ValueError):
+            message([{"name": "no criteria"}])
+
+    def test_list_paths(self):
+        from normalization_plugins.field_mappings import message
+
+        # lists can be matched on and read from
+        plugin = message(
+            [
+                {
+                    "name": "listed",
+                    "match": {"details.events.0.name": "login"},
+                    "rename": {"details.who": "details.user.name"},
+                    "timestamp": "details.events.1.time",
+                }
+            ]
+        )
+        event = {
+            "details": {
+                "who": "me",
+                "events": [{"name": "login"}, {"time": "2020-09-01 10:00:00"}],
+            }
+        }
+        result, metadata = plugin.onMessage(event, {})
+        assert result["details"]["user"] == {"name": "me"}
+        assert result["utctimestamp"] == "2020-09-01T10:00:00+00:00"
+
+        # but not renamed from or to
+        for rename in [
+            {"details.events.0.name": "details.event"},
+            {"details.event": "details.events.0.name"},
+        ]:
+            with pytest.raises(ValueError):
+                message([{"name": "listed", "match": {"a": 1}, "rename": rename}])
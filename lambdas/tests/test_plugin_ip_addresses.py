@@ -64,6 +64,8 @@ class TestPluginIpAddresses(object):
         # use the normalized event
         for event in self.normalized_events:
             result, metadata = self.plugin.onMessage(event, metadata)
+            # updated in place, not copied
+            assert result is event
             assert "utctimestamp" in result
             assert "severity" in result
             assert "summary" in result
@@ -87,6 +89,7 @@ class TestPluginIpAddresses(object):
         logger.debug(result)
         assert result["details"]["sourceipaddress"] == "54.21.12.27"
         assert "54.21.12.27" in result["details"]["_ipaddresses"]
+        assert result["details"]["_sourceipaddress_tags"] == ["external", "public"]
 
         event = self.normalized_events[1]
         result, metadata = self.plugin.onMessage(event, metadata)
@@ -6,8 +6,10 @@ import logging, logging.config
 from pathlib import Path
 from utils.dotdict import DotDict
 from utils.dates import toUTC
+import pytz
 import tzlocal
 import os
+import time
 
 logging_config_file_path = Path(__file__).parent.joinpath("logging_config.yml")
 with open(logging_config_file_path, "r") as fd:
@@ -136,4 +138,81 @@ class TestPluginTimestamps(object):
         event["details"]["start"] = "nada"
         result, metadata = self.plugin.onMessage(event, metadata)
         logger.debug(result)
-        assert result["details"]["start"] == "nada"
\ No newline at end of file
+        assert result["details"]["start"] == "nada"
+
+    def test_parser_parity(self):
+        """
+        the fast paths and learned formats agree with
+        a fuzzy dateutil parse, as toUTC always used to do
+        """
+        from dateutil.parser import parse
+        from utils.dates import TimestampParser, local_timezone
+
+        def as_utc(parsed):
+            if parsed.tzinfo is None:
+                parsed = local_timezone().localize(parsed)
+            return parsed.astimezone(pytz.UTC)
+
+        values = [
+            # as in the samples
+            "2019-09-04T17:54:59Z",
+            "2020-09-01 17:48:18",
+            "2014-12-14T04:06:50",
+            # and other things we see
+            "2020-09-01T17:48:18.5+05:30",
+            "2020-09-01T17:48:18.1234567-0700",
+            "2020-09-01T17:48",
+            "01/Sep/2020:17:48:18 +0000",
+            "2020-09-01 17:48:18,123",
+            "2020/09/01 17:48:18",
+            "09/01/2020 17:48:18",
+            "Tue, 01 Sep 2020 17:48:18 GMT",
+        ]
+        parser = TimestampParser()
+        for value in values:
+            expected = as_utc(parse(value, fuzzy=True))
+            hint = ("test", value)
+            # the first parse may learn a format for the hint
+            # the second uses it, the third is remembered
+            assert as_utc(parser.parse(value, hint)) == expected
+            parser.recent.clear()
+            assert as_utc(parser.parse(value, hint)) == expected
+            assert as_utc(parser.parse(value, hint)) == expected
+            assert toUTC(value, hint=hint) == expected
+
+        assert parser.formats[("test", "01/Sep/2020:17:48:18 +0000")] == (
+            "%d/%b/%Y:%H:%M:%S %z"
+        )
+        assert parser.formats[("test", "09/01/2020 17:48:18")] == "%m/%d/%Y %H:%M:%S"
+        # iso strings don't need one
+        assert ("test", "2019-09-04T17:54:59Z") not in parser.formats
+
+        with pytest.raises(ValueError):
+            parser.parse("nada", hint=("test", "nada"))
+        # and remembered as not a date
+        assert parser.recent["nada"]
+        with pytest.raises(ValueError):
+            toUTC("nada")
+        # an unhashable hint is ignored
+        assert toUTC("2020/09/01 17:48:18", hint=({}, "time")) == as_utc(
+            parse("2020/09/01 17:48:18")
+        )
+
+    def test_local_timezone_reload(self, monkeypatch):
+        from utils.dates import local_timezone
+
+        assert local_timezone() is local_timezone()
+        assert str(local_timezone()) == "UTC"
+        assert toUTC("2020-09-01 17:48:18").isoformat() == "2020-09-01T17:48:18+00:00"
+        monkeypatch.setenv("TZ", "America/New_York")
+        time.tzset()
+        try:
+            assert str(local_timezone()) == "America/New_York"
+            assert (
+                toUTC("2020-09-01 17:48:18").isoformat() == "2020-09-01T21:48:18+00:00"
+            )
+        finally:
+            # the TZ we started with, and the process' zone with it
+            monkeypatch.undo()
+            time.tzset()
+        assert str(local_timezone()) == "UTC"
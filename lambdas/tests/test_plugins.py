@@ -39,6 +39,28 @@ class TestLowerCaseKeys(object):
         # lower case the upper case keys wherever they are
         assert result == expected
 
+    def test_in_place(self):
+        metadata = {"something": "else"}
+        details = {"subkey": [{"name": "value"}], "other": {"Key": "value"}}
+        event = {"key1": "syslog", "tags": ["atag"], "details": details}
+        result, metadata = self.plugin.onMessage(event, metadata)
+        assert result == {
+            "key1": "syslog",
+            "tags": ["atag"],
+            "details": {"subkey": [{"name": "value"}], "other": {"key": "value"}},
+        }
+        # only the dict with an upper case key is new
+        assert result is event
+        assert result["details"] is details
+        assert result["details"]["subkey"] is details["subkey"]
+
+    def test_key_order(self):
+        metadata = {"something": "else"}
+        event = {"a": 1, "B": 2, "c": [{"D": 3, "d": 4}], "b": 5}
+        result, metadata = self.plugin.onMessage(event, metadata)
+        # the order stays and the last of two keys that lowercase the same wins
+        assert list(result.items()) == [("a", 1), ("b", 5), ("c", [{"d": 4}])]
+
 
 class TestEnsureEventID(object):
     def setup(self):
@@ -90,3 +112,21 @@ class TestEventShell(object):
         assert "key1" in result["details"]
         assert "complexkey" in result["details"]
         assert "subkey" in result["details"]["complexkey"]
+
+    def test_event_shell_in_place(self):
+        # the shell is filled in without copying the event
+        # and a shared key index is patched rather than dropped
+        from utils.dict_helpers import KeyIndex
+
+        complexkey = {"subkey": "subvalue"}
+        event = {"key1": "syslog", "complexkey": complexkey}
+        index = KeyIndex(event).share()
+        try:
+            result, metadata = self.plugin.onMessage(event, {})
+        finally:
+            index.unshare()
+        assert result is event
+        assert result["details"]["complexkey"] is complexkey
+        assert index.values("summary") == ["UNKNOWN"]
+        assert index.paths("subkey") == [("details", "complexkey", "subkey")]
+        assert sorted(index.keys()) == sorted(KeyIndex(result).keys())
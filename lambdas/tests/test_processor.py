@@ -0,0 +1,262 @@
+import pytest
+import yaml
+import json
+import base64
+import logging, logging.config
+from pathlib import Path
+from utils.dotdict import DotDict
+from utils.metrics import MemorySink
+
+logging_config_file_path = Path(__file__).parent.joinpath("logging_config.yml")
+with open(logging_config_file_path, "r") as fd:
+    logging_config = yaml.safe_load(fd)
+    logging.config.dictConfig(logging_config)
+global logger
+logger = logging.getLogger()
+
+
+class TestProcessor(object):
+    def setup(self):
+        self.context = DotDict(
+            {
+                "function_version": "$LATEST",
+                "invoked_function_arn": "arn:aws:lambda:us-west-2:722455710680:function:processor-prod",
+                "function_name": "processor-prod",
+                "memory_limit_in_mb": "1024",
+            }
+        )
+        self.records = []
+        for sample in [
+            "sample_cloudtrail_create_log_stream.json",
+            "sample_gsuite_login_event.json",
+            "sample_vpc_flow_log.json",
+        ]:
+            with open(f"./lambdas/tests/samples/{sample}", "rb") as f:
+                self.records.append(
+                    {
+                        "recordId": sample,
+                        "data": base64.b64encode(f.read()).decode("utf-8"),
+                    }
+                )
+        # not json at all
+        self.records.insert(
+            1,
+            {
+                "recordId": "garbage",
+                "data": base64.b64encode(b"not json").decode("utf-8"),
+            },
+        )
+
+    def test_firehose_transform(self, monkeypatch):
+        # plugin directories are relative to the lambda task root
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        import processor
+
+        sink = MemorySink()
+        monkeypatch.setattr(processor, "metrics_sink", sink)
+        result = processor.lambda_handler({"records": self.records}, self.context)
+        # every record comes back, in order
+        assert [r["recordId"] for r in result["records"]] == [
+            r["recordId"] for r in self.records
+        ]
+        assert [r["result"] for r in result["records"]] == [
+            "Ok",
+            "ProcessingFailed",
+            "Ok",
+            "Ok",
+        ]
+        # the garbage record is handed back untouched
+        assert result["records"][1]["data"] == self.records[1]["data"]
+
+        decoded = base64.b64decode(result["records"][2]["data"])
+        # json ending in new line so athena recognizes the records
+        assert decoded.endswith(b"\n")
+        event = json.loads(decoded)
+        assert event["source"] == "gsuite"
+        assert event["category"] == "authentication"
+        assert "eventid" in event
+        assert "gsuite_login" in " ".join(event["plugins"])
+        # per plugin metrics in embedded metric format
+        plugin_metrics = {r["plugin"]: r for r in sink.records() if "plugin" in r}
+        assert plugin_metrics["normalization_event_shell"]["calls"] == 3
+        assert plugin_metrics["enrichment_ensure_eventid"]["calls"] == 3
+
+    def test_parallel_transform(self, monkeypatch):
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        import processor
+
+        monkeypatch.setattr(processor, "metrics_sink", MemorySink())
+        monkeypatch.setattr(processor, "PROCESSOR_WORKERS", "3")
+        monkeypatch.setattr(processor, "PARALLEL_MIN_RECORDS", 1)
+        records = self.records * 3
+        result = processor.lambda_handler({"records": records}, self.context)
+        # sharded across workers but handed back in order
+        assert [r["recordId"] for r in result["records"]] == [
+            r["recordId"] for r in records
+        ]
+        assert [r["result"] for r in result["records"]] == [
+            "Ok",
+            "ProcessingFailed",
+            "Ok",
+            "Ok",
+        ] * 3
+        for position in [2, 6, 10]:
+            event = json.loads(base64.b64decode(result["records"][position]["data"]))
+            assert event["source"] == "gsuite"
+
+        # the worker stats are folded into the invocation's stats
+        stats = processor.PluginStats(sink=MemorySink())
+        processor.process_records_parallel(records, {}, 2, stats)
+        assert stats.summary()["normalization_event_shell"]["calls"] == 9
+
+    def test_replay_harness(self, monkeypatch):
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        import processor
+        from benchmarks import replay
+
+        monkeypatch.setattr(processor, "metrics_sink", MemorySink())
+        result = replay.replay(
+            batches=1, batch_size=20, mix=replay.parse_mix("cloudtrail=1,gsuite")
+        )
+        assert result["records"] == 20
+        assert result["records_per_second"] > 0
+        assert result["plugins"]["normalization_event_shell"]["calls"] == 20
+        with pytest.raises(ValueError):
+            replay.parse_mix("nosuchthing=1")
+
+    def test_execution_plan_parity(self, monkeypatch):
+        # replayed plans normalize events the same as full discovery
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        import copy
+        from utils.plugins import (
+            PluginDispatcher,
+            get_plugins,
+            send_event_to_plugins,
+            send_events_to_plugins,
+        )
+        from utils.plans import PlanCache
+        from utils.dates import utcnow
+        from benchmarks import plan_cache
+        from benchmarks.records import records
+
+        started = utcnow().isoformat()
+        registry = get_plugins("normalization_plugins")
+        sample = records(200)
+        without = PluginDispatcher(registry)
+        without.plans = PlanCache(0)
+        planned = PluginDispatcher(registry)
+        expected, metadata = send_events_to_plugins(copy.deepcopy(sample), {}, without)
+        # the first batch records, the second replays
+        send_events_to_plugins(copy.deepcopy(sample), {}, planned)
+        results, metadata = send_events_to_plugins(copy.deepcopy(sample), {}, planned)
+        assert planned.plans.summary()["hits"] >= 150
+        for before, after in zip(expected, results):
+            assert plan_cache.stable(before, started) == plan_cache.stable(
+                after, started
+            )
+
+        # a key a plugin adds for some values but not others
+        # reaches the plugins registered for it when a plan is replayed
+        class special_plugin(object):
+            def onMessage(self, message, metadata):
+                if message.get("kind") == "special":
+                    message["extra"] = True
+                return (message, metadata)
+
+        class extra_plugin(object):
+            def onMessage(self, message, metadata):
+                message["saw_extra"] = True
+                return (message, metadata)
+
+        plugins = [(special_plugin(), ["*"], 1), (extra_plugin(), ["extra"], 2)]
+        without = PluginDispatcher(plugins)
+        without.plans = PlanCache(0)
+        planned = PluginDispatcher(plugins)
+        for dispatcher in (without, planned):
+            # in a batch and one at a time, replaying the plan for "normal"
+            seen = []
+            for kinds in [["normal"], ["special", "special"]]:
+                events = [{"kind": kind} for kind in kinds]
+                seen += send_events_to_plugins(events, {}, dispatcher)[0]
+            for kind in ["normal", "special"]:
+                seen.append(send_event_to_plugins({"kind": kind}, {}, dispatcher)[0])
+            assert [event.get("saw_extra") for event in seen] == [
+                None,
+                True,
+                True,
+                None,
+                True,
+            ]
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_execution_plan_value_parity(self, monkeypatch, seed):
+        # events of one shape with different values normalize the same
+        # whether a plan is replayed or not
+        monkeypatch.chdir(Path(__file__).parent.parent)
+        import copy
+        import random
+        from utils.plugins import (
+            PluginDispatcher,
+            get_plugins,
+            send_event_to_plugins,
+            send_events_to_plugins,
+        )
+        from utils.plans import PlanCache
+        from utils.dates import utcnow
+        from benchmarks import plan_cache
+
+        rng = random.Random(seed)
+
+        def clock():
+            return "{:02d}:{:02d}:{:02d}".format(
+                rng.randrange(24), rng.randrange(60), rng.randrange(60)
+            )
+
+        # a date the shell moves into details, a time at the top
+        # and another under a category that isn't a string
+        sample = [
+            {
+                "time": clock(),
+                "moved": {
+                    "date": "2020-{:02d}-{:02d}".format(
+                        rng.randrange(1, 13), rng.randrange(1, 29)
+                    )
+                },
+                "category": {"time": clock()},
+                "summary": "event {}".format(i),
+            }
+            for i in range(20)
+        ]
+        started = utcnow().isoformat()
+        registry = get_plugins("normalization_plugins")
+        without = PluginDispatcher(registry)
+        without.plans = PlanCache(0)
+        planned = PluginDispatcher(registry)
+        expected, metadata = send_events_to_plugins(copy.deepcopy(sample), {}, without)
+        # the first batch records, the second and the singles replay
+        send_events_to_plugins(copy.deepcopy(sample), {}, planned)
+        results, metadata = send_events_to_plugins(copy.deepcopy(sample), {}, planned)
+        singles = [
+            send_event_to_plugins(copy.deepcopy(event), {}, planned)[0]
+            for event in sample
+        ]
+        assert planned.plans.summary()["hits"] >= 2 * len(sample)
+        for before, after, single in zip(expected, results, singles):
+            before = plan_cache.stable(before, started)
+            assert plan_cache.stable(after, started) == before
+            assert plan_cache.stable(single, started) == before
+
+    @pytest.mark.parametrize(
+        "handler", ["processor", "s3_to_firehose", "generate_partitions"]
+    )
+    def test_cold_start_imports(self, handler):
+        # importing a handler leaves heavy modules for later
+        # (and stays under budget, if one is set)
+        from benchmarks import import_times
+
+        if handler == "generate_partitions":
+            pytest.importorskip("boto3")
+        imports = import_times.import_times("import " + handler)
+        assert import_times.heavy_modules(imports) == []
+        if import_times.IMPORT_BUDGET_MS is not None:
+            assert import_times.total_ms(imports) < import_times.IMPORT_BUDGET_MS
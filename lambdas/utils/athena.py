@@ -1,4 +1,3 @@
-import pandas as pd
 import io
 import logging
 logger = logging.getLogger()
@@ -32,6 +31,9 @@ def dataframe_from_athena_s3(session,athena_response,bucket_name):
     Retrieve the native athena csv results as a pandas dataframe
     for easy conversion and analysis
     '''
+    # pandas is only needed here, don't pay for it on import
+    import pandas as pd
+
     s3=session.resource('s3')
     key_name=athena_response['QueryExecutionId']
     s3_response = s3.Bucket(bucket_name).Object(key= key_name + '.csv').get()
@@ -0,0 +1,142 @@
+import json
+import logging
+import math
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the build
+    orjson = None
+
+logger = logging.getLogger()
+
+# same exception whichever backend is in use
+# (orjson.JSONDecodeError is a subclass)
+JSONDecodeError = json.JSONDecodeError
+
+# leave datetimes/dataclasses to fail like they do in the standard library
+# rather than have the two backends disagree on their format
+ORJSON_OPTIONS = (
+    orjson.OPT_APPEND_NEWLINE
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson
+    else None
+)
+
+BACKEND = "orjson" if orjson else "json"
+
+# orjson decodes integers beyond 64 bits as floats, losing digits.
+# Those have 19 or more, so documents with a run of 19 digits are decoded
+# with the standard library. Anything else that matches (digits in a
+# string, a long float) just costs the slower decoder.
+# (every digit translated to 0 and searched for, a regex is ~10x slower)
+ZERO_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+LONG_DIGITS = b"0" * 19
+
+
+def has_long_digits(data):
+    """does a json str/bytes document have a run of 19 or more digits"""
+    if isinstance(data, str):
+        # digits are ascii, whatever else is in there
+        data = data.encode("utf-8", "surrogatepass")
+    return LONG_DIGITS in bytes(data).translate(ZERO_DIGITS)
+
+
+# orjson and the standard library write the same (shortest) digits for a
+# float but python's repr uses an exponent below 1e-4 and from 1e16 up
+# (1e-05, 1.5e-07, 1e+16) where orjson writes 0.00001, 1.5e-7 and 1e16.
+# orjson's lines with such a float are written again by the standard library:
+# with digits, signs and points deleted and the json punctuation around
+# values made one byte, an exponent float is a lone e between two of them.
+# (a string with the same shape just costs the slower encoder)
+NUMBER_CHARS = b"0123456789.-+"
+DELIMITERS = bytes.maketrans(b":,[]}\n", b"||||||")
+EXPONENT = b"|e|"
+
+
+def has_exponent(line):
+    """does a line orjson wrote have a float python would write differently"""
+    if b"0.0000" in line:
+        return True
+    shape = line.translate(DELIMITERS, NUMBER_CHARS)
+    return EXPONENT in shape or shape.startswith(b"e|")
+
+
+def stdlib_loads(data):
+    return json.loads(data)
+
+
+def finite(obj):
+    """obj with NaN/Infinity in its values replaced by None"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite(value) for value in obj]
+    return obj
+
+
+def stdlib_dumps(obj, ensure_ascii):
+    try:
+        return json.dumps(
+            obj, separators=(",", ":"), ensure_ascii=ensure_ascii, allow_nan=False
+        )
+    except ValueError as e:
+        if not str(e).startswith("Out of range float"):
+            raise
+    # NaN/Infinity aren't json, write them as null like orjson does
+    return json.dumps(finite(obj), separators=(",", ":"), ensure_ascii=ensure_ascii)
+
+
+def stdlib_dumps_line(obj):
+    """
+    compact, utf-8 json ending in a new line, using the standard library
+    """
+    try:
+        return stdlib_dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+    except UnicodeEncodeError:
+        # lone surrogates can't be utf-8, let json escape them
+        return stdlib_dumps(obj, ensure_ascii=True).encode("utf-8") + b"\n"
+
+
+def loads(data):
+    """
+    decode a json str/bytes document
+    raises JSONDecodeError on invalid json
+    """
+    if orjson is not None and not has_long_digits(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # the standard library is more forgiving (NaN, etc)
+            # and raises the same exception if it's truly not json
+            pass
+    return stdlib_loads(data)
+
+
+def dumps_line(obj):
+    """
+    encode obj as a single line of compact, utf-8 json
+    ending in a new line so athena's JsonSerDe sees one record per line
+
+    The bytes are the same whichever backend is installed:
+    floats as python writes them (1e+16, 1e-05) and NaN/Infinity,
+    which json doesn't allow, as null.
+    Anything orjson won't encode (non str keys, >64bit ints, etc)
+    or would write differently is handed to the standard library.
+    """
+    if orjson is not None:
+        try:
+            line = orjson.dumps(obj, option=ORJSON_OPTIONS)
+        except TypeError:
+            pass
+        else:
+            if not has_exponent(line):
+                return line
+    return stdlib_dumps_line(obj)
+
+
+def dumps(obj):
+    """dumps_line as a str, without the new line"""
+    return dumps_line(obj)[:-1].decode("utf-8")
@@ -1,12 +1,33 @@
+import os
+import re
 import math
 import pytz
-import tzlocal
-from datetime import datetime, timedelta
-from dateutil.parser import parse
+from datetime import date, datetime, timedelta
 import logging
 
 logger = logging.getLogger()
 
+# how many recently parsed date strings to remember
+DATE_CACHE_SIZE = int(os.environ.get("DATE_CACHE_SIZE", 8192))
+# how many (source, field) hints to learn a format for
+DATE_FORMAT_HINTS = int(os.environ.get("DATE_FORMAT_HINTS", 1024))
+
+# ISO 8601/RFC3339 as logged: 2019-09-04T17:54:59Z, 2020-09-01 17:48:18.5+05:30
+ISO_TIMESTAMP_REGEX = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d+))?)?"
+    r"(Z|z|[+-]\d{2}:?\d{2})?$"
+)
+
+# formats we try to learn for a (source, field) when the fast path misses
+STRPTIME_FORMATS = [
+    "%d/%b/%Y:%H:%M:%S %z",
+    "%Y-%m-%d %H:%M:%S,%f",
+    "%Y/%m/%d %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+    "%d %b %Y %H:%M:%S",
+    "%b %d %Y %H:%M:%S",
+]
+
 
 def get_date_parts():
     now = datetime.utcnow()
@@ -33,14 +54,146 @@ def get_date_parts():
     )
 
 
-def toUTC(suspectedDate):
-    """make a UTC date out of almost anything"""
+class TimestampParser(object):
+    """
+    turn date strings into datetimes, as dateutil's fuzzy parse would, but:
+    ISO 8601/RFC3339 strings take a regex fast path,
+    the strptime format that works for a hint, i.e. (source, field),
+    is learned and tried first for that hint next time,
+    and recently parsed strings are remembered.
+    Fuzzy parsing is the last resort.
+    """
+
+    def __init__(self, cache_size=DATE_CACHE_SIZE, max_hints=DATE_FORMAT_HINTS):
+        self.cache_size = cache_size
+        self.max_hints = max_hints
+        # text -> datetime, or the error message for strings that aren't dates
+        self.recent = {}
+        # fuzzy parses fill in missing parts from today
+        # so they're only remembered for the day
+        self.recent_day = date.today()
+        # hint -> strptime format
+        self.formats = {}
+
+    def remember(self, text, result):
+        if len(self.recent) >= self.cache_size:
+            # drop the oldest
+            del self.recent[next(iter(self.recent))]
+        self.recent[text] = result
+
+    def parse(self, text, hint=None):
+        today = date.today()
+        if today != self.recent_day:
+            self.recent.clear()
+            self.recent_day = today
+        result = self.recent.get(text)
+        if result is None:
+            try:
+                hash(hint)
+            except TypeError:
+                hint = None
+            try:
+                result = self._parse(text, hint)
+            except ValueError as e:
+                result = str(e)
+            self.remember(text, result)
+        if isinstance(result, str):
+            raise ValueError(result)
+        return result
+
+    def _parse(self, text, hint):
+        match = ISO_TIMESTAMP_REGEX.match(text)
+        if match:
+            return iso_datetime(match)
+
+        # try to parse float or negative number from string:
+        try:
+            if float(text) <= 0:
+                return datetime(1970, 1, 1)
+        except ValueError:
+            pass
+
+        learned = self.formats.get(hint)
+        if learned is not None:
+            try:
+                return datetime.strptime(text, learned)
+            except ValueError:
+                pass
+
+        # dateutil is only imported the first time we need it
+        from dateutil.parser import parse
+
+        result = parse(text, fuzzy=True)
+        if hint is not None and learned is None and len(self.formats) < self.max_hints:
+            self.learn(text, hint, result)
+        return result
+
+    def learn(self, text, hint, result):
+        """remember the first format that gives the same result as dateutil"""
+        for candidate in STRPTIME_FORMATS:
+            try:
+                if datetime.strptime(text, candidate) == result:
+                    self.formats[hint] = candidate
+                    return candidate
+            except (ValueError, TypeError):
+                continue
+        return None
+
+
+def iso_datetime(match):
+    """a datetime from an ISO_TIMESTAMP_REGEX match"""
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    # like dateutil, we keep microseconds and ignore any finer digits
+    microsecond = int((fraction or "0")[:6].ljust(6, "0"))
+    tzinfo = None
+    if offset in ("Z", "z"):
+        tzinfo = pytz.UTC
+    elif offset:
+        sign = -1 if offset[0] == "-" else 1
+        offset = offset[1:].replace(":", "")
+        minutes = sign * (int(offset[:2]) * 60 + int(offset[2:]))
+        tzinfo = pytz.FixedOffset(minutes) if minutes else pytz.UTC
+    return datetime(
+        int(year),
+        int(month),
+        int(day),
+        int(hour),
+        int(minute),
+        int(second or 0),
+        microsecond,
+        tzinfo,
+    )
+
+
+timestamp_parser = TimestampParser()
+
+_local_timezone = None
+_local_timezone_tz = None
+
+
+def local_timezone():
+    """
+    tzlocal's zone, reloaded only when the TZ environment variable changes
+    rather than on every call
+    """
+    global _local_timezone, _local_timezone_tz
+    tz = os.environ.get("TZ")
+    if _local_timezone is None or tz != _local_timezone_tz:
+        # only imported once a timestamp without a zone turns up
+        import tzlocal
+
+        _local_timezone = tzlocal.reload_localzone()
+        _local_timezone_tz = tz
+    return _local_timezone
+
+
+def toUTC(suspectedDate, hint=None):
+    """make a UTC date out of almost anything
+    hint, i.e. (source, field), lets us learn the format
+    of strings that arrive from the same place
+    """
     utc = pytz.UTC
     objDate = None
-    # pick up any environment TZ changes
-    tzlocal.reload_localzone()
-
-    LOCAL_TIMEZONE = tzlocal.get_localzone()
 
     if type(suspectedDate) == datetime:
         objDate = suspectedDate
@@ -53,7 +206,7 @@ def toUTC(suspectedDate):
             magnitude = int(math.log10(int(suspectedDate)))
             if magnitude > EPOCH_MAGNITUDE:
                 suspectedDate = suspectedDate / 10 ** (magnitude - EPOCH_MAGNITUDE)
-            objDate = datetime.fromtimestamp(suspectedDate, LOCAL_TIMEZONE)
+            objDate = datetime.fromtimestamp(suspectedDate, local_timezone())
     elif str(suspectedDate).isdigit():
         if int(str(suspectedDate)) <= 0:
             objDate = datetime(1970, 1, 1)
@@ -61,22 +214,13 @@ def toUTC(suspectedDate):
             # epoch? but seconds/milliseconds/nanoseconds (lookin at you heka)
             epochDivisor = int(str(1) + "0" * (len(str(suspectedDate)) % 10))
             objDate = datetime.fromtimestamp(
-                float(suspectedDate / epochDivisor), LOCAL_TIMEZONE
+                float(int(suspectedDate) / epochDivisor), local_timezone()
             )
     elif type(suspectedDate) is str:
-        # try to parse float or negative number from string:
-        objDate = None
-        try:
-            suspected_float = float(suspectedDate)
-            if suspected_float <= 0:
-                objDate = datetime(1970, 1, 1)
-        except ValueError:
-            pass
-        if objDate is None:
-            objDate = parse(suspectedDate, fuzzy=True)
+        objDate = timestamp_parser.parse(suspectedDate, hint)
     try:
         if objDate.tzinfo is None:
-            objDate = LOCAL_TIMEZONE.localize(objDate)
+            objDate = local_timezone().localize(objDate)
     except AttributeError as e:
         raise ValueError(
             "Date %s which was converted to %s has no "
@@ -94,4 +238,4 @@ def utcnow():
     But if you call now with a UTC timezone
     it returns a non naive datetime
     """
-    return datetime.now(pytz.UTC)
\ No newline at end of file
+    return datetime.now(pytz.UTC)
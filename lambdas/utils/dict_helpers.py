@@ -16,6 +16,28 @@ def merge(dict1, dict2):
     return result
 
 
+def merge_defaults(target, defaults, path=()):
+    """
+    fill in any keys missing from target with the values from defaults,
+    recursing where both sides are dicts. target's values always win.
+
+    Unlike merge this changes target in place and copies nothing,
+    so the default values end up in target as is:
+    pass fresh defaults rather than ones you reuse.
+    Returns the list of paths (tuples of keys) that were filled in.
+    """
+    filled = []
+    for key, value in defaults.items():
+        if key not in target:
+            target[key] = value
+            filled.append(path + (key,))
+        elif isinstance(value, collections.abc.Mapping) and isinstance(
+            target[key], collections.abc.MutableMapping
+        ):
+            filled.extend(merge_defaults(target[key], value, path + (key,)))
+    return filled
+
+
 def find_keys(node, kv):
     """Returns all the keys matching kv in a given node/dict"""
 
@@ -31,6 +53,31 @@ def find_keys(node, kv):
                 yield x
 
 
+def find_keys_multi(node, keys):
+    """
+    find_keys for several keys in one traversal
+    returns a dict of key: list of values, for the keys found,
+    with each list in the order find_keys would yield them
+    """
+    found = {}
+    _find_keys_multi(node, set(keys), found)
+    return found
+
+
+def _find_keys_multi(node, keys, found):
+    if isinstance(node, list):
+        for i in node:
+            _find_keys_multi(i, keys, found)
+    elif isinstance(node, dict):
+        # matches at this level before any nested ones, like find_keys
+        for key in node:
+            if key in keys:
+                found.setdefault(key, []).append(node[key])
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                _find_keys_multi(value, keys, found)
+
+
 def enum_values(node):
     """Returns all the values in a given dict/node"""
 
@@ -93,4 +140,194 @@ def getValueByPath(input_dict, path_string):
     return_data = input_dict
     for chunk in path_string.split("."):
         return_data = return_data.get(chunk, {})
-    return return_data
\ No newline at end of file
+    return return_data
+
+
+class KeyIndex(object):
+    """
+    a flattened index of every key in a dict/list structure
+    built in one traversal: key -> list of (path, value)
+    where path is the tuple of keys/list positions from the root.
+    Values for a key are in the order find_keys would yield them.
+
+    The plugin pipeline shares one index per event (see share/of)
+    so plugins don't each re-walk the event. A plugin that changes
+    the event patches the index with set/remove/move.
+    """
+
+    # indexes shared by the plugin pipeline, by id() of the event they index
+    shared = {}
+
+    def __init__(self, node):
+        self.root = node
+        self.entries = {}
+        self._build(node, ())
+
+    def _build(self, node, path):
+        if isinstance(node, list):
+            for position, item in enumerate(node):
+                self._build(item, path + (position,))
+        elif isinstance(node, dict):
+            # all the keys at this level before any nested ones
+            # to match the order of find_keys
+            for key, value in node.items():
+                self.entries.setdefault(key, []).append((path + (key,), value))
+            for key, value in node.items():
+                self._build(value, path + (key,))
+
+    @classmethod
+    def shared_for(cls, node):
+        """the shared index for this event if the pipeline has one, else None"""
+        index = cls.shared.get(id(node))
+        if index is not None and index.root is node:
+            return index
+        return None
+
+    @classmethod
+    def of(cls, node):
+        """the shared index for this event if the pipeline has one
+        otherwise a new, unshared index
+        """
+        index = cls.shared_for(node)
+        if index is not None:
+            return index
+        return cls(node)
+
+    def share(self):
+        KeyIndex.shared[id(self.root)] = self
+        return self
+
+    def unshare(self):
+        if KeyIndex.shared.get(id(self.root)) is self:
+            del KeyIndex.shared[id(self.root)]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def keys(self):
+        return self.entries.keys()
+
+    def paths(self, key):
+        """all the paths to this key"""
+        return [path for path, value in self.entries.get(key, [])]
+
+    def values(self, key):
+        """all the values for this key, like list(find_keys(node, key))"""
+        return [value for path, value in self.entries.get(key, [])]
+
+    def locate(self, keys):
+        """which of these keys exist and where
+        returns a dict of key: [(path, value)] for the keys present
+        in the order they were asked for
+        """
+        return {key: self.entries[key] for key in keys if key in self.entries}
+
+    def _reorder(self, keys):
+        """
+        put the entries for these keys back in find_keys order
+        after patching appended or rewrote them out of order
+        """
+        # dict id -> {key: position in the dict}, for the dicts we pass through
+        ranks = {}
+
+        def order(entry):
+            # at each level find_keys yields the key itself
+            # before anything nested, then goes through the values in order
+            node = self.root
+            steps = []
+            path = entry[0]
+            for step in path[:-1]:
+                if isinstance(node, dict):
+                    rank = ranks.get(id(node))
+                    if rank is None:
+                        rank = ranks[id(node)] = {k: i for i, k in enumerate(node)}
+                    steps.append(rank.get(step, -1))
+                else:
+                    steps.append(step)
+                node = node[step]
+            steps.append(-1)
+            return steps
+
+        for key in keys:
+            key_entries = self.entries.get(key)
+            if key_entries is not None and len(key_entries) > 1:
+                key_entries.sort(key=order)
+
+    def _subtree_keys(self, node, found):
+        if isinstance(node, list):
+            for item in node:
+                self._subtree_keys(item, found)
+        elif isinstance(node, dict):
+            found.update(node)
+            for value in node.values():
+                if isinstance(value, (dict, list)):
+                    self._subtree_keys(value, found)
+        return found
+
+    def set(self, path, value):
+        """record that value was set at path (a tuple) in the event"""
+        if any(entry_path == path for entry_path, _ in self.entries.get(path[-1], [])):
+            self.remove(path)
+        self.entries.setdefault(path[-1], []).append((path, value))
+        self._build(value, path)
+        self._reorder(self._subtree_keys(value, {path[-1]}))
+
+    def remove(self, path):
+        """record that path and everything below it was removed"""
+        key_entries = self.entries.get(path[-1], [])
+        for position, (entry_path, value) in enumerate(key_entries):
+            if entry_path == path:
+                if not isinstance(value, (dict, list)):
+                    # a plain value, nothing below it to look for
+                    del key_entries[position]
+                    if not key_entries:
+                        del self.entries[path[-1]]
+                    return
+                break
+        depth = len(path)
+        for key in list(self.entries):
+            kept = [
+                (entry_path, value)
+                for entry_path, value in self.entries[key]
+                if entry_path[:depth] != path
+            ]
+            if not kept:
+                del self.entries[key]
+            elif len(kept) != len(self.entries[key]):
+                self.entries[key] = kept
+
+    def nest(self, keys, parent):
+        """record that these top level keys were moved, as is,
+        under the parent path (a tuple). Cheaper than a move per key.
+        """
+        keys = set(keys)
+        if not keys:
+            return
+        nested = []
+        for key, key_entries in self.entries.items():
+            for position, (entry_path, value) in enumerate(key_entries):
+                if entry_path[0] in keys:
+                    key_entries[position] = (parent + entry_path, value)
+                    nested.append(key)
+        self._reorder(set(nested))
+
+    def move(self, old_path, new_path):
+        """record that the value at old_path was moved to new_path"""
+        self.remove(new_path)
+        depth = len(old_path)
+        moved = {new_path[-1]}
+        for key in list(self.entries):
+            key_entries = self.entries[key]
+            for position, (entry_path, value) in enumerate(key_entries):
+                if entry_path[:depth] == old_path:
+                    key_entries[position] = (new_path + entry_path[depth:], value)
+                    moved.add(key)
+        if old_path[-1] != new_path[-1]:
+            # a rename, file the moved entry under its new key
+            old_entries = self.entries.get(old_path[-1], [])
+            for entry in [e for e in old_entries if e[0] == new_path]:
+                old_entries.remove(entry)
+                self.entries.setdefault(new_path[-1], []).append(entry)
+            if old_path[-1] in self.entries and not old_entries:
+                del self.entries[old_path[-1]]
+        self._reorder(moved)
@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+
 class DotDict(dict):
     '''dict.item notation for dict()'s'''
     __getattr__ = dict.__getitem__
@@ -32,4 +35,95 @@ class DotDict(dict):
             key, node = key.split('.', 1)
             return self.__lookup(dct[key], node)
         else:
-            return dct[key]
\ No newline at end of file
+            return dct[key]
+
+
+@lru_cache(maxsize=1024)
+def compile_path(path):
+    """split a dotted path once: 'foo.lol.0' -> ('foo', 'lol', '0')"""
+    return tuple(path.split('.'))
+
+
+class DotView(object):
+    '''
+    dict.item and dotted path notation over a dict, without copying it.
+    Unlike DotDict, changes made through the view are made
+    to the dict it wraps, which is also returned by .unwrap()
+    '''
+    __slots__ = ('_dct',)
+
+    def __init__(self, dct):
+        object.__setattr__(self, '_dct', dct)
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self._dct[key] = value
+
+    def __delattr__(self, key):
+        try:
+            del self._dct[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __getitem__(self, key):
+        value = self._dct[key]
+        if isinstance(value, dict):
+            return DotView(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._dct[key] = value
+
+    def __delitem__(self, key):
+        del self._dct[key]
+
+    def __contains__(self, key):
+        return key in self._dct
+
+    def __iter__(self):
+        return iter(self._dct)
+
+    def __len__(self):
+        return len(self._dct)
+
+    def __eq__(self, other):
+        if isinstance(other, DotView):
+            other = other._dct
+        return self._dct == other
+
+    def __repr__(self):
+        return 'DotView({!r})'.format(self._dct)
+
+    def unwrap(self):
+        return self._dct
+
+    def keys(self):
+        return self._dct.keys()
+
+    def items(self):
+        return self._dct.items()
+
+    def values(self):
+        return self._dct.values()
+
+    def get(self, key, default=None):
+        """get to allow for dot string notation
+        :param str key: Key in dot-notation (e.g. 'foo.lol', 'foo.list.0').
+        :return: the value as stored in the dict (not a view)
+                 or default if no value was found.
+        """
+        node = self._dct
+        try:
+            for chunk in compile_path(key):
+                if isinstance(node, list):
+                    node = node[int(chunk)]
+                else:
+                    node = node[chunk]
+        except (KeyError, IndexError, TypeError, ValueError):
+            return default
+        return node
@@ -0,0 +1,177 @@
+import os
+import random
+import time
+import logging
+from utils.codec import dumps_line
+from utils.metrics import StdoutSink, emf_line
+
+logger = logging.getLogger()
+
+# put_record_batch limits
+# https://docs.aws.amazon.com/firehose/latest/dev/limits.html
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+MAX_RECORD_BYTES = 1000 * 1024
+
+# records per put_record_batch call, up to MAX_BATCH_RECORDS
+FIREHOSE_BATCH_SIZE = min(
+    int(os.environ.get("FIREHOSE_BATCH_SIZE", MAX_BATCH_RECORDS)), MAX_BATCH_RECORDS
+)
+# calls to put a batch before giving up on the records firehose won't take
+FIREHOSE_MAX_ATTEMPTS = int(os.environ.get("FIREHOSE_MAX_ATTEMPTS", 5))
+# retries wait a random time up to this, doubling each attempt (to a cap)
+FIREHOSE_BACKOFF_SECONDS = float(os.environ.get("FIREHOSE_BACKOFF_SECONDS", 0.1))
+FIREHOSE_MAX_BACKOFF_SECONDS = float(os.environ.get("FIREHOSE_MAX_BACKOFF_SECONDS", 5))
+
+_firehose_client = None
+
+
+def firehose_client():
+    """a firehose client for the life of the lambda container"""
+    global _firehose_client
+    if _firehose_client is None:
+        # only imported once we have something to send
+        import boto3
+
+        _firehose_client = boto3.client("firehose")
+    return _firehose_client
+
+
+class FirehoseProducer(object):
+    """
+    records put to a firehose delivery stream in batches as big as
+    the service takes: up to batch_size records and MAX_BATCH_BYTES.
+    Records firehose fails to put (throttling, etc) are retried on
+    their own with jittered exponential backoff; a call that raises
+    retries the whole batch the same way and raises once out of attempts.
+    Records over MAX_RECORD_BYTES are dropped (firehose would refuse
+    the whole batch) and counted.
+    """
+
+    def __init__(
+        self,
+        delivery_stream,
+        client=None,
+        batch_size=FIREHOSE_BATCH_SIZE,
+        max_attempts=FIREHOSE_MAX_ATTEMPTS,
+        backoff_seconds=FIREHOSE_BACKOFF_SECONDS,
+        max_backoff_seconds=FIREHOSE_MAX_BACKOFF_SECONDS,
+        sleep=time.sleep,
+    ):
+        self.delivery_stream = delivery_stream
+        self.client = client
+        self.batch_size = min(batch_size, MAX_BATCH_RECORDS)
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.sleep = sleep
+        # encoded records waiting for a batch to fill
+        self.pending = []
+        self.pending_bytes = 0
+        self.stats = {
+            "records": 0,
+            "bytes": 0,
+            "batches": 0,
+            "retried": 0,
+            "failed": 0,
+            "oversized": 0,
+        }
+
+    def put(self, record):
+        """queue a record, sending a batch if it's full"""
+        data = dumps_line(record)
+        if len(data) > MAX_RECORD_BYTES:
+            logger.error(
+                "dropping a {} byte record, over firehose's {} byte limit".format(
+                    len(data), MAX_RECORD_BYTES
+                )
+            )
+            self.stats["oversized"] += 1
+            return
+        if (
+            len(self.pending) >= self.batch_size
+            or self.pending_bytes + len(data) > MAX_BATCH_BYTES
+        ):
+            self.flush()
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+
+    def put_records(self, records):
+        for record in records:
+            self.put(record)
+
+    def backoff(self, attempt):
+        """full jitter: a random wait up to the exponential backoff"""
+        self.sleep(
+            random.uniform(
+                0,
+                min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt),
+            )
+        )
+
+    def flush(self):
+        """send whatever is queued"""
+        entries = self.pending
+        self.pending = []
+        self.pending_bytes = 0
+        attempt = 0
+        while entries:
+            if self.client is None:
+                self.client = firehose_client()
+            try:
+                response = self.client.put_record_batch(
+                    DeliveryStreamName=self.delivery_stream,
+                    Records=[{"Data": data} for data in entries],
+                )
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    self.stats["failed"] += len(entries)
+                    raise
+                logger.error(
+                    "attempt {}: {} putting {} records to {}".format(
+                        attempt, e, len(entries), self.delivery_stream
+                    )
+                )
+                self.stats["retried"] += len(entries)
+                self.backoff(attempt)
+                continue
+            self.stats["batches"] += 1
+            logger.debug("firehose response is: {}".format(response))
+            if not response.get("FailedPutCount"):
+                self.stats["records"] += len(entries)
+                self.stats["bytes"] += sum(len(data) for data in entries)
+                return
+            # RequestResponses line up with the records we sent
+            failed = []
+            for data, result in zip(entries, response["RequestResponses"]):
+                if result.get("ErrorCode"):
+                    failed.append(data)
+                else:
+                    self.stats["records"] += 1
+                    self.stats["bytes"] += len(data)
+            attempt += 1
+            if attempt >= self.max_attempts:
+                logger.error(
+                    "firehose failed to put {} records to {} after {} attempts".format(
+                        len(failed), self.delivery_stream, attempt
+                    )
+                )
+                self.stats["failed"] += len(failed)
+                return
+            # only the records that failed go again
+            self.stats["retried"] += len(failed)
+            self.backoff(attempt)
+            entries = failed
+
+    def emit(self, dimensions=None, sink=None):
+        """write the stats as an EMF line"""
+        (sink or StdoutSink()).write(
+            emf_line(
+                {
+                    name: (value, "Bytes" if name == "bytes" else "Count")
+                    for name, value in self.stats.items()
+                },
+                dict(dimensions or {}, delivery_stream=self.delivery_stream),
+            )
+        )
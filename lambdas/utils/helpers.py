@@ -2,8 +2,9 @@ import uuid
 import re
 import collections
 import logging
-import netaddr
 from utils.dotdict import DotDict
+from utils import ip_helpers
+from utils.streams import JsonStream, text_chunks
 
 logger = logging.getLogger()
 
@@ -12,25 +13,28 @@ CLOUDTRAIL_FILE_NAME_REGEX = re.compile(
 )
 
 def emit_json_block(stream):
-    ''' take a stream of io.StringIO(blob)
-        iterate it and emit json blocks as they are found
+    ''' take a stream of io.StringIO(blob) (or bytes, i.e. a file)
+        iterate it and emit json blocks as they are found,
+        new line delimited or just concatenated
+        see utils.streams to have them decoded as well
     '''
-    open_brackets = 0
-    block = ''
-    while True:
-        c = stream.read(1)
-        if not c:
-            break
-
-        if c == '{':
-            open_brackets += 1
-        elif c == '}':
-            open_brackets -= 1
-        block += c
-
-        if open_brackets == 0:
-            yield block.strip()
-            block = ''
+    for block in JsonStream(text_chunks(stream)).values(text=True):
+        yield block
+
+def mark_fastpath(metadata, message, source):
+    ''' record in the invocation's metadata that a source specific
+        normalizer set this event's fields, so the generic discovery
+        can skip it, without adding a field to the stored event
+    '''
+    # by id, holding the event so the id can't be reused for another
+    metadata.setdefault("fastpath", {})[id(message)] = (message, source)
+
+def fastpath_source(metadata, message):
+    ''' the source of the normalizer that marked this event, or None '''
+    marked = (metadata or {}).get("fastpath", {}).get(id(message))
+    if marked is not None and marked[0] is message:
+        return marked[1]
+    return None
 
 def short_uuid():
     return str(uuid.uuid4())[0:8]
@@ -42,32 +46,15 @@ def is_cloudtrail(filename):
 def is_ip(ip):
     '''
         validate an ipv4/ipv6 or cidr mask
-        valid_ipv4/6 won't recognize a cidr mask
+        see utils.ip_helpers, cached and exception free
     '''
-    try:
-        # by default netaddr will validate single digits like '0' as 0.0.0.0/32
-        # lets be a bit more precise and support cidr masks
-        # by checking for format chars (. or :)
-        # and using the IPNetwork constructor
-        if ('.' in ip) or (':' in ip):
-            netaddr.IPNetwork(ip)
-            return True
-        else:
-            return False
-    except Exception:
-        return False
+    return ip_helpers.is_ip(ip)
 
 def isIPv4(ip):
-    try:
-        return netaddr.valid_ipv4(ip,flags=1)
-    except:
-        return False
+    return ip_helpers.is_ipv4(ip)
 
 def isIPv6(ip):
-    try:
-        return netaddr.valid_ipv6(ip,flags=1)
-    except:
-        return False
+    return ip_helpers.is_ipv6(ip)
 
 def generate_metadata(context):
     metadata = {
@@ -0,0 +1,194 @@
+import os
+import ipaddress
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger()
+
+# how many distinct address strings to remember
+# logs tend to repeat a small working set of ips
+IP_CACHE_SIZE = int(os.environ.get("IP_CACHE_SIZE", 4096))
+
+# comma separated cidrs we consider ours, tagged 'internal'
+# anything else is 'external'
+DEFAULT_INTERNAL_NETWORKS = (
+    "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,127.0.0.0/8,169.254.0.0/16,"
+    "fc00::/7,fe80::/10,::1/128"
+)
+INTERNAL_NETWORKS = os.environ.get("INTERNAL_NETWORKS", DEFAULT_INTERNAL_NETWORKS)
+
+IPInfo = namedtuple("IPInfo", ["ip", "version", "scope", "tags"])
+
+
+def parse_ip(text):
+    """
+    an ipaddress address (or network for a cidr) for a string
+    or None if it isn't one. Cached, so repeats don't raise/catch again.
+    Like netaddr, we want format chars (. or :) so '0' isn't 0.0.0.0
+    and don't accept ipv6 zone ids (fe80::1%eth0)
+    """
+    if not isinstance(text, str):
+        return None
+    return _parse_ip(text)
+
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_ip(text):
+    if ("." not in text and ":" not in text) or "%" in text:
+        return None
+    try:
+        if "/" in text:
+            return ipaddress.ip_network(text, strict=False)
+        return ipaddress.ip_address(text)
+    except ValueError:
+        return None
+
+
+def is_ip(text):
+    """validate an ipv4/ipv6 address or cidr mask"""
+    return parse_ip(text) is not None
+
+
+def is_ipv4(text):
+    """an ipv4 address, not a cidr"""
+    return isinstance(parse_ip(text), ipaddress.IPv4Address)
+
+
+def is_ipv6(text):
+    """an ipv6 address, not a cidr"""
+    return isinstance(parse_ip(text), ipaddress.IPv6Address)
+
+
+# documentation and benchmarking ranges: nobody's network, but ipaddress
+# counts them as private, so they're checked for first
+RESERVED_NETWORKS = {
+    4: tuple(
+        ipaddress.ip_network(cidr)
+        for cidr in [
+            "192.0.2.0/24",
+            "198.51.100.0/24",
+            "203.0.113.0/24",
+            "198.18.0.0/15",
+        ]
+    ),
+    6: tuple(ipaddress.ip_network(cidr) for cidr in ["2001:db8::/32", "2001:2::/48"]),
+}
+
+
+def is_reserved(ip):
+    """is an ipaddress address or network reserved, not routed or assigned"""
+    if ip.is_reserved or ip.is_unspecified:
+        return True
+    if isinstance(ip, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        return any(ip.subnet_of(network) for network in RESERVED_NETWORKS[ip.version])
+    return any(ip in network for network in RESERVED_NETWORKS[ip.version])
+
+
+def ip_scope(ip):
+    """
+    loopback, link_local, multicast, reserved, private or public
+    for an ipaddress address or network
+    """
+    if ip.is_loopback:
+        return "loopback"
+    if ip.is_link_local:
+        return "link_local"
+    if ip.is_multicast:
+        return "multicast"
+    if is_reserved(ip):
+        return "reserved"
+    if ip.is_private:
+        return "private"
+    if not ip.is_global:
+        return "reserved"
+    return "public"
+
+
+class PrefixTrie(object):
+    """
+    a binary trie of network prefixes to tags
+    lookup walks the address bits once and returns the tags
+    of every prefix containing it, least specific first
+    """
+
+    def __init__(self):
+        # a node is [zero child, one child, tags]
+        self.roots = {4: [None, None, []], 6: [None, None, []]}
+
+    def add(self, cidr, tag):
+        network = ipaddress.ip_network(cidr, strict=False)
+        node = self.roots[network.version]
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        for depth in range(network.prefixlen):
+            bit = (bits >> (width - 1 - depth)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, []]
+            node = node[bit]
+        if tag not in node[2]:
+            node[2].append(tag)
+
+    def lookup(self, ip):
+        """tags for an ipaddress address or network"""
+        if isinstance(ip, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+            bits, depth = int(ip.network_address), ip.prefixlen
+        else:
+            bits, depth = int(ip), ip.max_prefixlen
+        width = ip.max_prefixlen
+        node = self.roots[ip.version]
+        tags = list(node[2])
+        for position in range(depth):
+            node = node[(bits >> (width - 1 - position)) & 1]
+            if node is None:
+                break
+            tags.extend(node[2])
+        return tags
+
+
+class NetworkTags(object):
+    """
+    configurable cidr -> tag tables over a prefix trie
+    with the classification of each address cached
+    """
+
+    def __init__(self, internal_networks=INTERNAL_NETWORKS, cache_size=IP_CACHE_SIZE):
+        self.trie = PrefixTrie()
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+        self.add_table(
+            [cidr.strip() for cidr in internal_networks.split(",") if cidr.strip()],
+            "internal",
+        )
+
+    def add_table(self, cidrs, tag):
+        """tag every address within these cidrs"""
+        for cidr in cidrs:
+            try:
+                self.trie.add(cidr, tag)
+            except ValueError as e:
+                logger.error(f"ignoring invalid network {cidr} for tag {tag}: {e}")
+        self.classify.cache_clear()
+
+    def _classify(self, text):
+        """an IPInfo for a string, or None if it isn't an ip"""
+        ip = parse_ip(text)
+        if ip is None:
+            return None
+        tags = self.trie.lookup(ip)
+        if "internal" not in tags:
+            tags.append("external")
+        return IPInfo(ip, ip.version, ip_scope(ip), tuple(tags))
+
+
+network_tags = NetworkTags()
+
+
+def classify_ip(text):
+    """
+    IPInfo(ip, version, scope, tags) for a string or None if it isn't an ip
+    scope is loopback/link_local/multicast/private/reserved/public
+    tags are from the network tag tables, including internal or external
+    """
+    if not isinstance(text, str):
+        return None
+    return network_tags.classify(text)
@@ -0,0 +1,170 @@
+import os
+import json
+import math
+import time
+import logging
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "defenda_data_lake")
+
+
+class StdoutSink(object):
+    """
+    cloudwatch picks up embedded metric format (EMF) json
+    from lines written to stdout by the lambda
+    """
+
+    def write(self, line):
+        print(line, flush=True)
+
+
+class MemorySink(object):
+    """keep EMF lines in memory, for tests"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def records(self):
+        return [json.loads(line) for line in self.lines]
+
+
+def emf_line(metrics, dimensions, namespace=METRICS_NAMESPACE):
+    """
+    metrics is a dict of name: (value, unit)
+    dimensions is a dict of name: value
+    returns a json string in cloudwatch embedded metric format
+    """
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace,
+                    "Dimensions": [list(dimensions.keys())],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (value, unit) in metrics.items()
+                    ],
+                }
+            ],
+        }
+    }
+    record.update(dimensions)
+    for name, (value, unit) in metrics.items():
+        record[name] = value
+    return json.dumps(record)
+
+
+def percentile(values, percent):
+    """nearest rank percentile of a list of numbers"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(int(math.ceil(percent / 100.0 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+class PluginStats(object):
+    """
+    per invocation plugin call counts, latencies and drops
+    and the optional time budget that stops a pathological plugin
+    from pushing the whole batch toward the lambda timeout
+
+    a plugin's budget is its time_budget_ms attribute, or
+    PLUGIN_TIME_BUDGET_MS from the environment for all plugins.
+    A plugin that blows its budget PLUGIN_BUDGET_STRIKES times
+    is skipped for the rest of the batch.
+    """
+
+    def __init__(self, default_budget_ms=None, strikes=None, sink=None):
+        if default_budget_ms is None and os.environ.get("PLUGIN_TIME_BUDGET_MS"):
+            default_budget_ms = float(os.environ["PLUGIN_TIME_BUDGET_MS"])
+        if strikes is None:
+            strikes = int(os.environ.get("PLUGIN_BUDGET_STRIKES", 3))
+        self.default_budget_ms = default_budget_ms
+        self.strikes = strikes
+        self.sink = sink or StdoutSink()
+        self.calls = {}
+        self.events = {}
+        self.latencies = {}
+        self.drops = {}
+        self.budget_misses = {}
+        self.skipped = set()
+
+    def is_skipped(self, name):
+        return name in self.skipped
+
+    def record(self, name, seconds, events=1, drops=0, budget_ms=None):
+        """record one onMessage (or onBatch of events) call of a plugin"""
+        milliseconds = seconds * 1000
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.events[name] = self.events.get(name, 0) + events
+        self.latencies.setdefault(name, []).append(milliseconds)
+        if drops:
+            self.drops[name] = self.drops.get(name, 0) + drops
+
+        if budget_ms is None:
+            budget_ms = self.default_budget_ms
+        if budget_ms is not None and events and milliseconds / events > budget_ms:
+            self.budget_misses[name] = self.budget_misses.get(name, 0) + 1
+            if self.budget_misses[name] >= self.strikes and name not in self.skipped:
+                logger.warning(
+                    "plugin {0} exceeded its {1}ms budget {2} times, "
+                    "skipping it for the rest of the batch".format(
+                        name, budget_ms, self.budget_misses[name]
+                    )
+                )
+                self.skipped.add(name)
+
+    def merge(self, other):
+        """fold in the stats from another PluginStats, i.e. a worker process"""
+        for name, latencies in other.latencies.items():
+            self.calls[name] = self.calls.get(name, 0) + other.calls[name]
+            self.events[name] = self.events.get(name, 0) + other.events[name]
+            self.latencies.setdefault(name, []).extend(latencies)
+        for name, drops in other.drops.items():
+            self.drops[name] = self.drops.get(name, 0) + drops
+        for name, misses in other.budget_misses.items():
+            self.budget_misses[name] = self.budget_misses.get(name, 0) + misses
+        self.skipped.update(other.skipped)
+
+    def summary(self):
+        """dict of plugin name: metrics"""
+        result = {}
+        for name, latencies in self.latencies.items():
+            result[name] = {
+                "calls": self.calls[name],
+                "events": self.events[name],
+                "latency_total": sum(latencies),
+                "latency_p99": percentile(latencies, 99),
+                "drops": self.drops.get(name, 0),
+                "budget_misses": self.budget_misses.get(name, 0),
+                "skipped": int(name in self.skipped),
+            }
+        return result
+
+    def emit(self, dimensions=None):
+        """write one EMF line per plugin to the sink"""
+        dimensions = dimensions or {}
+        for name, plugin_metrics in self.summary().items():
+            self.sink.write(
+                emf_line(
+                    {
+                        "calls": (plugin_metrics["calls"], "Count"),
+                        "events": (plugin_metrics["events"], "Count"),
+                        "latency_total": (
+                            plugin_metrics["latency_total"],
+                            "Milliseconds",
+                        ),
+                        "latency_p99": (plugin_metrics["latency_p99"], "Milliseconds"),
+                        "drops": (plugin_metrics["drops"], "Count"),
+                        "budget_misses": (plugin_metrics["budget_misses"], "Count"),
+                        "skipped": (plugin_metrics["skipped"], "Count"),
+                    },
+                    dict(dimensions, plugin=name),
+                )
+            )
@@ -0,0 +1,189 @@
+import os
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger()
+
+# distinct event shapes to keep plans for, 0 turns plans off
+PLAN_CACHE_SIZE = int(os.environ.get("PLAN_CACHE_SIZE", 1024))
+
+
+def event_shape(node):
+    """
+    a hashable fingerprint of the key structure of an event:
+    the keys in order, list lengths and the type of every value
+    (not the values themselves) plus the category and tags
+    since plugins can register for those.
+    Events from the same source usually share a shape.
+    """
+    shape = _shape(node)
+    if isinstance(node, dict):
+        category = node.get("category")
+        tags = node.get("tags")
+        return (
+            shape,
+            category if isinstance(category, str) else None,
+            (
+                tuple(tag for tag in tags if isinstance(tag, str))
+                if isinstance(tags, list)
+                else None
+            ),
+        )
+    return (shape, None, None)
+
+
+def _shape(node):
+    if isinstance(node, dict):
+        return tuple([(key, _shape(value)) for key, value in node.items()])
+    if isinstance(node, list):
+        return (list, tuple([_shape(item) for item in node]))
+    return type(node)
+
+
+def value_at(node, path):
+    """the value at path (a tuple of keys/list positions), KeyError if it isn't there"""
+    try:
+        for key in path:
+            node = node[key]
+    except (KeyError, IndexError, TypeError):
+        raise KeyError(path)
+    return node
+
+
+class ExecutionPlan(object):
+    """
+    what the plugin pipeline did with an event: the keyed plugins
+    that matched it (and on which token) and whatever the plugins
+    resolved about it (field paths etc, see remember/recall).
+
+    The first event of a shape records a plan, later events of the
+    same shape replay it: the dispatcher skips matching and building
+    the KeyIndex and plugins recall the paths they found last time
+    instead of searching the event. Anything that doesn't hold for
+    the event being replayed invalidates the plan, the event carries on
+    with full discovery from there and the plan is dropped from the cache.
+    """
+
+    __slots__ = ("shape", "recorded", "steps", "fields", "tokens", "valid", "root")
+
+    # plans being recorded/replayed by the pipeline, by id() of their event
+    active = {}
+
+    def __init__(self, shape, recorded=None):
+        self.shape = shape
+        # the cached plan we're replaying, None when recording
+        self.recorded = recorded
+        # keyed plugin position -> (token, path) it matched on
+        # path is None for a tag/category token
+        self.steps = {}
+        # plugin -> what it resolved
+        self.fields = {}
+        # the registration tokens present once the pipeline was done
+        self.tokens = None
+        self.valid = True
+        self.root = None
+
+    @property
+    def replaying(self):
+        return self.recorded is not None and self.valid
+
+    @property
+    def recording(self):
+        return self.recorded is None and self.valid
+
+    @classmethod
+    def active_for(cls, node):
+        """the plan for this event if the pipeline has one, else None"""
+        plan = cls.active.get(id(node))
+        if plan is not None and plan.root is node:
+            return plan
+        return None
+
+    def attach(self, node):
+        """make this the active plan for node (which may be a new event object)"""
+        self.detach()
+        self.root = node
+        ExecutionPlan.active[id(node)] = self
+        return self
+
+    def detach(self):
+        if self.root is not None and ExecutionPlan.active.get(id(self.root)) is self:
+            del ExecutionPlan.active[id(self.root)]
+        self.root = None
+
+    def invalidate(self):
+        """the plan doesn't hold for this event, stop replaying/recording it"""
+        self.valid = False
+
+    def remember(self, name, value):
+        """record what a plugin resolved for events of this shape"""
+        if self.recording:
+            self.fields[name] = value
+
+    def recall(self, name, default=None):
+        """what a plugin resolved for the recorded event of this shape"""
+        if not self.replaying:
+            return default
+        return self.recorded.fields.get(name, default)
+
+
+class PlanCache(object):
+    """a bounded, least recently used, cache of execution plans by event shape"""
+
+    def __init__(self, size=PLAN_CACHE_SIZE):
+        self.size = size
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.plans)
+
+    def plan_for(self, event):
+        """
+        a new ExecutionPlan for the event, replaying the cached plan
+        for its shape if we have one, otherwise recording.
+        None if plans are turned off or the event can't be fingerprinted
+        """
+        if not self.size:
+            return None
+        try:
+            shape = event_shape(event)
+            recorded = self.plans.get(shape)
+        except (TypeError, RecursionError):
+            return None
+        if recorded is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.plans.move_to_end(shape)
+        return ExecutionPlan(shape, recorded)
+
+    def finish(self, plan, dropped=False):
+        """keep a recorded plan, or drop a replayed one that didn't hold"""
+        plan.detach()
+        if plan.recorded is not None:
+            if not plan.valid:
+                self.invalidations += 1
+                self.plans.pop(plan.shape, None)
+            return
+        if plan.valid and not dropped:
+            self.plans[plan.shape] = plan
+            self.plans.move_to_end(plan.shape)
+            while len(self.plans) > self.size:
+                self.plans.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        self.plans.clear()
+
+    def summary(self):
+        return {
+            "plans": len(self.plans),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
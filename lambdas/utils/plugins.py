@@ -1,20 +1,39 @@
-import pynsive
+import heapq
 import os
+import time
+import importlib
 from operator import itemgetter
 import json
 import logging
-from utils.dict_helpers import enum_keys
+from utils.dict_helpers import enum_keys, KeyIndex
+from utils.plans import PlanCache, value_at
 
 logger = logging.getLogger()
 
+# registered plugins by directory name, built once per lambda container
+# and reused by every warm invocation
+PLUGIN_REGISTRY = {}
+# seconds spent scanning/importing/instantiating each registry
+# i.e. the plugin share of our cold start
+REGISTRY_BUILD_TIMES = {}
+# the plugin directories, relative to the lambda task root
+PLUGIN_DIRECTORIES = ["normalization_plugins", "enrichment_plugins"]
+# what's in them, written by generate_lambda_zip.py when packaging
+# so a cold start doesn't have to scan for plugins
+PLUGIN_MANIFEST = os.environ.get("PLUGIN_MANIFEST", "plugin_manifest.json")
 
-def event_criteria_values(an_event):
+
+def event_criteria_values(an_event, index=None):
     """set up the list of event values to use when comparing plugins
     to this event to see if they should fire
     target values are the .keys() of the dict and the values of the 'category' and 'tags' fields
     where category is a key/value and tags is a list of values.
+    index is an optional KeyIndex of the event to take the keys from
     """
-    criteria_values = [e for e in enum_keys(an_event)]
+    if index is not None:
+        criteria_values = list(index.keys())
+    else:
+        criteria_values = [e for e in enum_keys(an_event)]
     if (
         "tags" in criteria_values
         and isinstance(an_event.get("tags"), list)
@@ -28,83 +47,676 @@ def event_criteria_values(an_event):
     return criteria_values
 
 
-def register_plugins(directory_name):
+def event_value_tokens(an_event):
+    """the tags and category of an event, the values plugins can register for"""
+    tokens = set()
+    if isinstance(an_event.get("tags"), list):
+        tokens.update(tag for tag in an_event["tags"] if isinstance(tag, str))
+    if isinstance(an_event.get("category"), str):
+        tokens.add(an_event["category"])
+    return tokens
+
+
+def _present_keys(node, tokens, found):
+    if isinstance(node, dict):
+        found.update(tokens.intersection(node))
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                _present_keys(value, tokens, found)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, (dict, list)):
+                _present_keys(item, tokens, found)
+
+
+class PluginDispatcher(list):
+    """
+    a compiled list of (plugin, registration, priority) tuples
+    sorted once by priority, with the wildcard plugins split out
+    and an inverted index of registration token -> plugin positions
+    so an event's criteria tokens can be matched against every
+    plugin with a handful of dict lookups.
+
+    It also keeps a PlanCache (utils/plans.py) of what happened to
+    the first event of each shape, so later events of that shape
+    can skip the matching and the KeyIndex (see ExecutionPlan)
+    """
+
+    def __init__(self, plugins=()):
+        # sorted is stable, plugins of equal priority keep their order
+        super().__init__(sorted(plugins, key=itemgetter(2), reverse=False))
+        self.names = []
+        self.wildcard = []
+        self.batched = []
+        self.budgets = []
+        self.indexed = []
+        self.planned = []
+        self.tokens = []
+        self.index = {}
+        self.plans = PlanCache()
+        for position, (plugin, registration, priority) in enumerate(self):
+            self.names.append(plugin.__module__.replace("plugins.", ""))
+            self.batched.append(callable(getattr(plugin, "onBatch", None)))
+            self.budgets.append(getattr(plugin, "time_budget_ms", None))
+            # plugins that read the shared KeyIndex and patch it
+            # for any change they make to the event
+            self.indexed.append(getattr(plugin, "uses_key_index", False) is True)
+            # plugins that recall what they found from an ExecutionPlan
+            # so don't need the KeyIndex when it's replayed
+            self.planned.append(getattr(plugin, "uses_plans", False) is True)
+            self.wildcard.append(isinstance(registration, list) and "*" in registration)
+            self.tokens.append([])
+            if isinstance(registration, list) and not self.wildcard[position]:
+                for token in registration:
+                    self.index.setdefault(token.lower(), set()).add(position)
+                    self.tokens[position].append(token.lower())
+        self.index_tokens = frozenset(self.index)
+        # the plugins every event visits, and the last one it might
+        # have to be matched for
+        self.wildcards = [
+            position for position in range(len(self)) if self.wildcard[position]
+        ]
+        self.last_keyed = max(
+            [position for position in range(len(self)) if self.tokens[position]],
+            default=-1,
+        )
+
+    def matching(self, event_tokens):
+        """return the positions of keyed plugins registered
+        for any of the given event tokens
+        """
+        matched = set()
+        if len(event_tokens) > len(self.index):
+            for token, positions in self.index.items():
+                if token in event_tokens:
+                    matched.update(positions)
+        else:
+            for token in event_tokens:
+                if token in self.index:
+                    matched.update(self.index[token])
+        return matched
+
+    def call(self, position, anevent, metadata, stats=None):
+        """onMessage of the plugin at position, timed if we have stats"""
+        if stats is None:
+            return self[position][0].onMessage(anevent, metadata)
+        start = time.perf_counter()
+        (anevent, metadata) = self[position][0].onMessage(anevent, metadata)
+        stats.record(
+            self.names[position],
+            time.perf_counter() - start,
+            drops=int(anevent is None),
+            budget_ms=self.budgets[position],
+        )
+        return (anevent, metadata)
+
+    def call_batch(self, position, events, metadata, stats=None):
+        """onBatch of the plugin at position, timed if we have stats"""
+        start = time.perf_counter()
+        (results, metadata) = self[position][0].onBatch(events, metadata)
+        if results is None or len(results) != len(events):
+            raise ValueError(
+                "plugin {0} onBatch returned {1} events for {2}".format(
+                    self.names[position],
+                    "no" if results is None else len(results),
+                    len(events),
+                )
+            )
+        if stats is not None:
+            stats.record(
+                self.names[position],
+                time.perf_counter() - start,
+                events=len(events),
+                drops=sum(1 for result in results if result is None),
+                budget_ms=self.budgets[position],
+            )
+        return (results, metadata)
+
+    def event_index(self, anevent, index):
+        """the current shared KeyIndex for the event, building it if need be"""
+        if index is None or index.root is not anevent:
+            if index is not None:
+                index.unshare()
+            index = KeyIndex(anevent).share()
+        return index
+
+    def kept_index(self, position, anevent, index):
+        """after a plugin has run, the index if it's still valid, else None"""
+        if index is None:
+            return None
+        if self.indexed[position] and anevent is index.root:
+            return index
+        # the plugin may have changed anything, start over
+        index.unshare()
+        return None
+
+    def matched_token(self, position, anevent, index):
+        """which token the keyed plugin at position matched the event on
+        as (token, path to the key) or (token, None) for a tag/category
+        """
+        values = event_value_tokens(anevent)
+        for token in self.tokens[position]:
+            if token in values:
+                return (token, None)
+            if token in index:
+                return (token, index.paths(token)[0])
+        return None
+
+    def plan_send(self, position, anevent, plan, present=None):
+        """
+        replaying a plan, does the keyed plugin at position get the event:
+        only if it matched the recorded event, checking the token
+        it matched on is still there and that no tag/category (or key,
+        given present) now matches a plugin that didn't.
+        None if the plan doesn't hold.
+        present is the registration tokens in the event (see present_tokens)
+        once a plugin may have changed it from the shape it was planned for
+        """
+        step = plan.recorded.steps.get(position)
+        if step is None:
+            if present is None:
+                present = event_value_tokens(anevent)
+            if any(token in present for token in self.tokens[position]):
+                return None
+            return False
+        token, path = step
+        if path is None:
+            return True if token in event_value_tokens(anevent) else None
+        try:
+            value_at(anevent, path)
+        except KeyError:
+            return None
+        return True
+
+    def present_tokens(self, anevent):
+        """the registration tokens in an event, keys or tags/category"""
+        found = set()
+        _present_keys(anevent, self.index_tokens, found)
+        found.update(event_value_tokens(anevent).intersection(self.index_tokens))
+        return found
+
+    def finish_plan(self, plan, anevent):
+        """cache a plan we recorded, drop one that didn't hold on replay"""
+        if anevent is not None and plan.valid:
+            tokens = self.present_tokens(anevent)
+            if plan.recorded is None:
+                plan.tokens = tokens
+            elif tokens != plan.recorded.tokens:
+                # a plugin changed this event differently
+                # the plan's list of plugins may not hold
+                plan.invalidate()
+        self.plans.finish(plan, dropped=anevent is None)
+
+    def dispatch(self, anevent, metadata, stats=None):
+        """send the event through the plugins in priority order
+        see send_event_to_plugins
+        """
+        # the plan for the event's shape, replayed or recorded
+        plan = self.plans.plan_for(anevent)
+        if plan is not None:
+            plan.attach(anevent)
+        route = Route(self, anevent, plan)
+        try:
+            while True:
+                try:
+                    position = route.next()
+                    if position is None:
+                        break
+                    send = route.send(position, stats)
+                except TypeError:
+                    logger.error(
+                        "TypeError on set intersection for dict {0}".format(anevent)
+                    )
+                    if plan is not None:
+                        plan.invalidate()
+                    return (anevent, metadata)
+                if send:
+                    route.prepare(position)
+                    (anevent, metadata) = self.call(position, anevent, metadata, stats)
+                    if anevent is None:
+                        # plug-in is signalling to drop this message
+                        # early exit
+                        return (anevent, metadata)
+                    route.ran(position, anevent)
+        finally:
+            route.close()
+            if plan is not None:
+                self.finish_plan(plan, anevent)
+        # Tag all events with what plugins ran on it
+        if "plugins" in anevent:
+            anevent["plugins"] = anevent["plugins"] + route.executed
+        else:
+            anevent["plugins"] = route.executed
+
+        return (anevent, metadata)
+
+    def dispatch_batch(self, events, metadata, stats=None):
+        """send a list of events through the plugins in priority order
+        see send_events_to_plugins
+        """
+        events = list(events)
+        # the plan for each event's shape, replayed or recorded
+        plans = [self.plans.plan_for(anevent) for anevent in events]
+        for anevent, plan in zip(events, plans):
+            if plan is not None:
+                plan.attach(anevent)
+        routes = [Route(self, anevent, plan) for anevent, plan in zip(events, plans)]
+        # events that errored on matching, returned as-is and untagged
+        untagged = set()
+        # plugin position -> events waiting on it, and a heap of those positions
+        # so plugins are visited in priority order, only for the events they get
+        waiting = {}
+        positions = []
+
+        def wait(i):
+            """queue event i for the next plugin on its route"""
+            try:
+                position = routes[i].next()
+            except TypeError:
+                logger.error(
+                    "TypeError on set intersection for dict {0}".format(events[i])
+                )
+                if plans[i] is not None:
+                    plans[i].invalidate()
+                untagged.add(i)
+                return
+            if position is None:
+                return
+            if position not in waiting:
+                waiting[position] = []
+                heapq.heappush(positions, position)
+            waiting[position].append(i)
+
+        try:
+            for i in range(len(events)):
+                wait(i)
+            while positions:
+                position = heapq.heappop(positions)
+                targets = []
+                # in batch order
+                for i in sorted(waiting.pop(position)):
+                    try:
+                        send = routes[i].send(position, stats)
+                    except TypeError:
+                        logger.error(
+                            "TypeError on set intersection for dict {0}".format(
+                                events[i]
+                            )
+                        )
+                        if plans[i] is not None:
+                            plans[i].invalidate()
+                        untagged.add(i)
+                        continue
+                    if send:
+                        targets.append(i)
+                    else:
+                        wait(i)
+                if not targets:
+                    continue
+
+                for i in targets:
+                    routes[i].prepare(position)
+                ran = targets
+                if self.batched[position]:
+                    (results, metadata) = self.call_batch(
+                        position, [events[i] for i in targets], metadata, stats
+                    )
+                    for i, result in zip(targets, results):
+                        events[i] = result
+                else:
+                    for count, i in enumerate(targets):
+                        if stats is not None and stats.is_skipped(self.names[position]):
+                            # blew its time budget, the rest of the batch goes without
+                            for skipped in targets[count:]:
+                                if plans[skipped] is not None:
+                                    plans[skipped].invalidate()
+                                wait(skipped)
+                            ran = targets[:count]
+                            break
+                        (events[i], metadata) = self.call(
+                            position, events[i], metadata, stats
+                        )
+
+                for i in ran:
+                    if events[i] is None:
+                        # plug-in is signalling to drop this message
+                        routes[i].close()
+                    else:
+                        routes[i].ran(position, events[i])
+                        wait(i)
+        finally:
+            for route in routes:
+                route.close()
+            for anevent, plan in zip(events, plans):
+                if plan is not None:
+                    self.finish_plan(plan, anevent)
+
+        # Tag all events with what plugins ran on it
+        for i, anevent in enumerate(events):
+            if anevent is None or i in untagged:
+                continue
+            if "plugins" in anevent:
+                anevent["plugins"] = anevent["plugins"] + routes[i].executed
+            else:
+                anevent["plugins"] = routes[i].executed
+
+        return (events, metadata)
+
+
+class Route(object):
+    """
+    one event's way through a PluginDispatcher: a heap of the plugin
+    positions still to visit. Only the wildcard plugins and the keyed
+    plugins that match the event (as it is after the last plugin ran,
+    or as its ExecutionPlan recorded) are queued, so the cost per event
+    follows the plugins that run rather than how many are registered.
+    """
+
+    __slots__ = (
+        "dispatcher",
+        "event",
+        "plan",
+        "index",
+        "matched",
+        "pending",
+        "queued",
+        "position",
+        "stale",
+        "changed",
+        "present",
+        "executed",
+    )
+
+    def __init__(self, dispatcher, event, plan=None):
+        self.dispatcher = dispatcher
+        self.event = event
+        self.plan = plan
+        # one KeyIndex for the event shared by the plugins and the matching
+        # until a plugin changes the event without patching it
+        self.index = None
+        # positions of keyed plugins matching the event as it currently is
+        # computed on demand and reset whenever a plugin runs
+        # since the plugin may have changed the keys/tags/category
+        self.matched = None
+        # a sorted list is a heap
+        self.pending = list(dispatcher.wildcards)
+        self.queued = set(self.pending)
+        self.position = -1
+        # the keyed plugins to queue need working out again
+        self.stale = True
+        # once a plugin has run the event may have keys its shape didn't
+        # and present is the registration tokens it has (see plan_send)
+        self.changed = False
+        self.present = None
+        self.executed = []
+
+    def queue(self, positions):
+        for position in positions:
+            if position > self.position and position not in self.queued:
+                heapq.heappush(self.pending, position)
+                self.queued.add(position)
+
+    def match(self):
+        """
+        the keyed plugins matching the event as it is, queueing them
+        raises TypeError if the event's values can't be matched
+        """
+        if self.matched is None:
+            self.index = self.dispatcher.event_index(self.event, self.index)
+            self.matched = self.dispatcher.matching(
+                set(event_criteria_values(self.event, self.index))
+            )
+            self.queue(self.matched)
+        return self.matched
+
+    def next(self):
+        """the position of the next plugin to visit, None when there isn't one"""
+        dispatcher = self.dispatcher
+        plan = self.plan
+        if self.stale and self.position < dispatcher.last_keyed:
+            if plan is not None and plan.replaying:
+                self.queue(plan.recorded.steps)
+                if self.changed:
+                    # a key/tag a plugin added may match a plugin the plan didn't
+                    # plan_send decides if the plan holds
+                    self.present = dispatcher.present_tokens(self.event)
+                    self.queue(dispatcher.matching(self.present))
+            else:
+                self.match()
+        self.stale = False
+        if not self.pending:
+            return None
+        self.position = heapq.heappop(self.pending)
+        self.queued.discard(self.position)
+        return self.position
+
+    def send(self, position, stats=None):
+        """does the plugin at position get the event"""
+        dispatcher = self.dispatcher
+        plan = self.plan
+        if dispatcher.wildcard[position]:
+            # plugin wants to see all events
+            send = True
+        else:
+            send = None
+            if plan is not None and plan.replaying:
+                send = dispatcher.plan_send(
+                    position, self.event, plan, self.present if self.changed else None
+                )
+                if send is None:
+                    # carry on with matching from here
+                    plan.invalidate()
+            if send is None:
+                send = position in self.match()
+                if send and plan is not None and plan.recording:
+                    plan.steps[position] = dispatcher.matched_token(
+                        position, self.event, self.index
+                    )
+        if send and stats is not None and stats.is_skipped(dispatcher.names[position]):
+            # blown its time budget too often
+            if plan is not None and plan.recording and not dispatcher.wildcard[position]:
+                # we don't record it as matching, the plan wouldn't hold
+                plan.invalidate()
+            send = False
+        return send
+
+    def prepare(self, position):
+        """ready the shared KeyIndex for the plugin at position if it reads it"""
+        plan = self.plan
+        if self.dispatcher.indexed[position] and not (
+            self.dispatcher.planned[position] and plan is not None and plan.replaying
+        ):
+            self.index = self.dispatcher.event_index(self.event, self.index)
+
+    def ran(self, position, event):
+        """the plugin at position ran and returned event"""
+        self.executed.append(self.dispatcher.names[position])
+        self.event = event
+        self.matched = None
+        self.stale = True
+        self.changed = True
+        self.present = None
+        self.index = self.dispatcher.kept_index(position, event, self.index)
+        if self.plan is not None and self.plan.root is not event:
+            self.plan.attach(event)
+
+    def close(self):
+        if self.index is not None:
+            self.index.unshare()
+            self.index = None
+
+def scan_plugins(directory_name):
+    """
+    import every module in a plugin directory (in name order)
+    returns [(module name, plugin instance)] for those with a message class
+    """
+    # only needed to scan a directory, not on import
+    import pynsive
+
+    plugins = []
+    for mname in sorted(pynsive.list_modules(directory_name)):
+        module = pynsive.import_module(mname)
+        if not module:
+            raise ImportError("Unable to load module {}".format(mname))
+        if "message" in dir(module):
+            plugins.append((mname, module.message()))
+    return plugins
+
+
+def manifest_entry(mname, plugin):
+    """what the plugin manifest records about a plugin"""
+    return {
+        "module": mname,
+        "registration": plugin.registration,
+        "priority": getattr(plugin, "priority", 100),
+        "batch": callable(getattr(plugin, "onBatch", None)),
+    }
+
+
+def build_manifest(directories=PLUGIN_DIRECTORIES):
+    """
+    scan the plugin directories for the plugin manifest:
+    directory name -> [manifest_entry] of the plugins it registers
+    """
+    manifest = {}
+    for directory_name in directories:
+        manifest[directory_name] = [
+            manifest_entry(mname, plugin)
+            for mname, plugin in scan_plugins(directory_name)
+            if isinstance(plugin.registration, list)
+        ]
+    return manifest
+
+
+def write_manifest(path=PLUGIN_MANIFEST, directories=PLUGIN_DIRECTORIES):
+    """write the plugin manifest, run from the lambda task root when packaging"""
+    manifest = build_manifest(directories)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest
+
+
+def load_manifest(path=PLUGIN_MANIFEST):
+    """the plugin manifest, empty if there isn't one"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def register_plugins(directory_name, manifest=None):
     """
-    take a directory name, scan it for python modules
-    and register them (module,registration criteria, priority)
+    take a directory name and register its plugins
+    (module,registration criteria, priority)
+    from its entry in the plugin manifest if there is one
+    else by scanning it for python modules
+    returns a PluginDispatcher compiled from the registrations
     """
     pluginList = list()  # tuple of module,registration dict,priority
     if os.path.exists(directory_name):
-        modules = pynsive.list_modules(directory_name)
-        for mname in modules:
-            module = pynsive.import_module(mname)
-            if not module:
-                raise ImportError("Unable to load module {}".format(mname))
-            else:
-                if "message" in dir(module):
-                    mclass = module.message()
-                    mreg = mclass.registration
-                    if "priority" in dir(mclass):
-                        mpriority = mclass.priority
-                    else:
-                        mpriority = 100
-                    if isinstance(mreg, list):
-                        logger.info(
-                            "[*] plugin {0} registered to receive messages with {1}".format(
-                                mname, mreg
-                            )
+        entries = (manifest or {}).get(directory_name)
+        if entries is not None:
+            # no scanning or introspection, just import what was found at packaging
+            plugins = []
+            for entry in entries:
+                mclass = importlib.import_module(entry["module"]).message()
+                if manifest_entry(entry["module"], mclass) != entry:
+                    # i.e. a registration that depends on the environment
+                    logger.warning(
+                        "plugin {0} doesn't match the plugin manifest".format(
+                            entry["module"]
                         )
-                        pluginList.append((mclass, mreg, mpriority))
-    return pluginList
+                    )
+                    entry = manifest_entry(entry["module"], mclass)
+                plugins.append(
+                    (entry["module"], mclass, entry["registration"], entry["priority"])
+                )
+        else:
+            plugins = [
+                (mname, plugin, plugin.registration, getattr(plugin, "priority", 100))
+                for mname, plugin in scan_plugins(directory_name)
+            ]
+        for mname, mclass, mreg, mpriority in plugins:
+            if isinstance(mreg, list):
+                logger.info(
+                    "[*] plugin {0} registered to receive messages with {1}".format(
+                        mname, mreg
+                    )
+                )
+                pluginList.append((mclass, mreg, mpriority))
+    return PluginDispatcher(pluginList)
+
+
+def get_plugins(directory_name):
+    """
+    return the registered plugins for a directory
+    loading them (from the plugin manifest if there is one)
+    only the first time it's asked for in this container
+    set PLUGIN_RESCAN=true in the environment to scan the directory
+    on every call, ignoring the manifest
+    """
+    rescan = os.environ.get("PLUGIN_RESCAN", "false").lower() == "true"
+    if rescan or directory_name not in PLUGIN_REGISTRY:
+        start = time.perf_counter()
+        manifest = None if rescan else load_manifest()
+        PLUGIN_REGISTRY[directory_name] = register_plugins(directory_name, manifest)
+        REGISTRY_BUILD_TIMES[directory_name] = time.perf_counter() - start
+        logger.info(
+            "plugin registry {0} built in {1:.6f} seconds".format(
+                directory_name, REGISTRY_BUILD_TIMES[directory_name]
+            )
+        )
+    return PLUGIN_REGISTRY[directory_name]
 
 
-def send_event_to_plugins(anevent, metadata, pluginList):
+def invalidate_plugins(directory_name=None):
+    """
+    drop the cached registry for a directory (or all of them)
+    so the next get_plugins call rescans
+    """
+    if directory_name is None:
+        PLUGIN_REGISTRY.clear()
+        REGISTRY_BUILD_TIMES.clear()
+    else:
+        PLUGIN_REGISTRY.pop(directory_name, None)
+        REGISTRY_BUILD_TIMES.pop(directory_name, None)
+
+
+def send_event_to_plugins(anevent, metadata, pluginList, stats=None):
     """compare the event to the plugin registrations.
     plugins register with a list of keys or values
     or values they want to match on
     this function compares that registration list
     to the current event and sends the event to plugins
     in order
+    pluginList is ideally the PluginDispatcher from register_plugins,
+    a plain list of (module, criteria, priority) is compiled on the fly
+    stats is an optional utils.metrics.PluginStats to time the plugins
+    and enforce their time budgets
     """
     if not isinstance(anevent, dict):
         raise TypeError("event is type {0}, should be a dict".format(type(anevent)))
 
-    # expecting tuple of module, criteria, priority in pluginList
-    # sort the plugin list by priority
-    executed_plugins = []
-    for plugin in sorted(pluginList, key=itemgetter(2), reverse=False):
-        # assume we don't run this event through the plugin
-        send = False
-        if isinstance(plugin[1], list):
-            try:
-                if "*" in plugin[1]:
-                    # plugin wants to see all events, early exit the check
-                    send = True
-                else:
-                    # intersect the plugin field names
-                    # with the fields in the event
-                    # if they match, the plugin wants to see this event
-                    plugin_matching_keys = set([item.lower() for item in plugin[1]])
-                    event_tokens = [e for e in event_criteria_values(anevent)]
-                    if plugin_matching_keys.intersection(event_tokens):
-                        send = True
-            except TypeError:
-                logger.error(
-                    "TypeError on set intersection for dict {0}".format(anevent)
-                )
-                return (anevent, metadata)
-        if send:
-            (anevent, metadata) = plugin[0].onMessage(anevent, metadata)
-            if anevent is None:
-                # plug-in is signalling to drop this message
-                # early exit
-                return (anevent, metadata)
-            plugin_name = plugin[0].__module__.replace("plugins.", "")
-            executed_plugins.append(plugin_name)
-    # Tag all events with what plugins ran on it
-    if "plugins" in anevent:
-        anevent["plugins"] = anevent["plugins"] + executed_plugins
-    else:
-        anevent["plugins"] = executed_plugins
+    if not isinstance(pluginList, PluginDispatcher):
+        pluginList = PluginDispatcher(pluginList)
+    return pluginList.dispatch(anevent, metadata, stats)
+
+
+def send_events_to_plugins(events, metadata, pluginList, stats=None):
+    """the batch version of send_event_to_plugins
+    each plugin sees the events matching its registration in turn,
+    plugins with an onBatch(messages, metadata) method get all of them
+    in one call and return (messages, metadata) with the list in the same
+    order, everyone else gets onMessage once per event
+    returns (events, metadata), dropped events are None in the list
+    """
+    for anevent in events:
+        if not isinstance(anevent, dict):
+            raise TypeError(
+                "event is type {0}, should be a dict".format(type(anevent))
+            )
 
-    return (anevent, metadata)
+    if not isinstance(pluginList, PluginDispatcher):
+        pluginList = PluginDispatcher(pluginList)
+    return pluginList.dispatch_batch(events, metadata, stats)
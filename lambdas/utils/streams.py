@@ -0,0 +1,202 @@
+import codecs
+import json
+import os
+import re
+import zlib
+import logging
+
+logger = logging.getLogger()
+
+# bytes read from a stream (i.e. an s3 object's body) at a time
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", 64 * 1024))
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# the rest of the buffer is what a number we've decoded could go on with
+# (1.5 of 1.5e3)
+NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*\Z")
+
+
+def byte_chunks(body, gzipped=False, chunk_bytes=STREAM_CHUNK_BYTES):
+    """
+    read a file like body chunk_bytes at a time
+    gunzipping (every member of) it as we go if gzipped
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    while True:
+        chunk = body.read(chunk_bytes)
+        if not chunk:
+            break
+        if decompressor is None:
+            yield chunk
+            continue
+        while chunk:
+            yield decompressor.decompress(chunk)
+            if not decompressor.eof:
+                break
+            # concatenated gzip members, start on the next one
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+def text_chunks(body, gzipped=False, chunk_bytes=STREAM_CHUNK_BYTES):
+    """
+    byte_chunks decoded as utf-8, characters split across chunks and all
+    (a text stream's chunks are passed through as they are)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in byte_chunks(body, gzipped, chunk_bytes):
+        text = chunk if isinstance(chunk, str) else decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+class JsonStream(object):
+    """
+    json values decoded one at a time from an iterable of text chunks
+    holding only what hasn't been decoded yet (and the value being decoded)
+    rather than the whole document
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size):
+        """read chunks until there are size characters past position"""
+        if self.position > len(self.buffer) // 2:
+            # drop what we've decoded
+            self.buffer = self.buffer[self.position :]
+            self.position = 0
+        pending = [self.buffer]
+        available = len(self.buffer) - self.position
+        while available < size and not self.exhausted:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.exhausted = True
+                break
+            pending.append(chunk)
+            available += len(chunk)
+        self.buffer = "".join(pending)
+
+    def peek(self):
+        """the next character that isn't whitespace, "" at the end"""
+        while True:
+            self.position = JSON_WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.exhausted:
+                return ""
+            self.fill(1)
+
+    def take(self, expected):
+        """consume the next character, one of expected"""
+        character = self.peek()
+        if not character or character not in expected:
+            raise json.JSONDecodeError(
+                "Expecting one of {!r}".format(expected), self.buffer, self.position
+            )
+        self.position += 1
+        return character
+
+    def value(self, text=False):
+        """decode the next value, or just return its json text"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer may go on in the next chunk
+                if self.exhausted or not NUMBER_TAIL.match(self.buffer, end):
+                    if text:
+                        value = self.buffer[self.position : end]
+                    self.position = end
+                    return value
+            except json.JSONDecodeError as e:
+                # only worth reading on if we ran out of document
+                # rather than into something that isn't json
+                truncated = e.pos >= len(self.buffer) - 16 or e.msg.startswith(
+                    "Unterminated string"
+                )
+                if self.exhausted or not truncated:
+                    raise
+            # a value bigger than what we have, read (at least) as much again
+            # so a big value is decoded a handful of times, not once per chunk
+            self.fill(2 * (len(self.buffer) - self.position) + 1)
+
+    def values(self, text=False):
+        """
+        every value from here to the end, i.e. the objects
+        in new line delimited or concatenated json
+        """
+        while self.peek():
+            yield self.value(text)
+
+    def elements(self):
+        """the elements of the array we're in, after its ["""
+        if self.peek() == "]":
+            self.take("]")
+            return
+        while True:
+            yield self.value()
+            if self.take(",]") == "]":
+                return
+
+
+def json_records(chunks):
+    """
+    the records in a json document, decoded as they're read:
+    the elements of a top level list or of a dict's "Records" list,
+    any other dict as a record of its own. Concatenated or new line
+    delimited documents are handled one after the other.
+    """
+    stream = JsonStream(chunks)
+    while True:
+        character = stream.peek()
+        if not character:
+            return
+        if character == "[":
+            stream.take("[")
+            yield from stream.elements()
+        elif character == "{":
+            yield from dict_records(stream)
+        else:
+            # nothing to send from a bare string/number/etc
+            stream.value()
+
+
+def dict_records(stream):
+    """
+    the records in a top level dict, streaming the "Records" list
+    without holding the rest of it
+    """
+    stream.take("{")
+    fields = {}
+    streamed = False
+    if stream.peek() == "}":
+        stream.take("}")
+        return
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError(
+                "Expecting property name", stream.buffer, stream.position
+            )
+        stream.take(":")
+        if key == "Records" and stream.peek() == "[":
+            stream.take("[")
+            yield from stream.elements()
+            streamed = True
+        else:
+            fields[key] = stream.value()
+        if stream.take(",}") == "}":
+            break
+    if not streamed and "Records" not in fields:
+        yield fields
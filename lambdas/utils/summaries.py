@@ -0,0 +1,96 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger()
+
+# distinct summary templates to keep compiled
+TEMPLATE_CACHE_SIZE = 256
+
+# token types we can render without chevron
+SIMPLE_TAGS = ("literal", "variable", "no escape")
+
+
+def html_escape(string):
+    """as chevron escapes {{variables}}"""
+    return (
+        string.replace("&", "&amp;")
+        .replace('"', "&quot;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+    )
+
+
+def lookup(scope, path):
+    """
+    the value at a dotted path (pre split) in the event
+    the way chevron looks up a key in a single scope
+    """
+    if path is None:
+        return scope
+    try:
+        for child in path:
+            try:
+                scope = scope[child]
+            except (TypeError, AttributeError):
+                try:
+                    scope = getattr(scope, child)
+                except (TypeError, AttributeError):
+                    scope = scope[int(child)]
+    except (AttributeError, KeyError, IndexError, ValueError):
+        return ""
+    # empty string if falsy, except 0 and False
+    if scope in (0, False):
+        return scope
+    return scope or ""
+
+
+class SummaryTemplate(object):
+    """
+    a mustache template tokenized once.
+    Templates of just text and {{variables}} (the usual summary)
+    render straight from the tokens, anything with sections/partials
+    renders the tokens with chevron, so nothing is parsed twice.
+    """
+
+    def __init__(self, template):
+        # chevron is only imported once there's a template to compile
+        import chevron
+
+        self.template = template
+        self.tokens = tuple(chevron.tokenizer.tokenize(template))
+        self.simple = all(tag in SIMPLE_TAGS for tag, key in self.tokens)
+        # (tag, literal text or pre split key path)
+        self.parts = [
+            (tag, key if tag == "literal" else (None if key == "." else key.split(".")))
+            for tag, key in self.tokens
+        ]
+
+    def render(self, event):
+        if not self.simple:
+            import chevron
+
+            return chevron.render(self.tokens, event)
+        output = []
+        for tag, part in self.parts:
+            if tag == "literal":
+                output.append(part)
+                continue
+            value = lookup(event, part)
+            if not isinstance(value, str):
+                value = str(value)
+            output.append(html_escape(value) if tag == "variable" else value)
+        return "".join(output)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(template):
+    """the compiled SummaryTemplate for a template string"""
+    return SummaryTemplate(template)
+
+
+def render_summary(template, event):
+    """
+    render a mustache template, i.e. "{{details.user}} logged in"
+    against an event, compiling the template only the first time
+    """
+    return compile_template(template).render(event)
@@ -459,33 +459,33 @@ resource "aws_iam_role_policy_attachment" "lambda-exec-role" {
 }
 
 resource "aws_lambda_function" "data_lake_firehose_input" {
-  filename         = "lambdas/lambda.zip"
+  filename         = "lambdas/processor.zip"
   function_name    = "defenda_data_lake_firehose_input"
   role             = aws_iam_role.data_lake_lambda_role.arn
   handler          = "processor.lambda_handler"
   runtime          = "python3.8"
   timeout          = 100
-  source_code_hash = filesha256("lambdas/lambda.zip")
+  source_code_hash = filesha256("lambdas/processor.zip")
 }
 
 resource "aws_lambda_function" "data_lake_s3_input" {
-  filename         = "lambdas/lambda.zip"
+  filename         = "lambdas/s3_to_firehose.zip"
   function_name    = "defenda_data_lake_s3_input"
   role             = aws_iam_role.data_lake_lambda_role.arn
   handler          = "s3_to_firehose.lambda_handler"
   runtime          = "python3.8"
   timeout          = 100
-  source_code_hash = filesha256("lambdas/lambda.zip")
+  source_code_hash = filesha256("lambdas/s3_to_firehose.zip")
 }
 
 resource "aws_lambda_function" "data_lake_generate_partitions_lambda" {
-  filename         = "lambdas/lambda.zip"
+  filename         = "lambdas/generate_partitions.zip"
   function_name    = "defenda_data_lake_generate_partitions"
   role             = aws_iam_role.data_lake_lambda_role.arn
   handler          = "generate_partitions.lambda_handler"
   runtime          = "python3.8"
   timeout          = 100
-  source_code_hash = filesha256("lambdas/lambda.zip")
+  source_code_hash = filesha256("lambdas/generate_partitions.zip")
 }
 
 # cloudwatch timer for the generate partitions lambda